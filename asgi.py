@@ -0,0 +1,6 @@
+from date_webhook.asgi import app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app)
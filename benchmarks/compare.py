@@ -0,0 +1,101 @@
+"""Comparison of two benchmark result files
+
+    python -m benchmarks.compare before.json after.json
+"""
+
+import argparse
+import json
+import sys
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compares the median time of every benchmark in both runs
+
+    Arguments:
+        baseline {dict} -- The earlier results, as written by benchmarks.run
+        current {dict} -- The later results
+
+    Keyword Arguments:
+        threshold {float} -- The relative change beyond which a
+            benchmark counts as a regression or an improvement (default: {0.1})
+
+    Returns:
+        list -- A dict per benchmark with its name, both medians, the
+            ratio of the current to the baseline median and a status
+            of "regression", "improvement", "unchanged", "added" or "removed"
+    """
+    before = baseline["results"]
+    after = current["results"]
+    rows = []
+    for name in sorted(set(before) | set(after)):
+        if name not in after:
+            rows.append(_row(name, before[name]["median"], None, None, "removed"))
+            continue
+        if name not in before:
+            rows.append(_row(name, None, after[name]["median"], None, "added"))
+            continue
+        old = before[name]["median"]
+        new = after[name]["median"]
+        ratio = new / old if old else float("inf")
+        status = "unchanged"
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        rows.append(_row(name, old, new, ratio, status))
+    return rows
+
+
+def print_comparison(rows, file=None):
+    """Prints a comparison as a table
+
+    Arguments:
+        rows {list} -- See compare()
+
+    Keyword Arguments:
+        file {file} -- Where to print, defaulting to standard
+            output (default: {None})
+    """
+    file = file or sys.stdout
+    print(f"{'benchmark':<50} {'before':>12} {'after':>12} {'change':>8}", file=file)
+    for row in rows:
+        before = _micros(row["before"])
+        after = _micros(row["after"])
+        change = "" if row["ratio"] is None else f"{(row['ratio'] - 1) * 100:+.1f}%"
+        flag = "" if row["status"] == "unchanged" else row["status"].upper()
+        print(
+            f"{row['name']:<50} {before:>12} {after:>12} {change:>8} {flag}", file=file
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, threshold=args.threshold)
+    print_comparison(rows)
+    return 1 if any(row["status"] == "regression" for row in rows) else 0
+
+
+def _row(name, before, after, ratio, status):
+    return {
+        "name": name,
+        "before": before,
+        "after": after,
+        "ratio": ratio,
+        "status": status,
+    }
+
+
+def _micros(seconds):
+    return "-" if seconds is None else f"{seconds * 1e6:.2f}us"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Synthetic webhook payloads for benchmarks
+"""
+
+import random
+
+
+def make_payload(
+    state="root",
+    intent="hello",
+    slots=5,
+    values=3,
+    resolved=0.5,
+    response_slots=10,
+    seed=0,
+    qid="benchmark-qid",
+    session_id="benchmark-session",
+):
+    """Generates a payload shaped like the ones the platform sends
+
+    Keyword Arguments:
+        state {string} -- The state (default: {"root"})
+        intent {string} -- The intent (default: {"hello"})
+        slots {int} -- The number of string slots (default: {5})
+        values {int} -- The number of values in each slot (default: {3})
+        resolved {float} -- The fraction of values that are
+            resolved (default: {0.5})
+        response_slots {int} -- The number of entries in each of the
+            response visuals and speakables (default: {10})
+        seed {int} -- Seeds which values are resolved (default: {0})
+        qid {string} -- The query ID (default: {"benchmark-qid"})
+        session_id {string} -- The session ID (default: {"benchmark-session"})
+
+    Returns:
+        dict -- The payload
+    """
+    rng = random.Random(seed)
+    return {
+        "ai_version": "benchmark",
+        "device": "benchmark",
+        "dialog": "benchmark",
+        "external_user_id": "benchmark-user",
+        "qid": qid,
+        "session_id": session_id,
+        "state": state,
+        "intent": intent,
+        "intent_probability": 0.9,
+        "query": "what is my balance",
+        "time_offset": 0,
+        "sentiment": 0,
+        "lat": 40.7128,
+        "lon": -74.006,
+        "session_info": {},
+        "slots": {
+            f"_SLOT_{i}_": {
+                "type": "string",
+                "values": [
+                    _slot_value(i, j, rng.random() < resolved) for j in range(values)
+                ],
+            }
+            for i in range(slots)
+        },
+        "response_slots": {
+            "response_type": state,
+            "visuals": {f"visual_{i}": f"visual {i}" for i in range(response_slots)},
+            "speakables": {
+                f"speakable_{i}": f"speakable {i}" for i in range(response_slots)
+            },
+        },
+    }
+
+
+def route_payload(state, intent, **kwargs):
+    """Generates a payload with the slots and session info that the
+    fulfiller of a route reads
+
+    Arguments:
+        state {string} -- The state
+        intent {string} -- The intent
+
+    Keyword Arguments:
+        **kwargs -- See make_payload()
+
+    Returns:
+        dict -- The payload
+    """
+    payload = make_payload(state, intent, **kwargs)
+    slots = payload["slots"]
+    if state == "get_balance":
+        payload["session_info"] = {"is_authenticated": True, "mufg_user_id": 123456}
+    elif state in ("identity_verification", "confirm_details"):
+        slots["_PERSON_NAME_"] = _confirmed_slot("jane doe")
+        slots["_PHONE_NUMBER_"] = _confirmed_slot("5551234567")
+        slots["_INITIAL_INTENT_"] = _confirmed_slot("get balance")
+    elif state == "increase_cc_limit":
+        slots["_AMBIGUOUS_AMOUNT_"] = {
+            "type": "string",
+            "values": [{"tokens": "50k", "resolved": -1}],
+        }
+    return payload
+
+
+def _slot_value(slot, position, resolved):
+    tokens = f"token {slot} {position}"
+    if resolved:
+        return {"tokens": tokens, "resolved": 1, "value": f"value {slot} {position}"}
+    return {"tokens": tokens, "resolved": -1}
+
+
+def _confirmed_slot(value):
+    return {
+        "type": "string",
+        "values": [{"tokens": value, "value": value, "status": "CONFIRMED"}],
+    }
@@ -0,0 +1,265 @@
+"""Replay of recorded webhook traffic
+
+Replays a file recorded with RECORD_FILE against the application,
+either in-process through its WSGI interface or against a running
+server, and reports latency percentiles and throughput by state and
+intent together with the responses that differ from the recorded ones:
+
+    python -m benchmarks.replay traffic.ndjson --concurrency 8 --rate 200
+    python -m benchmarks.replay traffic.ndjson --url http://127.0.0.1:7321
+
+When a rate is set, latency is measured from when each request was due
+to be sent rather than from when it was sent, so that a server that
+falls behind is not flattered by requests queueing in the harness
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# In-process replays should measure fulfillment rather than answer the
+# recording's repeated qids from the idempotency cache or log to the terminal
+os.environ.setdefault("LOG_FILE", os.devnull)
+os.environ.setdefault("IDEMPOTENCY_CACHE_SIZE", "0")
+
+
+class WsgiSender:
+    """Sends requests to the application in-process"""
+
+    def __init__(self):
+        from date_webhook.app import app
+
+        self.client = app.test_client()
+
+    def send(self, body):
+        response = self.client.post("/", data=body, content_type="application/json")
+        return response.status_code, response.get_data()
+
+
+class HttpSender:
+    """Sends requests to a running server over a keep-alive connection"""
+
+    def __init__(self, url):
+        import requests
+
+        self.url = url.rstrip("/") + "/"
+        self.session = requests.Session()
+
+    def send(self, body):
+        response = self.session.post(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            timeout=30,
+        )
+        return response.status_code, response.content
+
+
+def load(path):
+    """Loads a recording
+
+    Arguments:
+        path {string} -- The NDJSON file
+
+    Returns:
+        list -- The recorded turns
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(records, make_sender, concurrency=1, rate=None, ignore=()):
+    """Replays recorded turns
+
+    Arguments:
+        records {list} -- The recorded turns
+        make_sender {callable} -- Creates a sender for each thread
+
+    Keyword Arguments:
+        concurrency {int} -- The number of threads sending (default: {1})
+        rate {float} -- Requests per second to send at, or None to
+            send as fast as the threads can (default: {None})
+        ignore {tuple} -- Response paths, like "/response_slots/visuals",
+            that are not compared (default: {()})
+
+    Returns:
+        tuple -- A result dict per turn, in order, and the seconds the
+            replay took
+    """
+    results = [None] * len(records)
+    cursor = iter(range(len(records)))
+    lock = threading.Lock()
+
+    def work(sender):
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            results[i] = _replay_one(records[i], sender, start, i, rate, ignore)
+
+    threads = [
+        threading.Thread(target=work, args=(make_sender(),))
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    """Summarizes replay results by state and intent
+
+    Arguments:
+        results {list} -- See replay()
+        elapsed {float} -- Seconds the replay took
+
+    Returns:
+        dict -- For each "state/intent" and for "all", the number of
+            turns, errors and differing responses, the p50, p95 and p99
+            latency in milliseconds and the turns per second
+    """
+    groups = defaultdict(list)
+    for result in results:
+        groups[result["key"]].append(result)
+        groups["all"].append(result)
+    summary = {}
+    for key, group in sorted(groups.items()):
+        latencies = sorted(result["latency"] for result in group)
+        summary[key] = {
+            "count": len(group),
+            "errors": sum(1 for result in group if result["status"] != 200),
+            "diffs": sum(1 for result in group if result["diff"]),
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "rps": len(group) / elapsed if elapsed else 0.0,
+        }
+    return summary
+
+
+def diff(expected, actual, path=""):
+    """Finds where two JSON values differ
+
+    Arguments:
+        expected {any} -- The recorded value
+        actual {any} -- The replayed value
+
+    Keyword Arguments:
+        path {string} -- The path of the values (default: {""})
+
+    Returns:
+        list -- The paths at which the values differ
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        paths = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if key not in expected or key not in actual:
+                paths.append(f"{path}/{key}")
+            else:
+                paths.extend(diff(expected[key], actual[key], f"{path}/{key}"))
+        return paths
+    if (
+        isinstance(expected, list)
+        and isinstance(actual, list)
+        and len(expected) == len(actual)
+    ):
+        paths = []
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            paths.extend(diff(a, b, f"{path}/{i}"))
+        return paths
+    return [] if expected == actual else [path or "/"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="NDJSON file recorded with RECORD_FILE")
+    parser.add_argument("--url", help="replay against this server, not in-process")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--rate", type=float, help="requests per second")
+    parser.add_argument("--loops", type=int, default=1, help="times to replay")
+    parser.add_argument(
+        "--ignore", action="append", default=[], help="response path to not compare"
+    )
+    parser.add_argument("--show-diffs", type=int, default=10)
+    parser.add_argument("--output", help="write the summary and diffs to this file")
+    args = parser.parse_args(argv)
+
+    records = load(args.recording) * args.loops
+    if args.url:
+        make_sender = lambda: HttpSender(args.url)  # noqa: E731
+    else:
+        make_sender = WsgiSender
+    results, elapsed = replay(
+        records, make_sender, args.concurrency, args.rate, tuple(args.ignore)
+    )
+    summary = summarize(results, elapsed)
+
+    print(
+        f"{'state/intent':<50} {'count':>6} {'errors':>6} {'diffs':>6} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rps':>8}"
+    )
+    for key, row in summary.items():
+        print(
+            f"{key:<50} {row['count']:>6} {row['errors']:>6} {row['diffs']:>6} "
+            f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['rps']:>8.1f}"
+        )
+    diffs = [result for result in results if result["diff"]]
+    for result in diffs[: args.show_diffs]:
+        paths = ", ".join(result["diff"][:5])
+        print(f"turn {result['index']} [{result['key']}] differs at {paths}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "diffs": diffs}, f, indent=2)
+    return 1 if diffs else 0
+
+
+def _replay_one(record, sender, start, index, rate, ignore):
+    request = record["request"]
+    body = json.dumps(request).encode("utf-8")
+    if rate:
+        due = start + index / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent = due
+    else:
+        sent = time.perf_counter()
+    status, content = sender.send(body)
+    latency = time.perf_counter() - sent
+    if status != record.get("status", 200):
+        paths = ["/status"]
+    else:
+        actual = json.loads(content) if status == 200 else None
+        paths = [
+            path
+            for path in diff(record["response"], actual)
+            if not any(path == p or path.startswith(f"{p}/") for p in ignore)
+        ]
+    return {
+        "index": index,
+        "key": f"{request.get('state')}/{request.get('intent')}",
+        "status": status,
+        "latency": latency,
+        "diff": paths,
+    }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
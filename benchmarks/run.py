@@ -0,0 +1,352 @@
+"""Benchmarks of Payload methods, fulfillers and whole requests
+
+Every Payload method, the schema validation, the date resolution, the
+money normalization and every fulfiller of every route, and every route
+end to end through the Flask test client, are timed on synthetic
+payloads. Results can be written as JSON and compared with an earlier
+run to flag regressions:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from functools import partial
+
+# Keep the benchmarks from being skewed by logging to the terminal or
+# by repeated qids being answered from the idempotency cache
+os.environ.setdefault("LOG_FILE", os.devnull)
+os.environ.setdefault("IDEMPOTENCY_CACHE_SIZE", "0")
+
+from benchmarks.compare import compare, print_comparison  # noqa: E402
+from benchmarks.payloads import make_payload, route_payload  # noqa: E402
+from date_webhook.app import app, codec  # noqa: E402
+from date_webhook.dates import resolve_dates  # noqa: E402
+from date_webhook.fulfillment import PIPELINE, ROUTER, validate_request  # noqa: E402
+from date_webhook.money import normalize_money  # noqa: E402
+from date_webhook.router import WILDCARD  # noqa: E402
+from date_webhook.utils.payload import Payload  # noqa: E402
+
+
+def payload_benchmarks(payload):
+    """Benchmarks every public Payload method on a fresh Payload
+    over the same payload, so each one includes creating the Payload,
+    which is benchmarked on its own as "payload.Payload"
+
+    Arguments:
+        payload {dict} -- The payload
+
+    Returns:
+        dict -- Callables by benchmark name
+    """
+    slot = next(iter(payload["slots"]))
+    unresolved = [
+        (name, value["tokens"])
+        for name, s in payload["slots"].items()
+        for value in s["values"]
+        if value.get("resolved") == -1
+    ]
+    methods = {
+        "Payload": lambda p: None,
+        "get": lambda p: p.get(),
+        "overwrite": lambda p: p.overwrite(p.get()),
+        "snapshot": lambda p: p.snapshot(),
+        "get_ids": lambda p: p.get_ids(),
+        "get_slots": lambda p: p.get_slots(),
+        "get_state": lambda p: p.get_state(),
+        "get_intent": lambda p: p.get_intent(),
+        "get_intent_probability": lambda p: p.get_intent_probability(),
+        "get_query": lambda p: p.get_query(),
+        "get_time_offset": lambda p: p.get_time_offset(),
+        "get_sentiment": lambda p: p.get_sentiment(),
+        "get_location": lambda p: p.get_location(),
+        "contains_field": lambda p: p.contains_field("qid"),
+        "get_field": lambda p: p.get_field("session_info"),
+        "set_field": lambda p: p.set_field("state", "benchmark"),
+        "update_field": lambda p: p.update_field("session_info", {"a": 1}),
+        "get_session_value": lambda p: p.get_session_value("benchmark"),
+        "set_session_value": lambda p: p.set_session_value("benchmark", 1),
+        "create_slot": lambda p: p.create_slot("benchmark", "string", ["a"]),
+        "insert_slot_values": lambda p: p.insert_slot_values(slot, ["a"]),
+        "overwrite_slot_values": lambda p: p.overwrite_slot_values(slot, ["a"]),
+        "get_resolved_slot_values": lambda p: p.get_resolved_slot_values(slot),
+        "get_unresolved_slot_values": lambda p: p.get_unresolved_slot_values(slot),
+        "transition": lambda p: p.transition("benchmark"),
+        "add_response_slot_values": lambda p: p.add_response_slot_values("k", "v"),
+        "add_response_visuals": lambda p: p.add_response_visuals("k", "v"),
+        "add_response_speakables": lambda p: p.add_response_speakables("k", "v"),
+        "clear_slot": lambda p: p.clear_slot(slot),
+        "slot_exists": lambda p: p.slot_exists(slot),
+        "get_slot_values": lambda p: p.get_slot_values(slot),
+        "set_slot": lambda p: p.set_slot(slot, "string", [{"tokens": "a"}]),
+        "update_slot_value": lambda p: p.update_slot_value(slot, 0, {"value": "a"}),
+        "blind_resolve": lambda p: p.blind_resolve(),
+    }
+    if unresolved:
+        name, tokens = unresolved[0]
+        methods["resolve_append"] = lambda p: p.resolve_append(name, (tokens, "v"))
+        methods["resolve_replace"] = lambda p: p.resolve_replace(name, (tokens, "v"))
+    return {
+        f"payload.{name}": _with_payload(payload, method)
+        for name, method in methods.items()
+    }
+
+
+def validation_benchmarks(config):
+    """Benchmarks validating a request payload for every route
+    against its schema
+
+    Arguments:
+        config {dict} -- Arguments for route_payload()
+
+    Returns:
+        dict -- Callables by benchmark name
+    """
+    return {
+        f"validate.{route.name}": partial(
+            validate_request, route_payload(*_route_key(route), **config)
+        )
+        for route in ROUTER
+    }
+
+
+DATE_TOKENS = ("today", "tomorrow", "next friday", "3 days ago", "march 5th")
+
+MONEY_TOKENS = ("50k", "$1,200.50", "two thousand", "2.5 million euros", "£300")
+
+
+def date_benchmarks(config):
+    """Benchmarks resolving the date slot values of a request payload
+    in one batch, with the date caches warm
+
+    Arguments:
+        config {dict} -- Arguments for make_payload()
+
+    Returns:
+        dict -- Callables by benchmark name
+    """
+    payload = make_payload(**config)
+    tokens = DATE_TOKENS * (config["values"] // len(DATE_TOKENS) + 1)
+    payload["slots"]["_DATE_"] = {
+        "type": "date",
+        "values": [
+            {"tokens": token, "resolved": -1} for token in tokens[: config["values"]]
+        ],
+    }
+    return {"dates.resolve_dates": _with_payload(payload, resolve_dates)}
+
+
+def money_benchmarks(config):
+    """Benchmarks normalizing the money slot values of a request
+    payload in one batch, with the normalization cache warm
+
+    Arguments:
+        config {dict} -- Arguments for make_payload()
+
+    Returns:
+        dict -- Callables by benchmark name
+    """
+    payload = make_payload(**config)
+    tokens = MONEY_TOKENS * (config["values"] // len(MONEY_TOKENS) + 1)
+    payload["slots"]["_MONEY_"] = {
+        "type": "money",
+        "values": [
+            {"tokens": token, "resolved": -1} for token in tokens[: config["values"]]
+        ],
+    }
+    return {"money.normalize_money": _with_payload(payload, normalize_money)}
+
+
+def handler_benchmarks(config):
+    """Benchmarks calling every fulfiller of the fulfillment table
+    directly after the pipeline's pre-processing stages, running
+    coroutine fulfillers on one event loop
+
+    Arguments:
+        config {dict} -- Arguments for route_payload()
+
+    Returns:
+        dict -- Callables by benchmark name
+    """
+    loop = asyncio.new_event_loop()
+    benchmarks = {}
+    for route in ROUTER:
+        payload = route_payload(*_route_key(route), **config)
+
+        def run(route=route, payload=payload):
+            request = Payload(payload)
+            for stage in PIPELINE.preprocessors:
+                stage(request, route)
+            result = route.handler(request)
+            if inspect.isawaitable(result):
+                loop.run_until_complete(result)
+
+        benchmarks[f"handler.{route.name}"] = run
+    return benchmarks
+
+
+def end_to_end_benchmarks(config, batch_size=32):
+    """Benchmarks POST requests to "/" for every route and to
+    "/batch" through the Flask test client
+
+    Arguments:
+        config {dict} -- Arguments for route_payload()
+
+    Keyword Arguments:
+        batch_size {int} -- The number of payloads in a batch (default: {32})
+
+    Returns:
+        dict -- Callables by benchmark name
+    """
+    client = app.test_client()
+    benchmarks = {}
+    payloads = []
+    for route in ROUTER:
+        payload = route_payload(*_route_key(route), **config)
+        payloads.append(payload)
+        body = codec.dumps(payload)
+
+        def post(body=body):
+            response = client.post("/", data=body, content_type="application/json")
+            response.get_data()
+
+        benchmarks[f"e2e.{route.name}"] = post
+    batch = codec.dumps([payloads[i % len(payloads)] for i in range(batch_size)])
+
+    def post_batch():
+        response = client.post("/batch", data=batch, content_type="application/json")
+        response.get_data()
+
+    benchmarks[f"e2e.batch[{batch_size}]"] = post_batch
+    return benchmarks
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """Times a callable
+
+    Arguments:
+        fn {callable} -- Called without arguments
+
+    Keyword Arguments:
+        repeat {int} -- The number of timed runs (default: {5})
+        min_time {float} -- The least seconds each run takes, which
+            sets how many calls a run makes (default: {0.2})
+
+    Returns:
+        dict -- The median, min and standard deviation of the seconds
+            per call over the runs, and the calls per run
+    """
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    samples = [t / number for t in timer.repeat(repeat, number)]
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only run benchmarks matching this regex")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression (default: 0.1)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--slots", type=int, default=5)
+    parser.add_argument("--values", type=int, default=3)
+    parser.add_argument("--resolved", type=float, default=0.5)
+    parser.add_argument("--response-slots", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    config = {
+        "slots": args.slots,
+        "values": args.values,
+        "resolved": args.resolved,
+        "response_slots": args.response_slots,
+    }
+    benchmarks = {
+        **payload_benchmarks(make_payload(**config)),
+        **validation_benchmarks(config),
+        **date_benchmarks(config),
+        **money_benchmarks(config),
+        **handler_benchmarks(config),
+        **end_to_end_benchmarks(config),
+    }
+    pattern = re.compile(args.filter or "")
+    benchmarks = {k: v for k, v in benchmarks.items() if pattern.search(k)}
+    if args.list:
+        print("\n".join(benchmarks))
+        return 0
+
+    results = {}
+    for name, fn in benchmarks.items():
+        results[name] = measure(fn, repeat=args.repeat, min_time=args.min_time)
+        print(f"{name:<50} {results[name]['median'] * 1e6:>12.2f} us")
+
+    report = {"meta": _meta(), "config": config, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        baseline["results"] = {
+            k: v for k, v in baseline["results"].items() if pattern.search(k)
+        }
+        comparison = compare(baseline, report, threshold=args.threshold)
+        print_comparison(comparison)
+        if any(row["status"] == "regression" for row in comparison):
+            return 1
+    return 0
+
+
+def _with_payload(payload, method):
+    return lambda: method(Payload(payload))
+
+
+def _route_key(route):
+    if route.state == WILDCARD:
+        return ("root", "hello")
+    return (route.state, route.intent)
+
+
+def _meta():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+    }
+
+
+if __name__ == "__main__":
+    sys.exit(main())
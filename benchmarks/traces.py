@@ -0,0 +1,147 @@
+"""Summary of the span timings in a trace file
+
+Reads a file written with TRACE_FILE, or any file of OTLP JSON export
+requests, and reports for each span name how many spans there were,
+how many failed and the p50, p95 and p99 of their duration and of
+their self time, the part of their duration not spent in child spans:
+
+    python -m benchmarks.traces traces.ndjson
+    python -m benchmarks.traces traces.ndjson --intent check_balance
+"""
+
+import argparse
+import json
+import math
+import sys
+from collections import defaultdict
+
+
+def load(path):
+    """Reads the traces of an OTLP JSON file
+
+    Arguments:
+        path {string} -- The file, with one export request per line
+
+    Returns:
+        dict -- The spans of each trace ID
+    """
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            for resource_spans in request.get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        traces[span["traceId"]].append(span)
+    return traces
+
+
+def summarize(traces, attributes=None):
+    """Summarizes span timings by span name
+
+    Arguments:
+        traces {dict} -- See load()
+
+    Keyword Arguments:
+        attributes {dict} -- Only traces whose root span has these
+            attribute values are summarized (default: {None})
+
+    Returns:
+        dict -- For each span name, the number of spans and failed
+            spans and the p50, p95 and p99 duration and self time in
+            milliseconds, with the names in the order they started in
+    """
+    durations = defaultdict(list)
+    self_times = defaultdict(list)
+    errors = defaultdict(int)
+    first_start = {}
+    for spans in traces.values():
+        roots = [span for span in spans if not span.get("parentSpanId")]
+        if attributes and not any(
+            _attributes(root).items() >= attributes.items() for root in roots
+        ):
+            continue
+        start = min(int(span["startTimeUnixNano"]) for span in roots or spans)
+        children = defaultdict(int)
+        for span in spans:
+            children[span.get("parentSpanId")] += _duration(span)
+        for span in spans:
+            name = span["name"]
+            duration = _duration(span)
+            durations[name].append(duration)
+            # Children that run concurrently can add up to more than
+            # their parent took
+            self_times[name].append(max(0.0, duration - children[span["spanId"]]))
+            errors[name] += span.get("status", {}).get("code") == 2
+            offset = int(span["startTimeUnixNano"]) - start
+            first_start[name] = min(first_start.get(name, offset), offset)
+    summary = {}
+    for name in sorted(durations, key=lambda name: first_start[name]):
+        duration = sorted(durations[name])
+        self_time = sorted(self_times[name])
+        summary[name] = {
+            "count": len(duration),
+            "errors": errors[name],
+            "p50_ms": _percentile(duration, 0.50),
+            "p95_ms": _percentile(duration, 0.95),
+            "p99_ms": _percentile(duration, 0.99),
+            "self_p50_ms": _percentile(self_time, 0.50),
+            "self_p95_ms": _percentile(self_time, 0.95),
+            "self_p99_ms": _percentile(self_time, 0.99),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("traces", help="NDJSON file written with TRACE_FILE")
+    parser.add_argument("--state", help="only summarize turns in this state")
+    parser.add_argument("--intent", help="only summarize turns with this intent")
+    parser.add_argument("--output", help="write the summary to this file")
+    args = parser.parse_args(argv)
+
+    attributes = {
+        key: value
+        for key, value in (("state", args.state), ("intent", args.intent))
+        if value is not None
+    }
+    summary = summarize(load(args.traces), attributes)
+
+    print(
+        f"{'span':<50} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'self p50':>8} {'self p95':>8}"
+    )
+    for name, row in summary.items():
+        print(
+            f"{name:<50} {row['count']:>6} {row['errors']:>6} "
+            f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['p99_ms']:>8.3f} "
+            f"{row['self_p50_ms']:>8.3f} {row['self_p95_ms']:>8.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+def _duration(span):
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+
+def _attributes(span):
+    return {
+        attribute["key"]: next(iter(attribute["value"].values()))
+        for attribute in span.get("attributes", [])
+    }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
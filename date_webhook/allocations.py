@@ -0,0 +1,281 @@
+"""Sampled allocation profiling of fulfillments
+
+When ALLOCATION_SAMPLE_RATE is set, a sample of the turns that "/"
+fulfills is traced with tracemalloc while their Payload is built, they
+are fulfilled and their response is serialized. The net bytes each
+phase left allocated and the peak bytes it allocated are added up by
+state, intent and fulfiller, and the allocation sites that grew the
+most by fulfiller and phase, so that churn and growth can be traced to
+a route. The report is served by GET /debug/allocations and written to
+ALLOCATION_FILE, if set, when the worker exits.
+
+tracemalloc is started when a sampled turn arrives and stopped when
+it is done, unless something else started it, so that turns that are
+not sampled do not pay for it. It slows down every allocation while it
+runs and sees the allocations of every thread, so one turn is profiled
+at a time and the numbers are most precise with one request in flight
+per worker
+"""
+
+import atexit
+import json
+import os
+import random
+import threading
+import tracemalloc
+
+from date_webhook.fulfillment import PIPELINE, ROUTER
+
+# The most allocation sites reported, and kept for each sampled phase
+ALLOCATION_TOP = int(os.environ.get("ALLOCATION_TOP", "25"))
+
+
+class AllocationProfiler:
+    """Aggregates the allocations of sampled turns
+
+    Keyword Arguments:
+        sample_rate {float} -- The fraction of turns that are
+            profiled (default: {0.01})
+        frames {int} -- The frames of each allocation's traceback that
+            tracemalloc keeps (default: {1})
+        top {int} -- The most allocation sites kept per sampled
+            phase and reported (default: {ALLOCATION_TOP})
+    """
+
+    def __init__(self, sample_rate=0.01, frames=1, top=ALLOCATION_TOP):
+        self.sample_rate = sample_rate
+        self.frames = frames
+        self.top = top
+        self.samples = 0
+        self.phases = {}
+        self.sites = {}
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+
+    def profile(self, payload):
+        """Starts profiling a turn if it is sampled and no other turn
+        is being profiled
+
+        Arguments:
+            payload {any} -- The decoded request payload
+
+        Returns:
+            context manager -- Profiles the turn until it exits; call
+                its lap() at the end of each phase
+        """
+        if random.random() >= self.sample_rate:
+            return NOT_PROFILED
+        if not self._busy.acquire(blocking=False):
+            return NOT_PROFILED
+        return _Turn(self, _route_labels(payload))
+
+    def report(self):
+        """Gets the aggregated allocations
+
+        Returns:
+            dict -- The number of sampled turns, the bytes traced in
+                this process, which are 0 unless a turn is being
+                profiled or something else traces allocations, the
+                "phases" of each route and the "sites" that grew the
+                most
+        """
+        with self._lock:
+            phases = [
+                {
+                    "state": state,
+                    "intent": intent,
+                    "handler": handler,
+                    "phase": phase,
+                    "samples": samples,
+                    "net_bytes_mean": net / samples,
+                    "net_bytes_total": net,
+                    "peak_bytes_mean": peak / samples,
+                    "peak_bytes_max": peak_max,
+                }
+                for (state, intent, handler, phase), (
+                    samples,
+                    net,
+                    peak,
+                    peak_max,
+                ) in self.phases.items()
+            ]
+            sites = [
+                {
+                    "handler": handler,
+                    "phase": phase,
+                    "site": site,
+                    "samples": samples,
+                    "net_bytes_total": size,
+                    "net_blocks_total": count,
+                }
+                for (handler, phase, site), (samples, size, count) in self.sites.items()
+            ]
+        current, peak = tracemalloc.get_traced_memory()
+        sites.sort(key=lambda site: site["net_bytes_total"], reverse=True)
+        return {
+            "samples": self.samples,
+            "sample_rate": self.sample_rate,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "phases": sorted(
+                phases, key=lambda row: (row["state"], row["intent"], row["phase"])
+            ),
+            "sites": sites[: self.top],
+        }
+
+    def dump(self, path):
+        """Writes the report to a file as JSON
+
+        Arguments:
+            path {string} -- The file, where "{pid}" is replaced by the
+                ID of the process, so that workers can write their own
+        """
+        with open(path.format(pid=os.getpid()), "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def _add(self, labels, laps):
+        with self._lock:
+            self.samples += 1
+            for phase, net, peak, sites in laps:
+                key = (*labels, phase)
+                totals = self.phases.get(key)
+                if totals is None:
+                    self.phases[key] = [1, net, peak, peak]
+                else:
+                    totals[0] += 1
+                    totals[1] += net
+                    totals[2] += peak
+                    totals[3] = max(totals[3], peak)
+                for site, size, count in sites:
+                    key = (labels[2], phase, site)
+                    totals = self.sites.get(key)
+                    if totals is None:
+                        self.sites[key] = [1, size, count]
+                    else:
+                        totals[0] += 1
+                        totals[1] += size
+                        totals[2] += count
+
+
+class _Turn:
+    """The profile of one sampled turn"""
+
+    def __init__(self, profiler, labels):
+        self.profiler = profiler
+        self.labels = labels
+        self.laps = []
+        self.started = False
+
+    def __enter__(self):
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.profiler.frames)
+                self.started = True
+            self.snapshot = self._snapshot()
+            self._start_phase()
+        except BaseException:
+            self._end()
+            raise
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        try:
+            # Only turns that went through every phase are comparable
+            if kind is None:
+                self.profiler._add(self.labels, self.laps)
+        finally:
+            self._end()
+
+    def lap(self, phase):
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self._snapshot()
+        sites = [
+            (_site(diff.traceback), diff.size_diff, diff.count_diff)
+            for diff in snapshot.compare_to(self.snapshot, "lineno")[
+                : self.profiler.top
+            ]
+            if diff.size_diff > 0
+        ]
+        self.laps.append((phase, current - self.current, peak - self.current, sites))
+        self.snapshot = snapshot
+        del snapshot, sites
+        self._start_phase()
+
+    def _end(self):
+        self.snapshot = None
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+        self.profiler._busy.release()
+
+    def _start_phase(self):
+        # Phases are measured from after the profiler's own snapshots
+        # and bookkeeping, so that those do not count towards them
+        tracemalloc.reset_peak()
+        self.current = tracemalloc.get_traced_memory()[0]
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self.profiler._filters)
+
+
+class _NotProfiled:
+    """Stands in for the profile of a turn that is not sampled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        return None
+
+    def lap(self, phase):
+        pass
+
+
+NOT_PROFILED = _NotProfiled()
+
+
+def _route_labels(payload):
+    route = None
+    if type(payload) is dict:
+        state = payload.get("state")
+        intent = payload.get("intent")
+        if type(state) is str and type(intent) is str:
+            route = ROUTER.resolve(state, intent)
+    route = route or PIPELINE.fallback
+    if route is None:
+        return ("", "", "")
+    return (route.state, route.intent, route.handler_name)
+
+
+def _site(traceback):
+    frame = traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+PROFILER = None
+if float(os.environ.get("ALLOCATION_SAMPLE_RATE", "0")) > 0:
+    PROFILER = AllocationProfiler(
+        sample_rate=float(os.environ["ALLOCATION_SAMPLE_RATE"]),
+        frames=int(os.environ.get("ALLOCATION_FRAMES", "1")),
+    )
+    if os.environ.get("ALLOCATION_FILE"):
+        atexit.register(PROFILER.dump, os.environ["ALLOCATION_FILE"])
+
+
+def profile_allocations(payload):
+    """Profiles a turn if allocation profiling is on and the turn is
+    sampled
+
+    Arguments:
+        payload {any} -- The decoded request payload
+
+    Returns:
+        context manager -- See AllocationProfiler.profile()
+    """
+    if PROFILER is None:
+        return NOT_PROFILED
+    return PROFILER.profile(payload)
@@ -1,16 +1,160 @@
-from flask import Flask, jsonify, request
+import os
+from functools import lru_cache
 
-from date_webhook.utils.payload import Payload
-from date_webhook.fulfillment import fulfill
+from flask import Flask, request, stream_with_context
+from werkzeug.exceptions import BadRequest, NotFound, UnsupportedMediaType
 
-import json
+from date_webhook.allocations import PROFILER
+from date_webhook.batch import EXECUTORS, fulfill_many, make_executor, stream_json_array
+from date_webhook.deadline import DEADLINE_HEADER
+from date_webhook.metrics import CONTENT_TYPE, REGISTRY
+from date_webhook.turn import Turn
+from date_webhook.utils.codec import get_codec
+from date_webhook.utils.idempotency import IdempotencyCache
+from date_webhook.utils.patch import PATCH_MIMETYPE
 
 app = Flask(__name__)
 
+codec = get_codec(os.environ.get("JSON_BACKEND", "auto"))
+
+BATCH_EXECUTOR = os.environ.get("BATCH_EXECUTOR", "inline")
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "0")) or None
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "0"))
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", "30"))
+
+if BATCH_EXECUTOR not in EXECUTORS:
+    raise ValueError(f"BATCH_EXECUTOR must be one of {EXECUTORS}")
+
+
+@lru_cache(maxsize=None)
+def batch_executor():
+    # Created on first use so that pools start after gunicorn forks
+    return make_executor(BATCH_EXECUTOR, BATCH_WORKERS)
+
+
+@lru_cache(maxsize=None)
+def idempotency_cache():
+    """Gets this worker's cache of recent responses by qid and
+    session ID
+
+    Returns:
+        IdempotencyCache -- The cache, or None if IDEMPOTENCY_CACHE_SIZE is 0
+    """
+    if IDEMPOTENCY_CACHE_SIZE <= 0:
+        return None
+    return IdempotencyCache(max_entries=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL)
+
+
+def read_request():
+    """Reads the JSON body of the current request
+
+    Returns:
+        bytes -- The body
+    """
+    if not request.is_json:
+        raise UnsupportedMediaType(
+            "Did not attempt to load JSON data because the request "
+            "Content-Type was not 'application/json'."
+        )
+    return request.get_data(cache=False)
+
+
+def decode_request(data=None):
+    """Decodes the JSON body of the current request straight from
+    its bytes
+
+    Keyword Arguments:
+        data {bytes} -- The body if it was already read with
+            read_request() (default: {None})
+
+    Returns:
+        any -- The decoded body
+    """
+    if data is None:
+        data = read_request()
+    try:
+        return codec.loads(data)
+    except ValueError as e:
+        raise BadRequest(f"Failed to decode JSON object: {e}")
+
+
+def wants_patch():
+    """Whether the current request prefers a JSON Patch of what
+    fulfillment changed to the whole fulfilled payload
+
+    Returns:
+        bool -- True if it accepts JSON Patch but not plain JSON,
+            or prefers it
+    """
+    best = request.accept_mimetypes.best_match(("application/json", PATCH_MIMETYPE))
+    return best == PATCH_MIMETYPE
+
+
+def encode_response(obj, status=200):
+    """Encodes a value as the JSON body of a response
+
+    Arguments:
+        obj {any} -- The value to encode
+
+    Keyword Arguments:
+        status {int} -- The HTTP status code (default: {200})
+
+    Returns:
+        Response -- The response
+    """
+    return app.response_class(
+        codec.dumps(obj), status=status, mimetype="application/json"
+    )
+
 
 @app.route("/", methods=["POST"])
 def handle():
-    json_request = request.json
-    req = Payload(json_request)
-    fulfill(req)
-    return jsonify(req.get())
+    turn = Turn(
+        codec,
+        idempotency_cache(),
+        request.get_data(cache=False),
+        request.is_json,
+        budget_header=request.headers.get(DEADLINE_HEADER),
+        patch=wants_patch(),
+    )
+    with turn:
+        turn.fulfill()
+    return app.response_class(turn.response(), mimetype=turn.mimetype)
+
+
+@app.route("/batch", methods=["POST"])
+def handle_batch():
+    """Fulfills many payloads, given either as a JSON array or as
+    newline-delimited JSON, and streams the results back in order
+    in the same format. A payload that fails yields an error result
+    in its place rather than failing the whole batch
+    """
+    if request.mimetype == "application/x-ndjson":
+        lines = (line for line in request.stream if line.strip())
+        results = fulfill_many(lines, codec, batch_executor())
+        return app.response_class(
+            stream_with_context(results), mimetype="application/x-ndjson"
+        )
+    items = decode_request()
+    if not isinstance(items, list):
+        raise BadRequest("The batch must be a JSON array of payloads")
+    results = fulfill_many(items, codec, batch_executor())
+    return app.response_class(
+        stream_with_context(stream_json_array(results)), mimetype="application/json"
+    )
+
+
+@app.route("/debug/allocations", methods=["GET"])
+def handle_allocations():
+    """Reports the allocations of the turns sampled by the allocation
+    profiler, which is off unless ALLOCATION_SAMPLE_RATE is set
+    """
+    if PROFILER is None:
+        raise NotFound("Allocation profiling is off")
+    return encode_response(PROFILER.report())
+
+
+@app.route("/metrics", methods=["GET"])
+def handle_metrics():
+    """Reports metrics in the Prometheus text format"""
+    return app.response_class(REGISTRY.render(), content_type=CONTENT_TYPE)
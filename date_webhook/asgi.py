@@ -0,0 +1,168 @@
+"""ASGI application that fulfills webhook requests on an event loop
+
+The "/" route is served natively so that coroutine fulfillers can keep
+many slow-backend turns in flight on one worker. Every other route is
+passed to the Flask application on the loop's default thread pool, with
+its response buffered
+"""
+
+import asyncio
+import io
+import sys
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_accept_header, parse_options_header
+
+from date_webhook.app import app as wsgi_app, codec, idempotency_cache
+from date_webhook.deadline import DEADLINE_HEADER
+from date_webhook.turn import Turn
+from date_webhook.utils.patch import PATCH_MIMETYPE
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    body = await _read_body(receive)
+    if scope["method"] == "POST" and scope["path"] == "/":
+        status, headers, content = await handle(scope, body)
+    else:
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(
+            None, _call_wsgi, scope, body
+        )
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": content})
+
+
+async def handle(scope, body):
+    """Fulfills a single webhook request
+
+    Arguments:
+        scope {dict} -- The ASGI connection scope
+        body {bytes} -- The request body
+
+    Returns:
+        tuple -- The status code, ASGI headers and response body
+    """
+    turn = Turn(
+        codec,
+        idempotency_cache(),
+        body,
+        _is_json(scope),
+        budget_header=_header(scope, DEADLINE_HEADER),
+        patch=_wants_patch(scope),
+    )
+    try:
+        with turn:
+            await turn.fulfill_async()
+    except HTTPException as e:
+        response = e.get_response()
+        return e.code, _asgi_headers(response.headers.items()), response.get_data()
+    content = turn.response()
+    return 200, [(b"content-type", turn.mimetype.encode())], content
+
+
+def _is_json(scope):
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            mimetype, _ = parse_options_header(value.decode("latin-1"))
+            return mimetype == "application/json" or (
+                mimetype.startswith("application/") and mimetype.endswith("+json")
+            )
+    return False
+
+
+def _header(scope, name):
+    name = name.lower().encode("latin-1")
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _wants_patch(scope):
+    for name, value in scope["headers"]:
+        if name == b"accept":
+            accept = parse_accept_header(value.decode("latin-1"), MIMEAccept)
+            best = accept.best_match(("application/json", PATCH_MIMETYPE))
+            return best == PATCH_MIMETYPE
+    return False
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _call_wsgi(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        value = value.decode("latin-1")
+        if name == "content-length":
+            continue
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+            continue
+        key = f"HTTP_{name.upper().replace('-', '_')}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = headers
+
+    result = wsgi_app(environ, start_response)
+    try:
+        content = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response["status"], _asgi_headers(response["headers"]), content
+
+
+def _asgi_headers(headers):
+    return [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers
+    ]
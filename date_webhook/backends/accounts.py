@@ -0,0 +1,34 @@
+"""Account backend lookups
+"""
+
+import asyncio
+from urllib.parse import quote
+
+from date_webhook.backends import stub_server
+from date_webhook.backends.client import get_client
+
+
+def get_balance(user_id):
+    """Gets the balance of a customer's account
+
+    Arguments:
+        user_id {any} -- The customer's user ID
+
+    Returns:
+        dict -- The "amount" as a decimal string and its "currency"
+    """
+    client = get_client()
+    if client is None:
+        return stub_server.balance(user_id)
+    return client.get(f"/accounts/{quote(str(user_id), safe='')}/balance")
+
+
+async def get_balance_async(user_id):
+    """Coroutine version of get_balance() that does not block the
+    event loop while waiting for the backend
+    """
+    if get_client() is None:
+        return get_balance(user_id)
+    # to_thread() carries over the request's deadline, unlike
+    # run_in_executor()
+    return await asyncio.to_thread(get_balance, user_id)
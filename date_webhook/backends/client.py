@@ -0,0 +1,241 @@
+"""Pooled HTTP client for the account and identity backends"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+import werkzeug
+from requests.adapters import HTTPAdapter
+
+from date_webhook.deadline import current_deadline
+from date_webhook.tracing import CLIENT, span
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+class BackendUnavailableException(werkzeug.exceptions.HTTPException):
+    code = 503
+    description = "a backend service needed to fulfill the request is unavailable"
+
+
+class CircuitBreaker:
+    """Stops calls to a backend after repeated failures
+
+    After `threshold` consecutive failures the breaker opens and
+    rejects calls for `reset_timeout` seconds, then lets a single
+    trial call through and closes again if it succeeds
+    """
+
+    def __init__(self, threshold=5, reset_timeout=10.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class BackendClient:
+    """JSON client for one backend base URL
+
+    Connections are pooled and kept alive by a single requests
+    session. Every call has a total time budget that bounds each
+    attempt's timeout as well as the jittered back-off between retries,
+    and a circuit breaker fails calls fast while the backend is down.
+    A call made while handling a request with a deadline is also
+    limited to the time left until that deadline
+    """
+
+    def __init__(
+        self,
+        base_url,
+        timeout=0.5,
+        budget=1.0,
+        retries=2,
+        backoff=0.05,
+        pool_size=10,
+        breaker=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.budget = budget
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0}
+
+    def get(self, path, budget=None):
+        """Sends a GET request, retrying on connection errors,
+        timeouts and gateway errors
+
+        Arguments:
+            path {string} -- The path, relative to the base URL
+
+        Keyword Arguments:
+            budget {float} -- Seconds the whole call may take,
+                defaulting to the client's budget (default: {None})
+
+        Returns:
+            any -- The decoded JSON response
+        """
+        return self._call("GET", path, None, budget, idempotent=True)
+
+    def post(self, path, body, budget=None, idempotent=False):
+        """Sends a POST request with a JSON body. Unless it is marked
+        idempotent, it is only retried when the connection failed
+
+        Arguments:
+            path {string} -- The path, relative to the base URL
+            body {any} -- The JSON body
+
+        Keyword Arguments:
+            budget {float} -- See get() (default: {None})
+            idempotent {bool} -- Whether the request is safe to
+                retry after it may have reached the backend (default: {False})
+
+        Returns:
+            any -- The decoded JSON response
+        """
+        return self._call("POST", path, body, budget, idempotent=idempotent)
+
+    def close(self):
+        self.session.close()
+
+    def _call(self, method, path, body, budget, idempotent):
+        url = f"{self.base_url}{path}"
+        with span(method, {"http.method": method, "http.url": url}, CLIENT):
+            return self._call_with_retries(method, url, body, budget, idempotent)
+
+    def _call_with_retries(self, method, url, body, budget, idempotent):
+        self.stats["calls"] += 1
+        budget = self.budget if budget is None else budget
+        request_deadline = current_deadline()
+        if request_deadline is not None:
+            # Never outlive the request the call is made for
+            budget = min(budget, request_deadline.remaining())
+        deadline = time.monotonic() + budget
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise BackendUnavailableException(
+                    description=f"[{method} {url}] ran out of time"
+                )
+            if not self.breaker.allow():
+                raise BackendUnavailableException(
+                    description=f"circuit to [{self.base_url}] is open"
+                )
+            self.stats["attempts"] += 1
+            retryable = True
+            try:
+                response = self.session.request(
+                    method, url, json=body, timeout=min(self.timeout, remaining)
+                )
+                if response.status_code < 500:
+                    return self._decode(method, url, response)
+                # Only gateway errors may be gone on the next attempt
+                retryable = idempotent and response.status_code in RETRY_STATUSES
+                error = f"status {response.status_code}"
+            except requests.ConnectionError as e:
+                error = str(e)
+            except requests.Timeout as e:
+                retryable = idempotent
+                error = str(e)
+            except requests.RequestException as e:
+                # Like a broken response body or an invalid URL, which
+                # trying again does not fix
+                retryable = False
+                error = str(e)
+            self.breaker.record_failure()
+            self.stats["failures"] += 1
+            if not retryable or attempt >= self.retries:
+                raise BackendUnavailableException(
+                    description=f"[{method} {url}] failed: {error}"
+                )
+            attempt += 1
+            self.stats["retries"] += 1
+            delay = random.uniform(0, self.backoff * 2**attempt)
+            time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+    def _decode(self, method, url, response):
+        # A client error means the backend is up, while a body that is
+        # not JSON counts against it like a server error
+        if response.status_code >= 400:
+            self.breaker.record_success()
+            raise BackendUnavailableException(
+                description=f"[{method} {url}] failed: status {response.status_code}"
+            )
+        try:
+            result = response.json()
+        except ValueError:
+            self.breaker.record_failure()
+            self.stats["failures"] += 1
+            raise BackendUnavailableException(
+                description=f"[{method} {url}] failed: the response is not JSON"
+            )
+        self.breaker.record_success()
+        return result
+
+
+_clients = {}
+
+
+def get_client():
+    """Gets this worker's client for the backend at BACKEND_URL,
+    creating it on first use so that connection pools are never
+    shared across forked workers
+
+    Returns:
+        BackendClient -- The client, or None if BACKEND_URL is not set
+    """
+    base_url = os.environ.get("BACKEND_URL")
+    if not base_url:
+        return None
+    key = (os.getpid(), base_url)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = BackendClient(
+            base_url,
+            timeout=float(os.environ.get("BACKEND_TIMEOUT", "0.5")),
+            budget=float(os.environ.get("BACKEND_BUDGET", "1.0")),
+            retries=int(os.environ.get("BACKEND_RETRIES", "2")),
+            pool_size=int(os.environ.get("BACKEND_POOL_SIZE", "10")),
+        )
+    return client
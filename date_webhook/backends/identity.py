@@ -0,0 +1,38 @@
+"""Identity backend lookups
+"""
+
+import asyncio
+
+from date_webhook.backends import stub_server
+from date_webhook.backends.client import get_client
+
+
+def verify_identity(person_name, phone_number):
+    """Verifies a customer's identity
+
+    Arguments:
+        person_name {string} -- The customer's name
+        phone_number {string} -- The customer's phone number
+
+    Returns:
+        dict -- Whether the customer is "verified" and their "user_id"
+    """
+    client = get_client()
+    if client is None:
+        return stub_server.verify_identity(person_name, phone_number)
+    return client.post(
+        "/identity/verify",
+        {"person_name": person_name, "phone_number": phone_number},
+        idempotent=True,
+    )
+
+
+async def verify_identity_async(person_name, phone_number):
+    """Coroutine version of verify_identity() that does not block
+    the event loop while waiting for the backend
+    """
+    if get_client() is None:
+        return verify_identity(person_name, phone_number)
+    # to_thread() carries over the request's deadline, unlike
+    # run_in_executor()
+    return await asyncio.to_thread(verify_identity, person_name, phone_number)
@@ -0,0 +1,157 @@
+"""Local stand-in for the account and identity backends
+
+Serves canned data over keep-alive HTTP/1.1 so that the backend
+clients can be tested and benchmarked offline. Latency and failures
+can be injected, and GET /stats reports how many connections and
+requests were served, which shows whether connections are reused.
+The same canned data is used in-process when BACKEND_URL is not set
+
+Run it with:
+    python -m date_webhook.backends.stub_server --port 7400
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_BALANCE_PATH = re.compile(r"^/accounts/([^/]+)/balance$")
+
+
+def balance(user_id):
+    """The canned balance of an account
+
+    Arguments:
+        user_id {any} -- The account's user ID
+
+    Returns:
+        dict -- The amount and currency
+    """
+    return {"user_id": user_id, "amount": "2000.00", "currency": "dollars"}
+
+
+def verify_identity(person_name, phone_number):
+    """The canned result of verifying a customer's identity
+
+    Arguments:
+        person_name {string} -- The customer's name
+        phone_number {string} -- The customer's phone number
+
+    Returns:
+        dict -- Whether the customer was verified, and their user ID
+    """
+    return {"verified": True, "user_id": 123456}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        self.server.count("requests")
+        match = _BALANCE_PATH.match(self.path)
+        if self.path == "/stats":
+            return self._reply(200, self.server.stats)
+        if self._inject():
+            return
+        if match:
+            return self._reply(200, balance(match.group(1)))
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        self.server.count("requests")
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self._inject():
+            return
+        if self.path == "/identity/verify":
+            return self._reply(
+                200,
+                verify_identity(body.get("person_name"), body.get("phone_number")),
+            )
+        self._reply(404, {"error": "not found"})
+
+    def log_message(self, format, *args):
+        pass
+
+    def _inject(self):
+        latency = self.server.latency
+        if self.server.jitter:
+            latency += random.uniform(0, self.server.jitter)
+        if latency:
+            time.sleep(latency)
+        if self.server.failure_rate and random.random() < self.server.failure_rate:
+            self._reply(503, {"error": "injected failure"})
+            return True
+        return False
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, failure_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stats = {"connections": 0, "requests": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def serve_in_background(port=0, **kwargs):
+    """Starts a stub server on a daemon thread
+
+    Keyword Arguments:
+        port {int} -- The port, or 0 for any free port (default: {0})
+
+    Returns:
+        StubServer -- The running server; call shutdown() to stop it
+    """
+    server = StubServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7400)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubServer(
+        (args.host, args.port),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate,
+    )
+    print(f"Serving stub backends on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
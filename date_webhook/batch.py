@@ -0,0 +1,165 @@
+"""Fulfillment of many payloads at once
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from werkzeug.exceptions import BadRequest, HTTPException, InternalServerError
+
+from date_webhook.fulfillment import fulfill, validate_request
+from date_webhook.schema import InvalidPayloadException
+from date_webhook.utils.codec import echo
+from date_webhook.utils.payload import Payload
+
+EXECUTORS = ("inline", "thread", "process")
+
+
+def fulfill_one(item, codec):
+    """Fulfills a single payload, turning any failure into an
+    error result so that it does not affect other payloads
+
+    Arguments:
+        item {bytes or dict} -- The payload, either encoded or decoded
+        codec {JSONCodec} -- The codec used for the payload and result
+
+    Returns:
+        bytes -- The encoded response payload, which is the encoded
+            item itself when fulfillment changed nothing, or an encoded
+            {"error": {...}} object describing the failure
+    """
+    return try_fulfill(item, codec)[0]
+
+
+def try_fulfill(item, codec):
+    """Fulfills a single payload like fulfill_one(), also returning
+    the decoded payload and the exception that failed it
+
+    Arguments:
+        item {bytes or dict} -- The payload, either encoded or decoded
+        codec {JSONCodec} -- The codec used for the payload and result
+
+    Returns:
+        tuple -- The encoded result, the decoded payload or None if it
+            could not be decoded, and the exception or None
+    """
+    payload = body = None
+    try:
+        if isinstance(item, (bytes, str)):
+            body = item
+            try:
+                item = codec.loads(item)
+            except ValueError as e:
+                raise BadRequest(f"Failed to decode JSON object: {e}")
+        payload = item
+        validate_request(item)
+        req = Payload(item)
+        fulfill(req)
+        if body is not None and not req.modified:
+            return echo(body), payload, None
+        return codec.dumps(req.snapshot()), payload, None
+    except HTTPException as e:
+        return codec.dumps(error_result(e)), payload, e
+    except Exception as e:
+        return codec.dumps(error_result(InternalServerError())), payload, e
+
+
+def error_result(e):
+    """Describes an HTTP error as a batch result
+
+    Arguments:
+        e {HTTPException} -- The error
+
+    Returns:
+        dict -- The result, with the schema errors of an invalid payload
+    """
+    error = {"code": e.code, "name": e.name, "description": e.description}
+    if isinstance(e, InvalidPayloadException):
+        error["errors"] = e.errors
+    return {"error": error}
+
+
+def fulfill_many(items, codec, executor=None, window=64):
+    """Fulfills payloads in order, optionally in parallel
+
+    Arguments:
+        items {iterable} -- The payloads, see fulfill_one()
+        codec {JSONCodec} -- The codec used for the payloads and results
+
+    Keyword Arguments:
+        executor {Executor} -- The pool to run on, or None to run in
+            the calling thread (default: {None})
+        window {int} -- The most payloads in flight at once, which
+            bounds memory use for long inputs (default: {64})
+
+    Returns:
+        iterator of bytes -- The results, in the order of the payloads
+    """
+    return map_ordered(partial(fulfill_one, codec=codec), items, executor, window)
+
+
+def map_ordered(fn, items, executor=None, window=64):
+    """Calls a function on every item, optionally in parallel, and
+    yields the results in the order of the items
+
+    Arguments:
+        fn {callable} -- Called with each item, which must be
+            picklable for a process pool
+        items {iterable} -- The items, which are read lazily
+
+    Keyword Arguments:
+        executor {Executor} -- See fulfill_many() (default: {None})
+        window {int} -- The most items in flight at once (default: {64})
+
+    Returns:
+        iterator -- The results
+    """
+    if executor is None:
+        for item in items:
+            yield fn(item)
+        return
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def stream_json_array(results):
+    """Joins encoded results into a streamed JSON array
+
+    Arguments:
+        results {iterable of bytes} -- The encoded results
+
+    Returns:
+        iterator of bytes -- The chunks of the array
+    """
+    yield b"["
+    for index, result in enumerate(results):
+        yield (b"," if index else b"") + result.rstrip(b"\n")
+    yield b"]\n"
+
+
+def make_executor(kind="inline", workers=None):
+    """Creates the pool used to fulfill batches
+
+    Arguments:
+        kind {string} -- One of "inline", "thread" or "process"
+            (default: {"inline"})
+        workers {int} -- The pool size, defaulting to the number of
+            CPUs (default: {None})
+
+    Returns:
+        Executor -- The pool, or None for "inline"
+    """
+    if kind not in EXECUTORS:
+        raise ValueError(
+            f"Unknown batch executor [{kind}], expected one of {EXECUTORS}"
+        )
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return None
@@ -0,0 +1,163 @@
+"""Offline fulfillment of newline-delimited JSON payloads
+
+Reads payloads as a stream, fulfills them in chunks on a process pool
+and writes the results in input order, one per line, while holding no
+more than a few chunks per worker in memory however long the input is.
+A summary of the state and intent combinations that failed, and how,
+is printed to standard error:
+
+    python -m date_webhook.bulk turns.ndjson --output results.ndjson
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from functools import partial
+from itertools import islice
+
+from date_webhook.batch import make_executor, map_ordered, try_fulfill
+from date_webhook.log import LOGGER
+from date_webhook.utils.codec import get_codec
+
+FULFILLED = "fulfilled"
+
+
+def fulfill_chunk(lines, codec):
+    """Fulfills a chunk of encoded payloads
+
+    Arguments:
+        lines {list of bytes} -- The payloads
+        codec {JSONCodec} -- The codec used for the payloads and results
+
+    Returns:
+        tuple -- The encoded results, and a Counter of outcomes by
+            (state, intent, "fulfilled" or the exception type name)
+    """
+    results = []
+    outcomes = Counter()
+    for line in lines:
+        result, payload, error = try_fulfill(line, codec)
+        results.append(result)
+        state = intent = None
+        if isinstance(payload, dict):
+            state = payload.get("state")
+            intent = payload.get("intent")
+        outcome = FULFILLED if error is None else type(error).__name__
+        outcomes[(str(state), str(intent), outcome)] += 1
+    return results, outcomes
+
+
+def fulfill_stream(lines, output, codec, executor=None, chunk_size=256, window=8):
+    """Fulfills a stream of encoded payloads and writes the results
+
+    Arguments:
+        lines {iterable of bytes} -- The payloads, one per line. Blank
+            lines are skipped
+        output {file} -- Binary file the results are written to, one
+            per line and in input order
+        codec {JSONCodec} -- The codec used for the payloads and results
+
+    Keyword Arguments:
+        executor {Executor} -- The pool to run on, or None to run in
+            the calling thread (default: {None})
+        chunk_size {int} -- The payloads sent to a worker at once (default: {256})
+        window {int} -- The most chunks in flight at once (default: {8})
+
+    Returns:
+        Counter -- The outcomes, see fulfill_chunk()
+    """
+    lines = (line for line in lines if line.strip())
+    chunks = iter(lambda: list(islice(lines, chunk_size)), [])
+    outcomes = Counter()
+    fn = partial(fulfill_chunk, codec=codec)
+    for results, chunk_outcomes in map_ordered(fn, chunks, executor, window):
+        output.write(b"".join(results))
+        outcomes.update(chunk_outcomes)
+    return outcomes
+
+
+def summarize(outcomes):
+    """Summarizes the outcomes of a run
+
+    Arguments:
+        outcomes {Counter} -- See fulfill_chunk()
+
+    Returns:
+        dict -- The number of payloads, fulfilled and failed, and the
+            failures by state, intent and exception type, most frequent first
+    """
+    total = sum(outcomes.values())
+    fulfilled = sum(n for key, n in outcomes.items() if key[2] == FULFILLED)
+    failures = [
+        {"state": state, "intent": intent, "error": error, "count": n}
+        for (state, intent, error), n in outcomes.most_common()
+        if error != FULFILLED
+    ]
+    return {
+        "total": total,
+        "fulfilled": fulfilled,
+        "failed": total - fulfilled,
+        "failures": failures,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="NDJSON payloads, or - for standard input")
+    parser.add_argument("--output", help="results file, standard output by default")
+    parser.add_argument("--summary", help="also write the summary to this JSON file")
+    parser.add_argument("--executor", choices=("inline", "process"), default="process")
+    parser.add_argument("--workers", type=int, help="pool size, one per CPU by default")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument(
+        "--json-backend", default=os.environ.get("JSON_BACKEND", "auto")
+    )
+    args = parser.parse_args(argv)
+
+    if "LOG_FILE" not in os.environ:
+        # Fulfillment logs would otherwise be interleaved with results
+        # written to standard output, by this process and by workers
+        # that start afresh and read the environment
+        os.environ["LOG_FILE"] = os.devnull
+        LOGGER.path = os.devnull
+    codec = get_codec(args.json_backend)
+    executor = make_executor(args.executor, args.workers)
+    window = 2 * (args.workers or os.cpu_count() or 1)
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    output = sys.stdout.buffer if args.output is None else open(args.output, "wb")
+    try:
+        outcomes = fulfill_stream(
+            source, output, codec, executor, args.chunk_size, window
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if source is not sys.stdin.buffer:
+            source.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+        else:
+            output.flush()
+
+    summary = summarize(outcomes)
+    print(
+        f"{summary['total']} payloads: {summary['fulfilled']} fulfilled, "
+        f"{summary['failed']} failed",
+        file=sys.stderr,
+    )
+    for failure in summary["failures"]:
+        print(
+            f"{failure['count']:>10}  [{failure['state']}][{failure['intent']}] "
+            f"{failure['error']}",
+            file=sys.stderr,
+        )
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""Resolution of date slot tokens into dates
+
+Tokens like "tomorrow", "next friday", "3 days ago" or "march 5th" are
+resolved to ISO dates relative to the day it is where the user is,
+given by the request's time_offset in minutes from UTC. Dates that do
+not name their year or month, like "march 5th", "may" or "the 5th",
+are the next such date from that day on. Only explicit date forms are
+resolved, so tokens like "5" or "1200" are left alone. Parsing a token
+into a pattern depends only on the token, and resolving a pattern only
+on the token, offset and day, so both are memoized with bounded LRU
+caches and a payload's date values are resolved in one batch
+"""
+
+import os
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+from dateutil.relativedelta import FR, MO, SA, SU, TH, TU, WE, relativedelta
+
+DATE_SLOT_TYPE = "date"
+
+DATE_CACHE_SIZE = int(os.environ.get("DATE_CACHE_SIZE", "4096"))
+
+_WEEKDAYS = {
+    "monday": MO,
+    "tuesday": TU,
+    "wednesday": WE,
+    "thursday": TH,
+    "friday": FR,
+    "saturday": SA,
+    "sunday": SU,
+}
+
+_NUMBERS = {
+    "a": 1,
+    "an": 1,
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+}
+
+_DAYS = {
+    "today": 0,
+    "now": 0,
+    "tonight": 0,
+    "tomorrow": 1,
+    "yesterday": -1,
+    "day after tomorrow": 2,
+    "the day after tomorrow": 2,
+    "day before yesterday": -2,
+    "the day before yesterday": -2,
+}
+
+_UNITS = {"day": "days", "week": "weeks", "month": "months", "year": "years"}
+
+_MONTHS = {
+    "january": 1,
+    "jan": 1,
+    "february": 2,
+    "feb": 2,
+    "march": 3,
+    "mar": 3,
+    "april": 4,
+    "apr": 4,
+    "may": 5,
+    "june": 6,
+    "jun": 6,
+    "july": 7,
+    "jul": 7,
+    "august": 8,
+    "aug": 8,
+    "september": 9,
+    "sept": 9,
+    "sep": 9,
+    "october": 10,
+    "oct": 10,
+    "november": 11,
+    "nov": 11,
+    "december": 12,
+    "dec": 12,
+}
+
+# A date that leaves out its year, or its year and month, stands for
+# the next date that matches from the user's day on
+_Absolute = namedtuple("_Absolute", ["year", "month", "day"])
+
+_NUMBER = r"(\d+|" + "|".join(_NUMBERS) + r")"
+_UNIT = r"(day|week|month|year)s?"
+_IN = re.compile(rf"(?:in )?{_NUMBER} {_UNIT}(?: from (?:now|today))?")
+_AGO = re.compile(rf"{_NUMBER} {_UNIT} ago")
+_NEXT = re.compile(rf"(next|last|this) {_UNIT}")
+_WEEKDAY = re.compile(r"(?:(next|last|this|on) )?(" + "|".join(_WEEKDAYS) + ")")
+_MONTH = r"(" + "|".join(_MONTHS) + r")\.?"
+_DAY = r"(\d{1,2})(?:st|nd|rd|th)?"
+_ISO = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_SLASHED = re.compile(r"(\d{1,2})/(\d{1,2})(?:/(\d{4}|\d{2}))?")
+_MONTH_DAY = re.compile(rf"(?:on )?(?:the )?{_MONTH} (?:the )?{_DAY}(?: (\d{{4}}))?")
+_DAY_MONTH = re.compile(rf"(?:on )?(?:the )?{_DAY} (?:of )?{_MONTH}(?: (\d{{4}}))?")
+_MONTH_YEAR = re.compile(rf"(?:in )?{_MONTH}(?: (\d{{4}}))?")
+# A day of the month on its own needs "the" or an ordinal suffix
+_ORDINAL = re.compile(
+    r"(?:on )?(?:the (\d{1,2})(?:st|nd|rd|th)?|(\d{1,2})(?:st|nd|rd|th))"
+)
+
+
+def resolve_date(tokens, time_offset=0, now=None):
+    """Resolves a date token relative to the user's day
+
+    Arguments:
+        tokens {string} -- The token, like "next friday"
+
+    Keyword Arguments:
+        time_offset {int} -- The user's offset from UTC in minutes (default: {0})
+        now {datetime} -- The current UTC time (default: {None})
+
+    Returns:
+        string -- The ISO date, or None if the token is not a date
+    """
+    if not isinstance(tokens, str):
+        return None
+    offset = time_offset if isinstance(time_offset, int) else 0
+    return _resolve(_normalize(tokens), offset, local_day(offset, now))
+
+
+def resolve_dates(request, now=None):
+    """Resolves every unresolved value of the request's date slots
+    in one batch, leaving the values that are not dates unresolved
+
+    Arguments:
+        request {Payload} -- The request
+
+    Keyword Arguments:
+        now {datetime} -- The current UTC time (default: {None})
+
+    Returns:
+        int -- The number of values resolved
+    """
+    pending = []
+    for slot_name, slot in request.get_slots().items():
+        if slot.get("type") != DATE_SLOT_TYPE:
+            continue
+        for position, slot_value in enumerate(slot["values"]):
+            if "status" in slot_value or slot_value.get("resolved") == 1:
+                continue
+            pending.append((slot_name, position, slot_value.get("tokens")))
+    if not pending:
+        return 0
+    time_offset = None
+    if request.contains_field("time_offset"):
+        time_offset = request.get_time_offset()
+    offset = time_offset if isinstance(time_offset, int) else 0
+    day = local_day(offset, now)
+    resolved = 0
+    for slot_name, position, tokens in pending:
+        if not isinstance(tokens, str):
+            continue
+        value = _resolve(_normalize(tokens), offset, day)
+        if value is not None:
+            request.update_slot_value(
+                slot_name, position, {"value": value, "resolved": 1}
+            )
+            resolved += 1
+    return resolved
+
+
+def local_day(time_offset=0, now=None):
+    """Gets the date it is at an offset from UTC
+
+    Keyword Arguments:
+        time_offset {int} -- The offset from UTC in minutes (default: {0})
+        now {datetime} -- The current UTC time (default: {None})
+
+    Returns:
+        date -- The date
+    """
+    now = now or datetime.now(timezone.utc)
+    return (now + timedelta(minutes=time_offset)).date()
+
+
+def cache_info():
+    """Gets the hits, misses and sizes of the pattern and result caches
+
+    Returns:
+        dict -- The cache_info() of each cache by name
+    """
+    return {
+        "patterns": _pattern.cache_info()._asdict(),
+        "results": _resolve.cache_info()._asdict(),
+    }
+
+
+def _normalize(tokens):
+    return " ".join(tokens.lower().replace(",", " ").split())
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _pattern(tokens):
+    # A pattern is a relativedelta from the user's day, or the text to
+    # parse as an absolute date when the token is not a relative one
+    if tokens in _DAYS:
+        return relativedelta(days=_DAYS[tokens])
+    match = _IN.fullmatch(tokens)
+    if match:
+        return relativedelta(**{_UNITS[match[2]]: _count(match[1])})
+    match = _AGO.fullmatch(tokens)
+    if match:
+        return relativedelta(**{_UNITS[match[2]]: -_count(match[1])})
+    match = _NEXT.fullmatch(tokens)
+    if match:
+        step = {"next": 1, "last": -1, "this": 0}[match[1]]
+        return relativedelta(**{_UNITS[match[2]]: step})
+    match = _WEEKDAY.fullmatch(tokens)
+    if match:
+        weekday = _WEEKDAYS[match[2]]
+        if match[1] == "next":
+            return relativedelta(days=1, weekday=weekday(+1))
+        if match[1] == "last":
+            return relativedelta(days=-1, weekday=weekday(-1))
+        return relativedelta(weekday=weekday(+1))
+    return _absolute(tokens)
+
+
+def _absolute(tokens):
+    match = _ISO.fullmatch(tokens)
+    if match:
+        return _Absolute(int(match[1]), int(match[2]), int(match[3]))
+    match = _SLASHED.fullmatch(tokens)
+    if match:
+        # Month first, as the platform's users write dates
+        year = match[3] and int(match[3])
+        if year is not None and year < 100:
+            year += 2000
+        return _Absolute(year, int(match[1]), int(match[2]))
+    match = _MONTH_DAY.fullmatch(tokens)
+    if match:
+        return _Absolute(match[3] and int(match[3]), _MONTHS[match[1]], int(match[2]))
+    match = _DAY_MONTH.fullmatch(tokens)
+    if match:
+        return _Absolute(match[3] and int(match[3]), _MONTHS[match[2]], int(match[1]))
+    match = _MONTH_YEAR.fullmatch(tokens)
+    if match:
+        return _Absolute(match[2] and int(match[2]), _MONTHS[match[1]], None)
+    match = _ORDINAL.fullmatch(tokens)
+    if match:
+        return _Absolute(None, None, int(match[1] or match[2]))
+    return None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _resolve(tokens, time_offset, day):
+    pattern = _pattern(tokens)
+    if pattern is None:
+        return None
+    if isinstance(pattern, relativedelta):
+        return (day + pattern).isoformat()
+    resolved = _next_date(pattern, day)
+    return None if resolved is None else resolved.isoformat()
+
+
+def _next_date(pattern, today):
+    year, month, day = pattern
+    if month is None:
+        # The next month from this one on that has the day and where
+        # it has not passed
+        for ahead in range(12):
+            months = today.month - 1 + ahead
+            candidate = _date(today.year + months // 12, months % 12 + 1, day)
+            if candidate is not None and candidate >= today:
+                return candidate
+        return None
+    if day is None:
+        # A month stands for its first day, in the next year where the
+        # month has not ended
+        if year is None:
+            year = today.year if month >= today.month else today.year + 1
+        return _date(year, month, 1)
+    if year is not None:
+        return _date(year, month, day)
+    # Up to eight years ahead, so that February 29th finds a leap year
+    for year in range(today.year, today.year + 9):
+        candidate = _date(year, month, day)
+        if candidate is not None and candidate >= today:
+            return candidate
+    return None
+
+
+def _date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _count(number):
+    return int(number) if number.isdigit() else _NUMBERS[number]
@@ -0,0 +1,165 @@
+"""Request deadlines and admission control
+
+The platform stops waiting for a turn after a while. Each request gets
+a deadline from the X-Request-Budget-Ms header, or REQUEST_BUDGET when
+the header is missing, which is kept in a context variable so that the
+pipeline, fulfillers and backend calls made on the request's behalf can
+check how much time is left without it being passed around. A turn
+whose deadline has passed is not fulfilled, one that is about to pass
+is fulfilled by a cheap route instead, and an AdmissionController caps
+the requests each worker works on at once, shedding the rest
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from werkzeug.exceptions import GatewayTimeout, ServiceUnavailable
+
+DEADLINE_HEADER = "X-Request-Budget-Ms"
+
+# Seconds a request may take when it does not say, or 0 for no limit
+REQUEST_BUDGET = float(os.environ.get("REQUEST_BUDGET", "0"))
+
+# Turns with less than this many seconds left are degraded
+DEGRADE_MARGIN = float(os.environ.get("DEGRADE_MARGIN", "0.1"))
+
+# Requests a worker works on at once, or 0 for no limit
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "0"))
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceededException(GatewayTimeout):
+    description = "the request's deadline passed before it was fulfilled"
+    reason = "deadline"
+
+
+class OverloadedException(ServiceUnavailable):
+    description = "the webhook is at capacity, retry the request"
+    reason = "overloaded"
+
+
+class Deadline:
+    """The time by which a request must be answered, and whether it
+    was answered by a degraded route to meet it
+    """
+
+    __slots__ = ("expires", "degraded")
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+        self.degraded = False
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+
+def request_budget(header=None):
+    """Gets the seconds a request may take
+
+    Keyword Arguments:
+        header {string} -- The value of the DEADLINE_HEADER header in
+            milliseconds, if the request has one (default: {None})
+
+    Returns:
+        float -- The seconds, which is the smaller of the header and
+            REQUEST_BUDGET, or None if neither sets a limit
+    """
+    budget = REQUEST_BUDGET or None
+    if header:
+        try:
+            seconds = float(header) / 1000
+        except ValueError:
+            return budget
+        if seconds == seconds and (budget is None or seconds < budget):
+            budget = max(seconds, 0.0)
+    return budget
+
+
+@contextmanager
+def deadline(seconds):
+    """Sets the deadline of the work done within, in this thread or
+    task and the tasks it starts
+
+    Arguments:
+        seconds {float} -- The seconds from now, or None for no deadline
+
+    Yields:
+        Deadline -- The deadline, or None
+    """
+    current = None if seconds is None else Deadline(seconds)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+def current_deadline():
+    """Gets the deadline of the request being handled
+
+    Returns:
+        Deadline -- The deadline, or None if it has none
+    """
+    return _current.get()
+
+
+def remaining():
+    """Gets the seconds left until the current request's deadline
+
+    Returns:
+        float -- The seconds, which are negative once it has passed, or
+            None if the request has no deadline
+    """
+    current = _current.get()
+    return None if current is None else current.remaining()
+
+
+def check_deadline():
+    """Stops work on a request whose deadline has passed, which the
+    platform has stopped waiting for
+
+    Raises:
+        DeadlineExceededException -- If the deadline has passed
+    """
+    current = _current.get()
+    if current is not None and current.remaining() <= 0:
+        raise DeadlineExceededException()
+
+
+class AdmissionController:
+    """Caps the requests a worker works on at once, rejecting the
+    excess right away rather than queueing work that would finish
+    after the platform stopped waiting for it
+    """
+
+    def __init__(self, limit=MAX_IN_FLIGHT):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self):
+        """Holds one of the slots for the work done within
+
+        Raises:
+            OverloadedException -- If every slot is taken
+        """
+        if self.limit <= 0:
+            yield
+            return
+        with self._lock:
+            if self.in_flight >= self.limit:
+                raise OverloadedException()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+ADMISSION = AdmissionController()
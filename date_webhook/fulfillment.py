@@ -1,5 +1,15 @@
 import werkzeug
 
+from date_webhook.log import log_fulfillment
+from date_webhook.metrics import observe_fulfillment
+from date_webhook.pipeline import (
+    Pipeline,
+    normalize_money_slots,
+    resolve_date_slots,
+    resolve_slots,
+)
+from date_webhook.router import Router
+from date_webhook.schema import InvalidPayloadException, route_validator
 from date_webhook.fulfillments import (
     passthrough,
     balance_fulfillment,
@@ -44,22 +54,43 @@ FULFILLMENTS = {
 }
 
 
+ROUTER = Router(FULFILLMENTS)
+
+PIPELINE = Pipeline(
+    ROUTER,
+    preprocessors=[resolve_date_slots, normalize_money_slots, resolve_slots],
+    fallback=panic,
+    observers=[observe_fulfillment, log_fulfillment],
+    degraded=passthrough.handle,
+)
+
+
+def validate_request(payload):
+    """Checks a decoded request payload against the schema of the
+    route it is for, before a Payload is built from it
+
+    Arguments:
+        payload {any} -- The decoded request payload
+
+    Raises:
+        InvalidPayloadException -- If the payload does not match
+    """
+    route = None
+    if type(payload) is dict:
+        state = payload.get("state")
+        intent = payload.get("intent")
+        if type(state) is str and type(intent) is str:
+            route = ROUTER.resolve(state, intent)
+    validator = route_validator(route)
+    if validator is not None:
+        errors = validator(payload)
+        if errors:
+            raise InvalidPayloadException(errors)
+
+
 def fulfill(request):
-    preprocess(request)
-    state = request.get_state()
-    intent = request.get_intent()
-    print("state: ", state)
-    print("intent: ", intent)
-    if state in FULFILLMENTS:
-        if intent in FULFILLMENTS[state]:
-            print(f"Calling fulfiller [{state}][{intent}]")
-            return FULFILLMENTS[state][intent](request)
-        elif "*" in FULFILLMENTS[state]:
-            print(f"Calling fulfiller [{state}][*]")
-            return FULFILLMENTS[state]["*"](request)
-    print(f"Calling fulfiller [*]")
-    return FULFILLMENTS["*"](request)
-
-
-def preprocess(request):
-    pass
+    return PIPELINE.run(request)
+
+
+async def fulfill_async(request):
+    return await PIPELINE.run_async(request)
@@ -1,41 +1,72 @@
+import os
+
+from date_webhook.backends.accounts import get_balance, get_balance_async
+from date_webhook.money import normalize_amount
+from date_webhook.pipeline import blind_resolve, coroutine_variant
+from date_webhook.schema import PAYLOAD_SCHEMA, require, validate
 from date_webhook.utils.payload import Payload
 
+# Seconds a balance is reused for later turns of a conversation, kept
+# short because it changes as the customer spends
+BALANCE_TTL = float(os.environ.get("BALANCE_TTL", "30"))
+
+
+async def handle_async(request: Payload):
+    if _is_authenticated(request):
+        user_id = request.get_field("session_info").get("mufg_user_id")
+        balance = request.get_session_value(f"balance:{user_id}")
+        if balance is None:
+            balance = await get_balance_async(user_id)
+            request.set_session_value(f"balance:{user_id}", balance, ttl=BALANCE_TTL)
+        _set_balance(request, balance)
+    _save_intent(request)
 
+
+@blind_resolve
+@validate(require(PAYLOAD_SCHEMA, session_info={"type": "object"}))
+@coroutine_variant(handle_async)
 def handle(request: Payload):
-    rb = request.get()
-    if "is_authenticated" not in rb.get("session_info"):
-        rb["session_info"]["is_authenticated"] = False
-        rb["state"] = "identity_verification"
-    else:
-        if rb.get("session_info", {}).get("is_authenticated"):
-            rb["slots"]["_BALANCE_"] = {
-                "type": "string",
-                "values": [
-                    {
-                        "status": "CONFIRMED",
-                        "tokens": "2000.00",
-                        "value": "2000.00",
-                        "currency": "dollars",
-                    }
-                ],
-            }
+    if _is_authenticated(request):
+        user_id = request.get_field("session_info").get("mufg_user_id")
+        balance = request.get_session_value(f"balance:{user_id}")
+        if balance is None:
+            balance = get_balance(user_id)
+            request.set_session_value(f"balance:{user_id}", balance, ttl=BALANCE_TTL)
+        _set_balance(request, balance)
+    _save_intent(request)
 
-    # Blind resolve slots
-    for slot in rb["slots"]:
-        for slot_value in rb["slots"][slot]["values"]:
-            if "status" in slot_value:
-                slot_value["status"] = "CONFIRMED"
-            else:
-                slot_value["resolved"] = 1
-            if "value" not in slot_value:
-                slot_value["value"] = slot_value["tokens"]
 
-    # Save intent in a slot
-    rb["slots"]["_INITIAL_INTENT_"] = {
-        "type": "string",
-        "values": [
-            {"status": "CONFIRMED", "tokens": "get balance", "value": "get balance"}
+def _is_authenticated(request: Payload):
+    # Sends sessions that were never asked to verify to identity
+    # verification first
+    session_info = request.get_field("session_info")
+    if "is_authenticated" not in session_info:
+        request.update_field("session_info", {"is_authenticated": False})
+        request.set_field("state", "identity_verification")
+        return False
+    return bool(session_info.get("is_authenticated"))
+
+
+def _set_balance(request: Payload, balance):
+    amount = normalize_amount(balance["amount"])
+    request.set_slot(
+        "_BALANCE_",
+        "string",
+        [
+            {
+                "status": "CONFIRMED",
+                "tokens": balance["amount"],
+                "value": balance["amount"] if amount is None else str(amount[0]),
+                "currency": balance["currency"],
+            }
         ],
-    }
+    )
 
-    request.overwrite(rb)
+
+def _save_intent(request: Payload):
+    # Save intent in a slot
+    request.set_slot(
+        "_INITIAL_INTENT_",
+        "string",
+        [{"status": "CONFIRMED", "tokens": "get balance", "value": "get balance"}],
+    )
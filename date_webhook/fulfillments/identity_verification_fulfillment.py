@@ -1,15 +1,51 @@
+from date_webhook.backends.identity import verify_identity, verify_identity_async
+from date_webhook.pipeline import coroutine_variant
 from date_webhook.utils.payload import Payload
 
 
+async def handle_async(request: Payload):
+    if _has_identity(request):
+        identity = await verify_identity_async(
+            _first_value(request, "_PERSON_NAME_"),
+            _first_value(request, "_PHONE_NUMBER_"),
+        )
+        _authenticate(request, identity)
+    _resume_intent(request)
+
+
+@coroutine_variant(handle_async)
 def handle(request: Payload):
-    rb = request.get()
+    if _has_identity(request):
+        identity = verify_identity(
+            _first_value(request, "_PERSON_NAME_"),
+            _first_value(request, "_PHONE_NUMBER_"),
+        )
+        _authenticate(request, identity)
+    _resume_intent(request)
+
+
+def _has_identity(request: Payload):
+    return request.slot_exists("_PERSON_NAME_") and request.slot_exists(
+        "_PHONE_NUMBER_"
+    )
+
+
+def _authenticate(request: Payload, identity):
+    if identity["verified"]:
+        request.update_field(
+            "session_info",
+            {"is_authenticated": True, "mufg_user_id": identity["user_id"]},
+        )
+
 
-    if "_PERSON_NAME_" in rb["slots"] and "_PHONE_NUMBER_" in rb["slots"]:
-        rb["session_info"]["is_authenticated"] = True
-        rb["session_info"]["mufg_user_id"] = 123456
+def _resume_intent(request: Payload):
+    if request.slot_exists("_INITIAL_INTENT_"):
+        if request.get_slot_values("_INITIAL_INTENT_")[0]["value"] == "get balance":
+            request.set_field("state", "get_balance")
 
-    if "_INITIAL_INTENT_" in rb["slots"]:
-        if rb["slots"]["_INITIAL_INTENT_"]["values"][0]["value"] == "get balance":
-            rb["state"] = "get_balance"
 
-    request.overwrite(rb)
+def _first_value(request: Payload, slot_name):
+    values = request.get_slot_values(slot_name)
+    if not values:
+        return None
+    return values[0].get("value", values[0].get("tokens"))
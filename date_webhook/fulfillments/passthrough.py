@@ -1,17 +1,7 @@
+from date_webhook.pipeline import blind_resolve
 from date_webhook.utils.payload import Payload
 
 
+@blind_resolve
 def handle(request: Payload):
-    rb = request.get()
-
-    # Blind resolve slots
-    for slot in rb["slots"]:
-        for slot_value in rb["slots"][slot]["values"]:
-            if "status" in slot_value:
-                slot_value["status"] = "CONFIRMED"
-            else:
-                slot_value["resolved"] = 1
-            if "value" not in slot_value:
-                slot_value["value"] = slot_value["tokens"]
-
-    request.overwrite(rb)
+    pass
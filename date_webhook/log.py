@@ -0,0 +1,195 @@
+"""Structured logging that never makes a request wait on log I/O
+
+Each record is a dict that is written as one JSON line. Logging a
+record only appends it to an in-memory buffer; a background thread
+encodes and writes buffered records in batches. Records can be
+sampled, and while the buffer is full new records are dropped and
+counted rather than waited on
+"""
+
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+from date_webhook.metrics import LOG_RECORDS_DROPPED
+
+
+class AsyncJsonLogger:
+    """Buffers records and writes them as JSON lines on a background
+    thread, which is started by the first record each process logs
+
+    Keyword Arguments:
+        name {string} -- Identifies the logger in the dropped records
+            metric (default: {"log"})
+        path {string} -- The file to append to, or None to write to
+            standard output (default: {None})
+        max_queue {int} -- The most records that may wait to be
+            written (default: {10000})
+        batch_size {int} -- The most records written at once (default: {256})
+        interval {float} -- Seconds the writer sleeps when the buffer
+            is empty (default: {0.1})
+        sample_rate {float} -- The fraction of sampled records that
+            are kept (default: {1.0})
+        transform {callable} -- Turns each record into the one that
+            is written, on the background thread (default: {None})
+    """
+
+    def __init__(
+        self,
+        name="log",
+        path=None,
+        max_queue=10000,
+        batch_size=256,
+        interval=0.1,
+        sample_rate=1.0,
+        transform=None,
+    ):
+        self.name = name
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.transform = transform
+        self._buffer = deque()
+        self._stream = None
+        self._writing_pid = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def log(self, record, sample=True):
+        """Queues a record to be written
+
+        Arguments:
+            record {dict} -- The JSON-serializable record, which must
+                not be modified afterwards
+
+        Keyword Arguments:
+            sample {bool} -- Whether the record may be sampled out,
+                which should be False for errors (default: {True})
+        """
+        if sample and not self.sample():
+            return
+        if len(self._buffer) >= self.max_queue:
+            LOG_RECORDS_DROPPED.inc(self.name, "overflow")
+            return
+        record.setdefault("time", time.time())
+        self._buffer.append(record)
+        if self._writing_pid != os.getpid():
+            self._start()
+
+    def sample(self):
+        """Decides whether to keep a sampled record, which lets
+        callers skip building records that would be sampled out
+
+        Returns:
+            bool -- Whether to keep it
+        """
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            return True
+        LOG_RECORDS_DROPPED.inc(self.name, "sampled")
+        return False
+
+    def flush(self):
+        """Writes every buffered record, after any batch the
+        background thread is writing
+        """
+        with self._write_lock:
+            while self._buffer:
+                self._write_locked_batch()
+
+    def _start(self):
+        with self._lock:
+            if self._writing_pid == os.getpid():
+                return
+            self._writing_pid = os.getpid()
+        threading.Thread(target=self._write_forever, daemon=True).start()
+        atexit.register(self.flush)
+
+    def _write_forever(self):
+        while True:
+            if self._buffer:
+                self._write_batch()
+            else:
+                time.sleep(self.interval)
+
+    def _write_batch(self):
+        # Batches are written one at a time, in the order they are taken
+        with self._write_lock:
+            self._write_locked_batch()
+
+    def _write_locked_batch(self):
+        lines = []
+        while self._buffer and len(lines) < self.batch_size:
+            try:
+                record = self._buffer.popleft()
+            except IndexError:
+                break
+            try:
+                if self.transform is not None:
+                    record = self.transform(record)
+                lines.append(json.dumps(record, default=str, separators=(",", ":")))
+            except Exception:
+                LOG_RECORDS_DROPPED.inc(self.name, "error")
+        if not lines:
+            return
+        try:
+            stream = self._open()
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+        except (OSError, ValueError):
+            LOG_RECORDS_DROPPED.inc(self.name, "error", amount=len(lines))
+
+    def _open(self):
+        if self.path is None:
+            return sys.stdout
+        if self._stream is None:
+            self._stream = open(self.path, "a", encoding="utf-8")
+        return self._stream
+
+    def _after_fork(self):
+        # The parent writes its own buffered records
+        self._buffer.clear()
+        self._stream = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+
+LOGGER = AsyncJsonLogger(
+    path=os.environ.get("LOG_FILE") or None,
+    max_queue=int(os.environ.get("LOG_QUEUE_SIZE", "10000")),
+    sample_rate=float(os.environ.get("LOG_SAMPLE_RATE", "1.0")),
+)
+
+
+def log_fulfillment(request, route, elapsed, error):
+    """Pipeline observer that logs every fulfillment. Failed
+    fulfillments are never sampled out
+
+    The state and intent are those of the route the request was sent
+    to, while the next state and intent are those the fulfiller left
+    the request in
+    """
+    payload = request.payload
+    record = {
+        "event": "fulfillment",
+        "state": route.state,
+        "intent": route.intent,
+        "next_state": payload.get("state"),
+        "next_intent": payload.get("intent"),
+        "qid": payload.get("qid"),
+        "session_id": payload.get("session_id"),
+        "route": route.name,
+        "handler": route.handler_name,
+        "duration_ms": round(elapsed * 1000, 3),
+    }
+    if error is not None:
+        record["error"] = type(error).__name__
+    LOGGER.log(record, sample=error is None)
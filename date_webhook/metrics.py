@@ -0,0 +1,481 @@
+"""Prometheus metrics for the webhook
+
+Recording takes no locks: each thread records into its own shard of
+every metric, and shards are only summed when the metrics are read.
+When METRICS_DIR is set, every worker process also writes its totals
+to a file there every METRICS_FLUSH_INTERVAL seconds, and GET /metrics
+served by any worker sums the files of all of them. A worker removes
+its file when it exits, and files that were not written for a few
+intervals, such as those of killed workers, are left out of the sum
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from functools import lru_cache
+
+from date_webhook.deadline import (
+    DeadlineExceededException,
+    OverloadedException,
+    current_deadline,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+CHANGE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+# How many flush intervals a worker's file may go unwritten before
+# collecting leaves it out
+STALE_INTERVALS = 3
+
+
+class Metric(ABC):
+    """Base class of metrics whose values are kept in per-thread shards
+
+    A shard maps a tuple of label values to a list of numbers, which
+    is all a thread ever writes to. A thread's shard is merged into
+    the totals of finished threads once the thread is gone
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = None
+        self._reset()
+
+    def collect(self):
+        """Sums the shards of every thread
+
+        Returns:
+            dict -- The summed values by tuple of label values
+        """
+        with self._lock:
+            totals = {}
+            for shard in [self._retired, *self._shards]:
+                _merge(totals, shard)
+        return totals
+
+    def render(self, totals):
+        """Renders values in the Prometheus text format
+
+        Arguments:
+            totals {dict} -- See collect()
+
+        Returns:
+            list -- The lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for labels, values in sorted(totals.items()):
+            lines.extend(self._samples(labels, values))
+        return lines
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            return self._new_shard()
+
+    def _new_shard(self):
+        shard = self._local.shard = {}
+        with self._lock:
+            self._shards.append(shard)
+        weakref.finalize(threading.current_thread(), self._retire, shard)
+        if self.registry is not None:
+            self.registry.start_flushing()
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards = [s for s in self._shards if s is not shard]
+            _merge(self._retired, shard)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _samples(self, labels, values):
+        """Renders the values of a set of labels
+
+        Arguments:
+            labels {tuple} -- The label values
+            values {list} -- The summed values
+
+        Returns:
+            iterable -- The sample lines
+        """
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        """Increments the counter
+
+        Arguments:
+            *labels {string} -- The label values, in the order of labelnames
+
+        Keyword Arguments:
+            amount {number} -- The increment (default: {1})
+        """
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            shard[labels] = [amount]
+        else:
+            values[0] += amount
+
+    def _samples(self, labels, values):
+        yield f"{self.name}{_labels(self.labelnames, labels)} {values[0]!r}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """Records an observation
+
+        Arguments:
+            value {number} -- The observed value
+            *labels {string} -- The label values, in the order of labelnames
+        """
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            # A count per bucket, the +Inf bucket and the sum
+            values = shard[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def _samples(self, labels, values):
+        count = 0
+        bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+        for bound, bucket in zip(bounds, values):
+            count += bucket
+            bucket_labels = _labels((*self.labelnames, "le"), (*labels, bound))
+            yield f"{self.name}_bucket{bucket_labels} {count}"
+        yield f"{self.name}_sum{_labels(self.labelnames, labels)} {values[-1]!r}"
+        yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    """The metrics of the application, and where workers share them
+
+    Keyword Arguments:
+        directory {string} -- Where each worker writes its totals, or
+            None to only report the worker's own (default: {None})
+        interval {float} -- Seconds between writes (default: {5.0})
+    """
+
+    def __init__(self, directory=None, interval=5.0):
+        self.directory = directory
+        self.interval = interval
+        self.metrics = {}
+        self._flushing_pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        metric.registry = self
+        return metric
+
+    def collect(self):
+        """Sums the metrics of this worker, and of every other worker
+        when a directory is set
+
+        Returns:
+            dict -- The values of each metric by name
+        """
+        totals = {name: metric.collect() for name, metric in self.metrics.items()}
+        if self.directory is None:
+            return totals
+        own = self.dump(totals)
+        totals = {name: {} for name in self.metrics}
+        oldest = time.time() - STALE_INTERVALS * self.interval
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                if path != own and os.path.getmtime(path) < oldest:
+                    # The worker is gone without removing its file
+                    continue
+                with open(path) as f:
+                    dumped = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, rows in dumped.items():
+                if name in totals:
+                    _merge(totals[name], {tuple(labels): v for labels, v in rows})
+        return totals
+
+    def render(self):
+        """Renders every metric in the Prometheus text format
+
+        Returns:
+            string -- The exposition
+        """
+        totals = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.extend(metric.render(totals[name]))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, totals=None):
+        """Writes this worker's totals to its file in the directory
+
+        Keyword Arguments:
+            totals {dict} -- The totals to write, collected from this
+                worker when not given (default: {None})
+
+        Returns:
+            string -- The path of the file
+        """
+        if totals is None:
+            totals = {name: metric.collect() for name, metric in self.metrics.items()}
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(
+                {name: list(values.items()) for name, values in totals.items()}, f
+            )
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    def start_flushing(self):
+        """Starts writing this worker's totals in the background, if a
+        directory is set and this worker is not already doing so
+        """
+        if self.directory is None or self._flushing_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flushing_pid == os.getpid():
+                return
+            self._flushing_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, daemon=True).start()
+        atexit.register(self._remove)
+
+    def _flush_forever(self):
+        pid = os.getpid()
+        while True:
+            time.sleep(self.interval)
+            if self._flushing_pid != pid:
+                return
+            self._flush()
+
+    def _flush(self):
+        try:
+            self.dump()
+        except OSError:
+            pass
+
+    def _remove(self):
+        # The totals of a worker that exited no longer count
+        self._flushing_pid = None
+        try:
+            os.remove(self._path())
+        except OSError:
+            pass
+
+    def _path(self):
+        return os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+
+    def _after_fork(self):
+        # Forked workers start from zero rather than from their parent's values
+        self._lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric._reset()
+
+
+def _merge(totals, shard):
+    # Copying the shard first is atomic, unlike iterating over it
+    for labels, values in shard.copy().items():
+        existing = totals.get(labels)
+        if existing is None:
+            totals[labels] = list(values)
+        else:
+            for i, value in enumerate(values):
+                existing[i] += value
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+REGISTRY = Registry(
+    os.environ.get("METRICS_DIR") or None,
+    float(os.environ.get("METRICS_FLUSH_INTERVAL", "5")),
+)
+
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "webhook_request_duration_seconds",
+        "Time spent in each phase of a webhook request",
+        ("endpoint", "phase"),
+    )
+)
+REQUEST_BYTES = REGISTRY.register(
+    Histogram(
+        "webhook_request_size_bytes",
+        "Size of webhook request bodies",
+        ("endpoint",),
+        SIZE_BUCKETS,
+    )
+)
+RESPONSE_BYTES = REGISTRY.register(
+    Histogram(
+        "webhook_response_size_bytes",
+        "Size of webhook response bodies",
+        ("endpoint",),
+        SIZE_BUCKETS,
+    )
+)
+REQUEST_ERRORS = REGISTRY.register(
+    Counter(
+        "webhook_request_errors_total",
+        "Webhook requests that failed, by exception type",
+        ("endpoint", "type"),
+    )
+)
+FULFILLMENT_SECONDS = REGISTRY.register(
+    Histogram(
+        "webhook_fulfillment_duration_seconds",
+        "Time spent fulfilling requests, by route and fulfiller",
+        ("state", "intent", "handler"),
+    )
+)
+FULFILLMENT_CHANGES = REGISTRY.register(
+    Histogram(
+        "webhook_fulfillment_changes",
+        "Fields, slots, slot values and response slots that each "
+        "fulfillment changed, by route and fulfiller",
+        ("state", "intent", "handler"),
+        CHANGE_BUCKETS,
+    )
+)
+FULFILLMENT_ERRORS = REGISTRY.register(
+    Counter(
+        "webhook_fulfillment_errors_total",
+        "Fulfillments that failed, by route, fulfiller and exception type",
+        ("state", "intent", "handler", "type"),
+    )
+)
+REQUESTS_SHED = REGISTRY.register(
+    Counter(
+        "webhook_requests_shed_total",
+        "Webhook requests turned away because the worker was at capacity "
+        "or their deadline passed before they were fulfilled, by reason",
+        ("endpoint", "reason"),
+    )
+)
+FULFILLMENTS_DEGRADED = REGISTRY.register(
+    Counter(
+        "webhook_fulfillments_degraded_total",
+        "Fulfillments handed to the degraded fulfiller because their "
+        "deadline was too close, by the route they were for",
+        ("state", "intent"),
+    )
+)
+LOG_RECORDS_DROPPED = REGISTRY.register(
+    Counter(
+        "webhook_log_records_dropped_total",
+        "Log records that were sampled out, did not fit in the buffer "
+        "or failed to be written, by logger",
+        ("log", "reason"),
+    )
+)
+
+
+class RequestTimer:
+    """Records the phases, sizes and errors of one request to an endpoint
+
+    Each call to lap() records the time since the previous lap, or
+    since the timer was created, as the given phase
+    """
+
+    __slots__ = ("endpoint", "started", "last")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        REQUEST_SECONDS.observe(now - self.last, self.endpoint, phase)
+        self.last = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def finish(self, request_size, response_size):
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - self.started, self.endpoint, "total"
+        )
+        REQUEST_BYTES.observe(request_size, self.endpoint)
+        RESPONSE_BYTES.observe(response_size, self.endpoint)
+
+    def fail(self, error):
+        REQUEST_ERRORS.inc(self.endpoint, type(error).__name__)
+        if isinstance(error, (OverloadedException, DeadlineExceededException)):
+            REQUESTS_SHED.inc(self.endpoint, error.reason)
+
+
+def observe_fulfillment(request, route, elapsed, error):
+    """Pipeline observer that records how long each route's fulfiller
+    took, how much of the payload it changed, how it failed and whether
+    it was degraded to meet the request's deadline
+    """
+    labels = _route_labels(route)
+    deadline = current_deadline()
+    if deadline is not None and deadline.degraded:
+        FULFILLMENTS_DEGRADED.inc(route.state, route.intent)
+    FULFILLMENT_SECONDS.observe(elapsed, *labels)
+    FULFILLMENT_CHANGES.observe(len(request.changes()), *labels)
+    if error is not None:
+        FULFILLMENT_ERRORS.inc(*labels, type(error).__name__)
+
+
+@lru_cache(maxsize=None)
+def _route_labels(route):
+    return (route.state, route.intent, route.handler_name)
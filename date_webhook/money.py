@@ -0,0 +1,237 @@
+"""Normalization of money slot tokens into amounts and currencies
+
+Tokens like "50k", "$1,200.50", "2.5 million euros" or "two thousand"
+are normalized to a Decimal amount in cents precision and a canonical
+currency name. Slot values keep the amount as a decimal string like
+"1200.50", so that payloads stay plain JSON. The grammar is compiled
+once at import, normalizing a token depends only on the token so
+results are memoized with a bounded LRU cache, and a payload's money
+values are normalized in one batch
+"""
+
+import os
+import re
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+MONEY_SLOT_TYPE = "money"
+
+# Slots that hold amounts whatever type the platform gives them
+MONEY_SLOTS = frozenset(
+    ("_AMBIGUOUS_AMOUNT_", "_ANNUAL_INCOME_", "_ESTIMATE_AMOUNT_", "_DESIRED_LIMIT_")
+)
+
+DEFAULT_CURRENCY = "dollars"
+
+MONEY_CACHE_SIZE = int(os.environ.get("MONEY_CACHE_SIZE", "4096"))
+
+_CENTS = Decimal("0.01")
+
+_CURRENCIES = {
+    "$": "dollars",
+    "usd": "dollars",
+    "dollar": "dollars",
+    "dollars": "dollars",
+    "buck": "dollars",
+    "bucks": "dollars",
+    "€": "euros",
+    "eur": "euros",
+    "euro": "euros",
+    "euros": "euros",
+    "£": "pounds",
+    "gbp": "pounds",
+    "pound": "pounds",
+    "pounds": "pounds",
+    "¥": "yen",
+    "jpy": "yen",
+    "yen": "yen",
+}
+
+_MULTIPLIERS = {
+    "k": 1000,
+    "thousand": 1000,
+    "grand": 1000,
+    "m": 1000000,
+    "mm": 1000000,
+    "million": 1000000,
+    "b": 1000000000,
+    "bn": 1000000000,
+    "billion": 1000000000,
+}
+
+_UNITS = {
+    "zero": 0,
+    "a": 1,
+    "an": 1,
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+    "eleven": 11,
+    "twelve": 12,
+    "thirteen": 13,
+    "fourteen": 14,
+    "fifteen": 15,
+    "sixteen": 16,
+    "seventeen": 17,
+    "eighteen": 18,
+    "nineteen": 19,
+    "twenty": 20,
+    "thirty": 30,
+    "forty": 40,
+    "fifty": 50,
+    "sixty": 60,
+    "seventy": 70,
+    "eighty": 80,
+    "ninety": 90,
+}
+
+
+def _alternatives(words):
+    # Longest first so that "mm" is not matched as "m"
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+_SYMBOL = r"[$€£¥]"
+_CURRENCY = rf"(?:{_alternatives(_CURRENCIES)})"
+_MULTIPLIER = rf"(?:{_alternatives(_MULTIPLIERS)})"
+_NUMERIC = re.compile(
+    rf"(?P<symbol>{_SYMBOL})?\s*"
+    r"(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.\d+|\d+)\s*"
+    rf"(?P<multiplier>{_MULTIPLIER})?\s*"
+    rf"(?P<currency>{_CURRENCY})?"
+)
+_WORD = rf"(?:{_alternatives([*_UNITS, *_MULTIPLIERS, 'hundred', 'and'])})"
+_WORDS = re.compile(
+    rf"(?P<symbol>{_SYMBOL})?\s*"
+    rf"(?P<words>{_WORD}(?:[\s-]+{_WORD})*)\s*"
+    rf"(?P<currency>{_CURRENCY})?"
+)
+_SEPARATOR = re.compile(r"[\s-]+")
+
+# Words that are not an amount on their own, like the "a" of "a grand"
+_FILLERS = frozenset(("a", "an", "and", "k", "m", "mm", "b", "bn"))
+
+
+def normalize_amount(tokens):
+    """Normalizes a money token into an amount and currency
+
+    Arguments:
+        tokens {string} -- The token, like "$1,200.50" or "two thousand"
+
+    Returns:
+        tuple -- The Decimal amount and the currency name, which is
+            DEFAULT_CURRENCY when the token names none, or None if the
+            token is not an amount
+    """
+    if isinstance(tokens, (int, float, Decimal)) and not isinstance(tokens, bool):
+        tokens = str(tokens)
+    if not isinstance(tokens, str):
+        return None
+    return _normalize(" ".join(tokens.lower().split()))
+
+
+def normalize_money(request):
+    """Normalizes every unresolved value of the request's money slots,
+    those of type "money" and those named in MONEY_SLOTS, in one batch,
+    into a decimal string value and a currency, leaving the values that
+    are not amounts unresolved
+
+    Arguments:
+        request {Payload} -- The request
+
+    Returns:
+        int -- The number of values normalized
+    """
+    normalized = 0
+    for slot_name, slot in request.get_slots().items():
+        if slot_name not in MONEY_SLOTS and slot.get("type") != MONEY_SLOT_TYPE:
+            continue
+        for position, slot_value in enumerate(slot["values"]):
+            if "status" in slot_value or slot_value.get("resolved") == 1:
+                continue
+            money = normalize_amount(slot_value.get("tokens"))
+            if money is not None:
+                request.update_slot_value(
+                    slot_name,
+                    position,
+                    {"value": str(money[0]), "currency": money[1], "resolved": 1},
+                )
+                normalized += 1
+    return normalized
+
+
+def cache_info():
+    """Gets the hits, misses and size of the normalization cache
+
+    Returns:
+        dict -- The cache_info() of the cache
+    """
+    return _normalize.cache_info()._asdict()
+
+
+@lru_cache(maxsize=MONEY_CACHE_SIZE)
+def _normalize(tokens):
+    match = _NUMERIC.fullmatch(tokens)
+    if match:
+        try:
+            amount = Decimal(match["number"].replace(",", ""))
+            if match["multiplier"]:
+                amount *= _MULTIPLIERS[match["multiplier"]]
+            # Amounts with more digits than the context's precision
+            # cannot be quantized to cents
+            amount = amount.quantize(_CENTS)
+        except InvalidOperation:
+            return None
+    else:
+        match = _WORDS.fullmatch(tokens)
+        amount = None if match is None else _words(match["words"])
+        if amount is None:
+            return None
+        amount = amount.quantize(_CENTS)
+    currency = match["currency"] or match["symbol"]
+    currency = _CURRENCIES[currency] if currency else DEFAULT_CURRENCY
+    return amount, currency
+
+
+def _words(text):
+    # "two thousand five hundred and fifty" -> 2500 + 50: units and
+    # hundreds add up to a group that each scale word multiplies
+    total = group = 0
+    numbers = 0
+    last = None
+    for word in _SEPARATOR.split(text):
+        if word == "and":
+            continue
+        if word == "hundred":
+            if group >= 100:
+                return None
+            group = (group or 1) * 100
+            last = word
+        elif word in _MULTIPLIERS:
+            total += (group or 1) * _MULTIPLIERS[word]
+            group = 0
+            last = word
+        else:
+            unit = _UNITS[word]
+            # Only a tens word may be followed by a unit, as in
+            # "twenty five", and only by one below ten, so that "one
+            # two" or "twenty thirty" are not added up
+            if last in _UNITS and not (_is_tens(_UNITS[last]) and 0 < unit < 10):
+                return None
+            group += unit
+            last = word
+        numbers += word not in _FILLERS
+    if not numbers:
+        return None
+    return Decimal(total + group)
+
+
+def _is_tens(value):
+    return value >= 20 and value % 10 == 0
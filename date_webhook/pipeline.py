@@ -0,0 +1,267 @@
+"""Middleware pipeline that wraps every fulfillment
+"""
+
+import asyncio
+import inspect
+import time
+
+from date_webhook.dates import resolve_dates
+from date_webhook.deadline import (
+    DEGRADE_MARGIN,
+    DeadlineExceededException,
+    current_deadline,
+)
+from date_webhook.money import normalize_money
+from date_webhook.router import WILDCARD, Route
+from date_webhook.tracing import NOT_TRACED, current_span, span
+
+
+def blind_resolve(handler):
+    """Decorator that opts a fulfiller into having every slot value
+    resolved by the resolve_slots stage before it is called
+
+    Arguments:
+        handler {callable} -- The fulfiller
+
+    Returns:
+        callable -- The same fulfiller
+    """
+    handler.blind_resolve = True
+    return handler
+
+
+def coroutine_variant(coroutine_function):
+    """Decorator that gives a synchronous fulfiller a coroutine
+    function that run_async() awaits in its place, so that it can wait
+    on backends without blocking an event loop, while run() calls the
+    synchronous fulfiller without starting one
+
+    Arguments:
+        coroutine_function {callable} -- The coroutine version of the
+            fulfiller, called with the request
+
+    Returns:
+        callable -- The decorator
+    """
+
+    def decorator(handler):
+        handler.coroutine_variant = coroutine_function
+        return handler
+
+    return decorator
+
+
+def resolve_date_slots(request, route):
+    """Pre-processing stage that resolves the values of the request's
+    date slots relative to its time offset
+    """
+    resolve_dates(request)
+
+
+def normalize_money_slots(request, route):
+    """Pre-processing stage that normalizes the values of the request's
+    money slots into amounts and currencies
+    """
+    normalize_money(request)
+
+
+def resolve_slots(request, route):
+    """Pre-processing stage that blind resolves the request's slots
+    for fulfillers decorated with blind_resolve
+    """
+    if getattr(route.handler, "blind_resolve", False):
+        request.blind_resolve()
+
+
+class Pipeline:
+    """Routes a request and runs it through ordered pre-processing
+    stages, the fulfiller and ordered post-processing stages
+
+    Every stage is called with the request Payload, which it changes
+    in place, and the Route that was chosen for it. Fulfillers may be
+    coroutine functions, which run() runs on a new event loop, or have
+    a coroutine_variant that only run_async() awaits, while stages are
+    always synchronous. Observers are then called with the request, the
+    route, the seconds the stages and fulfiller took and the exception
+    that failed them, or None
+
+    A request whose deadline has passed is not fulfilled, and one with
+    less than degrade_margin seconds left is fulfilled by the degraded
+    fulfiller instead of its route's, if there is one
+    """
+
+    def __init__(
+        self,
+        router,
+        preprocessors=(),
+        postprocessors=(),
+        fallback=None,
+        observers=(),
+        degraded=None,
+        degrade_margin=DEGRADE_MARGIN,
+    ):
+        self.router = router
+        self.preprocessors = list(preprocessors)
+        self.postprocessors = list(postprocessors)
+        self.observers = list(observers)
+        self.fallback = None
+        if fallback is not None:
+            self.fallback = Route(WILDCARD, WILDCARD, fallback)
+        self.degraded = degraded
+        self.degrade_margin = degrade_margin
+
+    def preprocessor(self, stage):
+        """Appends a stage that runs before the fulfiller. Can be
+        used as a decorator
+
+        Arguments:
+            stage {callable} -- Called with the request and route
+
+        Returns:
+            callable -- The stage
+        """
+        self.preprocessors.append(stage)
+        return stage
+
+    def postprocessor(self, stage):
+        """Appends a stage that runs after the fulfiller. Can be
+        used as a decorator
+
+        Arguments:
+            stage {callable} -- Called with the request and route
+
+        Returns:
+            callable -- The stage
+        """
+        self.postprocessors.append(stage)
+        return stage
+
+    def observer(self, observer):
+        """Appends an observer of finished and failed fulfillments.
+        Can be used as a decorator
+
+        Arguments:
+            observer {callable} -- Called with the request, route,
+                elapsed seconds and exception
+
+        Returns:
+            callable -- The observer
+        """
+        self.observers.append(observer)
+        return observer
+
+    def route(self, request):
+        """Finds the route for a request
+
+        Arguments:
+            request {Payload} -- The request
+
+        Returns:
+            Route -- The matching route, or the fallback route
+        """
+        route = self.router.resolve(request.get_state(), request.get_intent())
+        if route is None:
+            return self.fallback
+        return route
+
+    def run(self, request):
+        """Fulfills a request. A coroutine fulfiller is run to
+        completion on a new event loop, so this must not be called
+        from a running loop; use run_async() there instead
+
+        Arguments:
+            request {Payload} -- The request
+
+        Returns:
+            any -- Whatever the fulfiller returns
+        """
+        with span("route"):
+            route = self._route_in_time(request)
+        started = time.perf_counter()
+        try:
+            self._preprocess(request, route)
+            with self._handler_span(route):
+                result = route.handler(request)
+                if inspect.isawaitable(result):
+                    result = asyncio.run(_await(result))
+            self._postprocess(request, route)
+        except Exception as e:
+            self._observe(request, route, started, e)
+            raise
+        self._observe(request, route, started, None)
+        return result
+
+    async def run_async(self, request):
+        """Fulfills a request, awaiting the fulfiller if it is a
+        coroutine function and calling it directly otherwise
+
+        Arguments:
+            request {Payload} -- The request
+
+        Returns:
+            any -- Whatever the fulfiller returns
+        """
+        with span("route"):
+            route = self._route_in_time(request)
+        started = time.perf_counter()
+        try:
+            self._preprocess(request, route)
+            handler = getattr(route.handler, "coroutine_variant", route.handler)
+            with self._handler_span(route):
+                result = handler(request)
+                if inspect.isawaitable(result):
+                    result = await result
+            self._postprocess(request, route)
+        except Exception as e:
+            self._observe(request, route, started, e)
+            raise
+        self._observe(request, route, started, None)
+        return result
+
+    def _route_in_time(self, request):
+        route = self.route(request)
+        deadline = current_deadline()
+        if deadline is None:
+            return route
+        left = deadline.remaining()
+        if left <= 0:
+            raise DeadlineExceededException()
+        if self.degraded is not None and left < self.degrade_margin:
+            # Keep the route's state and intent so that the degraded
+            # fulfillment is reported under the route it stood in for
+            deadline.degraded = True
+            if route is None:
+                return Route(WILDCARD, WILDCARD, self.degraded)
+            return Route(route.state, route.intent, self.degraded)
+        return route
+
+    def _handler_span(self, route):
+        if current_span() is None:
+            return NOT_TRACED
+        return span(route.handler_name, {"state": route.state, "intent": route.intent})
+
+    def _preprocess(self, request, route):
+        _run_stages(self.preprocessors, request, route)
+
+    def _postprocess(self, request, route):
+        _run_stages(self.postprocessors, request, route)
+
+    def _observe(self, request, route, started, error):
+        if self.observers:
+            elapsed = time.perf_counter() - started
+            _run_stages(self.observers, request, route, elapsed, error)
+
+
+def _run_stages(stages, *args):
+    # Untraced turns skip building a span name for every stage
+    if current_span() is None:
+        for stage in stages:
+            stage(*args)
+        return
+    for stage in stages:
+        with span(getattr(stage, "__name__", type(stage).__name__)):
+            stage(*args)
+
+
+async def _await(awaitable):
+    return await awaitable
@@ -0,0 +1,157 @@
+"""Recording of webhook traffic for replay
+
+When RECORD_FILE is set, a sample of the turns that "/" fulfills is
+appended to it as newline-delimited JSON request and response pairs,
+which benchmarks/replay.py replays against new builds. Personal fields,
+session IDs and slots are replaced by pseudonyms, off the request
+thread. A pseudonym is a keyed hash of the value, so that it cannot be
+reversed by hashing guesses without RECORD_SCRUB_KEY. The same value
+always gets the same pseudonym under a key, so responses that echo a
+request field still match when a scrubbed request is replayed
+"""
+
+import hashlib
+import hmac
+import json
+import os
+
+from date_webhook.log import AsyncJsonLogger
+
+
+def _names(variable, default):
+    return tuple(name for name in os.environ.get(variable, default).split(",") if name)
+
+
+SCRUB_FIELDS = _names(
+    "RECORD_SCRUB_FIELDS", "session_id,external_user_id,query,lat,lon"
+)
+SCRUB_SLOTS = _names("RECORD_SCRUB_SLOTS", "_PERSON_NAME_,_PHONE_NUMBER_")
+SCRUB_SESSION_FIELDS = _names("RECORD_SCRUB_SESSION_FIELDS", "mufg_user_id")
+
+# Without a key each process makes its own, so pseudonyms only match
+# within the recordings of one worker
+SCRUB_KEY = os.environ.get("RECORD_SCRUB_KEY", "").encode("utf-8") or os.urandom(32)
+
+
+def scrub(
+    payload,
+    fields=SCRUB_FIELDS,
+    slots=SCRUB_SLOTS,
+    session_fields=SCRUB_SESSION_FIELDS,
+):
+    """Replaces personal data in a payload with pseudonyms
+
+    Arguments:
+        payload {dict} -- The request or response payload, which is
+            not modified
+
+    Keyword Arguments:
+        fields {tuple} -- The top-level fields to scrub (default: {SCRUB_FIELDS})
+        slots {tuple} -- The slots whose tokens and values to scrub
+            (default: {SCRUB_SLOTS})
+        session_fields {tuple} -- The fields of session_info to scrub
+            (default: {SCRUB_SESSION_FIELDS})
+
+    Returns:
+        dict -- The scrubbed payload
+    """
+    if not isinstance(payload, dict):
+        return payload
+    scrubbed = dict(payload)
+    for field in fields:
+        if field in scrubbed:
+            scrubbed[field] = pseudonym(scrubbed[field])
+    session_info = scrubbed.get("session_info")
+    if isinstance(session_info, dict) and any(
+        field in session_info for field in session_fields
+    ):
+        scrubbed["session_info"] = {
+            name: pseudonym(value) if name in session_fields else value
+            for name, value in session_info.items()
+        }
+    payload_slots = scrubbed.get("slots")
+    if isinstance(payload_slots, dict) and any(s in payload_slots for s in slots):
+        scrubbed["slots"] = {
+            name: _scrub_slot(slot) if name in slots else slot
+            for name, slot in payload_slots.items()
+        }
+    return scrubbed
+
+
+def pseudonym(value, key=None):
+    """Gets the pseudonym of a JSON value
+
+    Arguments:
+        value {any} -- The value
+
+    Keyword Arguments:
+        key {bytes} -- The secret key of the hash (default: {SCRUB_KEY})
+
+    Returns:
+        string -- A pseudonym that depends only on the value and key
+    """
+    if value is None:
+        return None
+    digest = hmac.new(
+        SCRUB_KEY if key is None else key,
+        json.dumps(value, sort_keys=True).encode("utf-8"),
+        hashlib.sha256,
+    )
+    return f"scrubbed-{digest.hexdigest()[:32]}"
+
+
+def _scrub_slot(slot):
+    return {
+        **slot,
+        "values": [
+            {
+                key: pseudonym(value) if key in ("tokens", "value") else value
+                for key, value in slot_value.items()
+            }
+            for slot_value in slot.get("values", [])
+        ],
+    }
+
+
+def _scrub_record(record):
+    response = record["response"]
+    if isinstance(response, bytes):
+        response = json.loads(response)
+    return {
+        **record,
+        "request": scrub(record["request"]),
+        "response": scrub(response),
+    }
+
+
+RECORDER = None
+if os.environ.get("RECORD_FILE"):
+    RECORDER = AsyncJsonLogger(
+        name="recording",
+        path=os.environ["RECORD_FILE"],
+        sample_rate=float(os.environ.get("RECORD_SAMPLE_RATE", "1.0")),
+        transform=_scrub_record,
+    )
+
+
+def record_turn(request, response, elapsed):
+    """Records a fulfilled turn if recording is on and the turn is
+    sampled
+
+    Arguments:
+        request {dict} -- The decoded request payload, which must not
+            be modified afterwards
+        response {bytes} -- The encoded response
+        elapsed {float} -- Seconds the turn took to serve
+    """
+    if RECORDER is None or not RECORDER.sample():
+        return
+    RECORDER.log(
+        {
+            "request": request,
+            "response": response,
+            "status": 200,
+            "duration_ms": round(elapsed * 1000, 3),
+        },
+        sample=False,
+    )
@@ -0,0 +1,166 @@
+"""Routing of requests to fulfillers by state and intent
+"""
+
+import inspect
+from collections import namedtuple
+
+WILDCARD = "*"
+
+
+class InvalidRouteException(Exception):
+    pass
+
+
+class Route(namedtuple("Route", ["state", "intent", "handler"])):
+    __slots__ = ()
+
+    @property
+    def name(self):
+        if self.state == WILDCARD:
+            return f"[{WILDCARD}]"
+        return f"[{self.state}][{self.intent}]"
+
+    @property
+    def handler_name(self):
+        module = getattr(self.handler, "__module__", "").rsplit(".", 1)[-1]
+        name = getattr(self.handler, "__qualname__", type(self.handler).__name__)
+        return f"{module}.{name}"
+
+
+class Router:
+    """Maps state and intent pairs to fulfillers
+
+    Exact and wildcard routes share a single dict keyed by
+    (state, intent), so resolving a request takes at most three
+    lookups no matter how many routes are registered. Every
+    fulfiller is validated when it is added rather than when
+    the first request reaches it
+    """
+
+    def __init__(self, table=None):
+        self._routes = {}
+        if table is not None:
+            self.load(table)
+
+    def load(self, table):
+        """Adds every route of a fulfillment table
+
+        Arguments:
+            table {dict} -- Maps each state to a dict of intent
+                to fulfiller, where the intent may be the "*"
+                wildcard. The "*" state maps directly to the
+                fulfiller used when nothing else matches
+
+        Returns:
+            Router -- A reference to the class instance
+        """
+        if not isinstance(table, dict):
+            raise InvalidRouteException("Fulfillment table must be a dict")
+        for state, intents in table.items():
+            if state == WILDCARD:
+                self.add(WILDCARD, WILDCARD, intents)
+            elif isinstance(intents, dict):
+                for intent, handler in intents.items():
+                    self.add(state, intent, handler)
+            else:
+                raise InvalidRouteException(
+                    f"State [{state}] must map intents to fulfillers"
+                )
+        return self
+
+    def add(self, state, intent, handler, replace=False):
+        """Adds a route
+
+        Arguments:
+            state {string} -- The state name, or "*" for the route
+                used when nothing else matches
+            intent {string} -- The intent name, or "*" for any intent
+            handler {callable} -- The fulfiller, called with the
+                request Payload
+
+        Keyword Arguments:
+            replace {bool} -- Whether an existing route for the
+                same state and intent may be replaced (default: {False})
+
+        Returns:
+            Router -- A reference to the class instance
+        """
+        for part in (state, intent):
+            if not isinstance(part, str) or not part:
+                raise InvalidRouteException(
+                    f"Route [{state}][{intent}] must use non-empty string names"
+                )
+        if state == WILDCARD and intent != WILDCARD:
+            raise InvalidRouteException(
+                f"Route [{state}][{intent}] must use a wildcard intent"
+            )
+        _validate_handler(state, intent, handler)
+        if (state, intent) in self._routes and not replace:
+            raise InvalidRouteException(f"Route [{state}][{intent}] already exists")
+        self._routes[(state, intent)] = Route(state, intent, handler)
+        return self
+
+    def register(self, state, intent=WILDCARD, replace=False):
+        """Decorator that adds the decorated fulfiller as a route
+
+        Arguments:
+            state {string} -- The state name
+
+        Keyword Arguments:
+            intent {string} -- The intent name (default: {"*"})
+            replace {bool} -- See add() (default: {False})
+
+        Returns:
+            callable -- The decorator
+        """
+
+        def decorator(handler):
+            self.add(state, intent, handler, replace=replace)
+            return handler
+
+        return decorator
+
+    def resolve(self, state, intent):
+        """Finds the route for a state and intent pair, preferring
+        an exact match over the state's wildcard intent over the
+        catch-all route
+
+        Arguments:
+            state {string} -- The state name
+            intent {string} -- The intent name
+
+        Returns:
+            Route -- The matching route or None if there is none
+        """
+        routes = self._routes
+        return (
+            routes.get((state, intent))
+            or routes.get((state, WILDCARD))
+            or routes.get((WILDCARD, WILDCARD))
+        )
+
+    def __contains__(self, key):
+        return key in self._routes
+
+    def __iter__(self):
+        return iter(self._routes.values())
+
+    def __len__(self):
+        return len(self._routes)
+
+
+def _validate_handler(state, intent, handler):
+    if not callable(handler):
+        raise InvalidRouteException(
+            f"Fulfiller for route [{state}][{intent}] is not callable"
+        )
+    try:
+        inspect.signature(handler).bind(None)
+    except ValueError:
+        # Some builtins do not expose a signature
+        pass
+    except TypeError:
+        raise InvalidRouteException(
+            f"Fulfiller for route [{state}][{intent}] must take the request "
+            f"as its only argument"
+        )
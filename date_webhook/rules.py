@@ -0,0 +1,238 @@
+"""Declarative slot transfer rules compiled into decision tables
+
+A rule is a dict of conditions and the actions taken when they hold:
+
+    {
+        "name": "annual_income",
+        "intent": "ambiguous_amount_start",
+        "exists": ["ambiguous_amount"],
+        "missing": ["annual_income"],
+        "actions": [{"move": "ambiguous_amount", "to": "annual_income"}],
+    }
+
+Conditions are "state" and "intent", each a name or a list of names,
+and "exists", "missing" and "resolved", lists of slots that must be in
+the payload, must not be, or must have a resolved value. Actions are
+
+- {"copy": slot, "to": slot} -- sets the target slot to the first
+  value of the source slot, confirmed, with any "defaults" fields
+  it lacks
+- {"move": slot, "to": slot} -- copies, then marks the source value
+  as deleted
+- {"delete": slot} -- marks every value of the slot as deleted
+- {"transition": state} -- transitions to the state
+
+A RuleTable compiles its rules once, indexing them by intent so that
+only the rules that can match a turn are looked at, and applies the
+first rule whose conditions hold. Slot conditions are lookups of the
+standard slot names, and the slots with resolved values are found in a
+single pass over the slots, only when a candidate rule needs them
+"""
+
+from date_webhook.router import WILDCARD
+from date_webhook.utils.payload import standardize_slot_name
+
+CONDITIONS = ("state", "intent", "exists", "missing", "resolved")
+ACTIONS = ("copy", "move", "delete", "transition")
+
+
+class InvalidRuleException(Exception):
+    pass
+
+
+class RuleTable:
+    """An ordered list of rules of which at most one is applied to a
+    request, the first one whose conditions hold
+    """
+
+    def __init__(self, rules):
+        self.rules = [_compile(position, rule) for position, rule in enumerate(rules)]
+        # Each intent maps to the rules that name it or any intent, in
+        # order, and any other intent to the rules for any intent only
+        intents = {
+            intent
+            for rule in self.rules
+            if rule.intents is not None
+            for intent in rule.intents
+        }
+        self._by_intent = {
+            intent: _candidates(
+                rule
+                for rule in self.rules
+                if rule.intents is None or intent in rule.intents
+            )
+            for intent in intents
+        }
+        self._any_intent = _candidates(
+            rule for rule in self.rules if rule.intents is None
+        )
+
+    def apply(self, request):
+        """Applies the first rule whose conditions hold
+
+        Arguments:
+            request {Payload} -- The request
+
+        Returns:
+            string -- The name of the rule applied, or None if none was
+        """
+        rules, by_state, scan = self._by_intent.get(
+            request.get_intent(), self._any_intent
+        )
+        if not rules:
+            return None
+        state = request.get_state() if by_state else None
+        resolved = set()
+        if scan:
+            for slot_name, slot in request.get_slots().items():
+                for slot_value in slot["values"]:
+                    if slot_value.get("resolved") == 1:
+                        resolved.add(slot_name)
+                        break
+        for rule in rules:
+            if rule.matches(request, state, resolved):
+                for action in rule.actions:
+                    action(request)
+                return rule.name
+        return None
+
+
+class _Rule:
+    __slots__ = (
+        "name",
+        "states",
+        "intents",
+        "exists",
+        "missing",
+        "resolved",
+        "actions",
+    )
+
+    def __init__(self, name, states, intents, exists, missing, resolved, actions):
+        self.name = name
+        self.states = states
+        self.intents = intents
+        self.exists = exists
+        self.missing = missing
+        self.resolved = resolved
+        self.actions = actions
+
+    def matches(self, request, state, resolved):
+        if self.states is not None and state not in self.states:
+            return False
+        for slot_name in self.exists:
+            if not request.slot_exists(slot_name):
+                return False
+        for slot_name in self.missing:
+            if request.slot_exists(slot_name):
+                return False
+        for slot_name in self.resolved:
+            if slot_name not in resolved:
+                return False
+        return True
+
+
+def _candidates(rules):
+    # The rules to check in order, and whether any of them needs the
+    # state or the slots with resolved values
+    rules = tuple(rules)
+    return (
+        rules,
+        any(rule.states is not None for rule in rules),
+        any(rule.resolved for rule in rules),
+    )
+
+
+def _compile(position, rule):
+    if not isinstance(rule, dict):
+        raise InvalidRuleException(f"Rule [{position}] must be a dict")
+    name = rule.get("name", str(position))
+    unknown = set(rule) - {"name", "actions", *CONDITIONS}
+    if unknown:
+        raise InvalidRuleException(
+            f"Rule [{name}] has unknown conditions {sorted(unknown)}"
+        )
+    actions = rule.get("actions")
+    if not isinstance(actions, list) or not actions:
+        raise InvalidRuleException(f"Rule [{name}] must have a list of actions")
+    return _Rule(
+        name,
+        _names(name, rule.get("state")),
+        _names(name, rule.get("intent")),
+        _slot_names(name, rule.get("exists", ())),
+        _slot_names(name, rule.get("missing", ())),
+        _slot_names(name, rule.get("resolved", ())),
+        tuple(_compile_action(name, action) for action in actions),
+    )
+
+
+def _names(rule_name, names):
+    if names is None or names == WILDCARD:
+        return None
+    if isinstance(names, str):
+        names = [names]
+    if not isinstance(names, (list, tuple)) or not all(
+        isinstance(name, str) for name in names
+    ):
+        raise InvalidRuleException(
+            f"Rule [{rule_name}] must name states and intents with strings"
+        )
+    return frozenset(names)
+
+
+def _slot_names(rule_name, slot_names):
+    if not isinstance(slot_names, (list, tuple)) or not all(
+        isinstance(slot_name, str) for slot_name in slot_names
+    ):
+        raise InvalidRuleException(
+            f"Rule [{rule_name}] must list slot names as strings"
+        )
+    return tuple(standardize_slot_name(slot_name) for slot_name in slot_names)
+
+
+def _compile_action(rule_name, action):
+    kinds = [kind for kind in ACTIONS if isinstance(action, dict) and kind in action]
+    if len(kinds) != 1:
+        raise InvalidRuleException(
+            f"Rule [{rule_name}] actions must each be one of {ACTIONS}"
+        )
+    kind = kinds[0]
+    if not isinstance(action[kind], str):
+        raise InvalidRuleException(
+            f"Rule [{rule_name}] action [{kind}] must name a string"
+        )
+    if kind == "transition":
+        state = action[kind]
+        return lambda request: request.transition(state)
+    source = standardize_slot_name(action[kind])
+    if kind == "delete":
+        return lambda request: _delete(request, source)
+    if not isinstance(action.get("to"), str):
+        raise InvalidRuleException(
+            f"Rule [{rule_name}] action [{kind}] must name a slot to copy to"
+        )
+    target = standardize_slot_name(action["to"])
+    defaults = dict(action.get("defaults", {}))
+    delete = kind == "move"
+    return lambda request: _copy(request, source, target, defaults, delete)
+
+
+def _copy(request, source, target, defaults, delete):
+    slot_value = request.get_slot_values(source)[0]
+    copied = {
+        key: value
+        for key, value in slot_value.items()
+        if key not in ("status", "resolved")
+    }
+    request.set_slot(
+        target,
+        request.get_slots()[source]["type"],
+        [{"status": "CONFIRMED", **defaults, **copied}],
+    )
+    if delete:
+        request.update_slot_value(source, 0, {"status": "DELETE"})
+
+
+def _delete(request, slot_name):
+    for position in range(len(request.get_slot_values(slot_name))):
+        request.update_slot_value(slot_name, position, {"status": "DELETE"})
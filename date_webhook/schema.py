@@ -0,0 +1,220 @@
+"""Validation of request payloads against a schema
+
+Schemas are a subset of JSON Schema: "type" as a name or a list of
+names, "properties", "required" and "additionalProperties" for objects
+and "items" for arrays. Each one is compiled once into nested closures
+that check a decoded payload in a single pass, so that a malformed
+request is turned away with a 400 that lists everything wrong with it
+before any fulfillment work is done
+"""
+
+import json
+import os
+
+from werkzeug.exceptions import BadRequest
+
+VALIDATE_PAYLOADS = os.environ.get("VALIDATE_PAYLOADS", "1") != "0"
+
+# At most this many errors are reported for one payload
+MAX_ERRORS = 20
+
+_TYPES = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+SLOT_VALUE_SCHEMA = {
+    "type": "object",
+    "required": ["tokens"],
+    "properties": {
+        "resolved": {"type": ["integer", "null"]},
+        "status": {"type": "string"},
+    },
+}
+
+SLOT_SCHEMA = {
+    "type": "object",
+    "required": ["type", "values"],
+    "properties": {
+        "type": {"type": "string"},
+        "values": {"type": "array", "items": SLOT_VALUE_SCHEMA},
+    },
+}
+
+PAYLOAD_SCHEMA = {
+    "type": "object",
+    "required": ["state", "intent", "slots"],
+    "properties": {
+        "state": {"type": "string"},
+        "intent": {"type": "string"},
+        "slots": {"type": "object", "additionalProperties": SLOT_SCHEMA},
+        "session_info": {"type": "object"},
+        "response_slots": {
+            "type": "object",
+            "properties": {
+                "response_type": {"type": "string"},
+                "visuals": {"type": "object"},
+                "speakables": {"type": "object"},
+            },
+        },
+    },
+}
+
+
+class InvalidPayloadException(BadRequest):
+    """A request payload that does not match its schema, answered
+    with a JSON body that lists the errors
+    """
+
+    description = "request payload does not match the schema"
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = errors[:MAX_ERRORS]
+
+    def get_body(self, environ=None, scope=None):
+        return json.dumps(
+            {
+                "error": {
+                    "code": self.code,
+                    "name": self.name,
+                    "description": self.description,
+                    "errors": self.errors,
+                }
+            }
+        )
+
+    def get_headers(self, environ=None, scope=None):
+        return [("Content-Type", "application/json")]
+
+
+def compile_schema(schema):
+    """Compiles a schema into a validator
+
+    Arguments:
+        schema {dict} -- The schema
+
+    Returns:
+        callable -- Takes a decoded value and returns a list of errors,
+            each a dict of the JSON Pointer "path" to the offending
+            value and a "message", which is empty if the value is valid
+    """
+    check = _compile(schema)
+
+    def validate(value):
+        errors = []
+        check(value, None, errors)
+        return errors
+
+    return validate
+
+
+def require(schema, **properties):
+    """Extends an object schema with more required properties
+
+    Arguments:
+        schema {dict} -- The object schema, which is not modified
+        properties {dict} -- The schema of each required property
+
+    Returns:
+        dict -- The extended schema
+    """
+    return {
+        **schema,
+        "required": [*schema.get("required", ()), *properties],
+        "properties": {**schema.get("properties", {}), **properties},
+    }
+
+
+def validate(schema):
+    """Decorator that sets the schema the requests routed to a
+    fulfiller are validated against, instead of PAYLOAD_SCHEMA
+
+    Arguments:
+        schema {dict} -- The schema, or None to not validate the
+            fulfiller's requests at all
+
+    Returns:
+        callable -- The decorator
+    """
+
+    def decorator(handler):
+        handler.validator = None if schema is None else compile_schema(schema)
+        return handler
+
+    return decorator
+
+
+def route_validator(route):
+    """Gets the validator for the requests of a route
+
+    Arguments:
+        route {Route} -- The route, or None for requests that match none
+
+    Returns:
+        callable -- The validator, see compile_schema(), or None if
+            the route's requests are not validated
+    """
+    if not VALIDATE_PAYLOADS:
+        return None
+    if route is None:
+        return PAYLOAD_VALIDATOR
+    return getattr(route.handler, "validator", PAYLOAD_VALIDATOR)
+
+
+def _compile(schema):
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    allowed = None
+    if types is not None:
+        allowed = frozenset(t for name in types for t in _TYPES[name])
+        expected = " or ".join(types)
+    required = tuple(schema.get("required", ()))
+    properties = tuple(
+        (key, _compile(value)) for key, value in schema.get("properties", {}).items()
+    )
+    names = frozenset(key for key, _ in properties)
+    additional = schema.get("additionalProperties")
+    additional = None if not isinstance(additional, dict) else _compile(additional)
+    items = None if "items" not in schema else _compile(schema["items"])
+
+    def check(value, path, errors):
+        kind = type(value)
+        if allowed is not None and kind not in allowed:
+            errors.append(_error(path, f"must be {expected}"))
+            return
+        if kind is dict:
+            for key in required:
+                if key not in value:
+                    errors.append(_error(path, f"[{key}] is required"))
+            for key, check_property in properties:
+                if key in value:
+                    check_property(value[key], (path, key), errors)
+            if additional is not None:
+                for key, item in value.items():
+                    if key not in names:
+                        additional(item, (path, key), errors)
+        elif kind is list and items is not None:
+            for index, item in enumerate(value):
+                items(item, (path, index), errors)
+
+    return check
+
+
+def _error(path, message):
+    # Paths are built as (parent, key) pairs and only turned into a
+    # JSON Pointer when something is wrong
+    keys = []
+    while path is not None:
+        path, key = path
+        keys.append(str(key).replace("~", "~0").replace("/", "~1"))
+    return {"path": "".join(f"/{key}" for key in reversed(keys)), "message": message}
+
+
+PAYLOAD_VALIDATOR = compile_schema(PAYLOAD_SCHEMA)
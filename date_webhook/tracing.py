@@ -0,0 +1,240 @@
+"""Request tracing with nested span timings
+
+When TRACE_FILE is set, a sample of the turns that "/" fulfills is
+traced: whether a turn is traced is decided once, when its request
+arrives, and every span of a traced turn is kept. Spans time parsing,
+building the Payload, routing, each pipeline stage and fulfiller,
+backend calls and serialization, nested under a root span that carries
+the turn's qid and session ID. The current span is kept in a context
+variable, so spans nest across the threads and tasks a turn starts
+without being passed around
+
+A finished trace is appended to TRACE_FILE as one line of OTLP JSON,
+which an OpenTelemetry collector's file receiver or
+benchmarks/traces.py reads, encoded and written off the request thread.
+A turn that is not traced only ever looks up the context variable
+"""
+
+import os
+import random
+import time
+from contextvars import ContextVar
+
+from date_webhook.log import AsyncJsonLogger
+
+SERVICE_NAME = "date_webhook"
+
+# Span kinds, as OTLP numbers them
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+_current = ContextVar("span", default=None)
+
+
+class Span:
+    """A timed operation of a traced turn, which times the work done
+    within it and is the parent of the spans started there
+
+    Arguments:
+        trace {list} -- The finished spans of the turn
+        trace_id {int} -- The ID of the turn's trace
+        parent_id {int} -- The ID of the parent span, or None for the root
+        name {string} -- The operation
+
+    Keyword Arguments:
+        attributes {dict} -- Attributes of the operation (default: {None})
+        kind {int} -- INTERNAL, SERVER or CLIENT (default: {INTERNAL})
+    """
+
+    __slots__ = (
+        "trace",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "attributes",
+        "start",
+        "end",
+        "error",
+        "_token",
+    )
+
+    def __init__(
+        self, trace, trace_id, parent_id, name, attributes=None, kind=INTERNAL
+    ):
+        self.trace = trace
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes else {}
+        self.start = self.end = None
+        self.error = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        self.end = time.time_ns()
+        _current.reset(self._token)
+        if kind is not None:
+            self.error = kind.__name__
+        self.trace.append(self)
+        if self.parent_id is None:
+            TRACER.log({"spans": self.trace}, sample=False)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_turn(self, payload):
+        """Sets the attributes that identify a turn
+
+        Arguments:
+            payload {any} -- The decoded request payload
+        """
+        if type(payload) is not dict:
+            return
+        for field in ("qid", "session_id", "state", "intent"):
+            value = payload.get(field)
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                self.attributes[field] = value
+
+
+class _NotTraced:
+    """Stands in for the spans of a turn that is not traced"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        return None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_turn(self, payload):
+        pass
+
+
+NOT_TRACED = _NotTraced()
+
+
+def trace(name, attributes=None):
+    """Starts the root span of a turn if tracing is on and the turn
+    is sampled
+
+    Arguments:
+        name {string} -- The operation, like "POST /"
+
+    Keyword Arguments:
+        attributes {dict} -- Attributes of the operation (default: {None})
+
+    Returns:
+        context manager -- The root Span, or one that records nothing
+    """
+    if TRACER is None or not TRACER.sample():
+        return NOT_TRACED
+    return Span([], random.getrandbits(128) or 1, None, name, attributes, SERVER)
+
+
+def span(name, attributes=None, kind=INTERNAL):
+    """Starts a span within the current one, if the turn is traced
+
+    Arguments:
+        name {string} -- The operation
+
+    Keyword Arguments:
+        attributes {dict} -- Attributes of the operation (default: {None})
+        kind {int} -- INTERNAL, SERVER or CLIENT (default: {INTERNAL})
+
+    Returns:
+        context manager -- The Span, or one that records nothing
+    """
+    parent = _current.get()
+    if parent is None:
+        return NOT_TRACED
+    return Span(parent.trace, parent.trace_id, parent.span_id, name, attributes, kind)
+
+
+def current_span():
+    """Gets the span the work being done is part of
+
+    Returns:
+        Span -- The span, or None if the turn is not traced
+    """
+    return _current.get()
+
+
+def to_otlp(spans):
+    """Encodes the spans of a trace as an OTLP JSON export request
+
+    Arguments:
+        spans {list} -- The finished spans
+
+    Returns:
+        dict -- The request, with a single resource and scope
+    """
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _attributes(
+                        {"service.name": SERVICE_NAME, "process.pid": os.getpid()}
+                    )
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": __name__},
+                        "spans": [_otlp_span(span) for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def _otlp_span(span):
+    encoded = {
+        "traceId": f"{span.trace_id:032x}",
+        "spanId": f"{span.span_id:016x}",
+        "parentSpanId": "" if span.parent_id is None else f"{span.parent_id:016x}",
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(span.end),
+        "attributes": _attributes(span.attributes),
+        "status": {},
+    }
+    if span.error is not None:
+        encoded["status"] = {"code": 2, "message": span.error}
+    return encoded
+
+
+def _attributes(attributes):
+    return [{"key": key, "value": _value(value)} for key, value in attributes.items()]
+
+
+def _value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP JSON encodes 64-bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+TRACER = None
+if os.environ.get("TRACE_FILE"):
+    TRACER = AsyncJsonLogger(
+        name="tracing",
+        path=os.environ["TRACE_FILE"],
+        sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "0.01")),
+        transform=lambda record: to_otlp(record["spans"]),
+    )
@@ -0,0 +1,192 @@
+"""Fulfillment of a single turn posted to "/"
+
+The WSGI and ASGI front ends each read a request their own way and
+hand its body and headers to a Turn, which does everything else the
+same way for both: the turn's trace, admission slot and deadline,
+parsing and validation, the idempotency cache, fulfillment with its
+allocation profile and spans, serialization, metrics and recording.
+Only fulfilling differs, as fulfill() calls synchronous fulfillers
+while fulfill_async() awaits coroutine ones
+"""
+
+from contextlib import ExitStack, contextmanager
+
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+from date_webhook.allocations import profile_allocations
+from date_webhook.deadline import ADMISSION, deadline, request_budget
+from date_webhook.fulfillment import fulfill, fulfill_async, validate_request
+from date_webhook.metrics import RequestTimer
+from date_webhook.recording import record_turn
+from date_webhook.tracing import span, trace
+from date_webhook.utils.codec import echo
+from date_webhook.utils.idempotency import idempotency_key
+from date_webhook.utils.patch import PATCH_MIMETYPE, json_patch
+from date_webhook.utils.payload import Payload
+
+
+class Turn:
+    """A request to "/", from its body to its response
+
+    Entering a Turn starts its trace, takes an admission slot, sets its
+    deadline and parses and validates the body, all of which last until
+    it exits. Any error raised within is counted against the turn
+
+    Arguments:
+        codec {JSONCodec} -- Decodes the request and encodes the response
+        cache {IdempotencyCache} -- The responses of recent turns, or None
+        body {bytes} -- The request body
+        is_json {bool} -- Whether the request's Content-Type is JSON
+
+    Keyword Arguments:
+        budget_header {string} -- The DEADLINE_HEADER header, if the
+            request has one (default: {None})
+        patch {bool} -- Respond with a JSON Patch of the changes rather
+            than the fulfilled payload (default: {False})
+    """
+
+    def __init__(self, codec, cache, body, is_json, budget_header=None, patch=False):
+        self.codec = codec
+        self.cache = cache
+        self.body = body
+        self.is_json = is_json
+        self.patch = patch
+        self.mimetype = PATCH_MIMETYPE if patch else "application/json"
+        self.budget = request_budget(budget_header)
+        self.timer = RequestTimer("/")
+        self.obj = None
+        self.content = None
+        self.deadline = None
+        self._contexts = None
+
+    def __enter__(self):
+        try:
+            with ExitStack() as contexts:
+                root = contexts.enter_context(trace("POST /"))
+                contexts.enter_context(ADMISSION.admit())
+                self.deadline = contexts.enter_context(deadline(self.budget))
+                with span("parse"):
+                    self.obj = self._decode()
+                root.set_turn(self.obj)
+                self.timer.lap("parse")
+                with span("validate"):
+                    validate_request(self.obj)
+                self.timer.lap("validate")
+                self._contexts = contexts.pop_all()
+        except Exception as e:
+            self.timer.fail(e)
+            raise
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        try:
+            return self._contexts.__exit__(kind, error, traceback)
+        finally:
+            if isinstance(error, Exception):
+                self.timer.fail(error)
+
+    def fulfill(self):
+        """Fulfills the turn, or gets the response of the turn it
+        retries from the idempotency cache
+        """
+        key = self._key()
+        if key is None:
+            self.content = self.fulfill_payload()
+        else:
+            self.content = self.cache.get_or_compute(key, self.fulfill_payload)
+            self._forget_degraded(key)
+
+    async def fulfill_async(self):
+        """Coroutine version of fulfill()"""
+        key = self._key()
+        if key is None:
+            self.content = await self.fulfill_payload_async()
+        else:
+            self.content = await self.cache.get_or_compute_async(
+                key, self.fulfill_payload_async
+            )
+            self._forget_degraded(key)
+
+    def fulfill_payload(self):
+        """Fulfills the payload with synchronous fulfillers
+
+        Returns:
+            bytes -- The encoded response
+        """
+        with self._fulfillment() as fulfillment:
+            fulfill(fulfillment.request)
+        return fulfillment.content
+
+    async def fulfill_payload_async(self):
+        """Coroutine version of fulfill_payload(), which awaits
+        coroutine fulfillers
+
+        Returns:
+            bytes -- The encoded response
+        """
+        with self._fulfillment() as fulfillment:
+            await fulfill_async(fulfillment.request)
+        return fulfillment.content
+
+    def response(self):
+        """Finishes the turn once it exited
+
+        Returns:
+            bytes -- The response body, sent with the turn's mimetype
+        """
+        self.timer.finish(len(self.body), len(self.content))
+        if not self.patch:
+            # Recordings are replayed without asking for a patch
+            record_turn(self.obj, self.content, self.timer.elapsed())
+        return self.content
+
+    def _decode(self):
+        if not self.is_json:
+            raise UnsupportedMediaType(
+                "Did not attempt to load JSON data because the request "
+                "Content-Type was not 'application/json'."
+            )
+        try:
+            return self.codec.loads(self.body)
+        except ValueError as e:
+            raise BadRequest(f"Failed to decode JSON object: {e}")
+
+    def _key(self):
+        key = idempotency_key(self.obj)
+        if key is None or self.cache is None:
+            return None
+        return (*key, self.patch)
+
+    def _forget_degraded(self, key):
+        if self.deadline is not None and self.deadline.degraded:
+            # A retry of the turn may have time for a full answer
+            self.cache.discard(key)
+
+    @contextmanager
+    def _fulfillment(self):
+        # Builds the Payload to fulfill within, then encodes the
+        # response once it is fulfilled
+        fulfillment = _Fulfillment()
+        with profile_allocations(self.obj) as allocations:
+            with span("payload"):
+                fulfillment.request = Payload(self.obj)
+            allocations.lap("payload")
+            with span("fulfill"):
+                yield fulfillment
+            allocations.lap("fulfill")
+            self.timer.lap("fulfill")
+            with span("serialize"):
+                fulfillment.content = self._encode(fulfillment.request)
+            allocations.lap("serialize")
+        self.timer.lap("serialize")
+
+    def _encode(self, req):
+        if self.patch:
+            return self.codec.dumps(json_patch(self.obj, req.snapshot(), req.changes()))
+        if not req.modified:
+            return echo(self.body)
+        return self.codec.dumps(req.snapshot())
+
+
+class _Fulfillment:
+    __slots__ = ("request", "content")
@@ -0,0 +1,189 @@
+"""JSON decoding and encoding of webhook payloads
+
+The stdlib backend is always available and defines the output format:
+compact, sorted keys, UTF-8 and a trailing newline, with Decimal
+amounts as decimal strings. The orjson backend is used when it is
+installed and produces the same bytes, falling back to the stdlib
+encoder for the rare documents where the two would differ
+"""
+
+import json
+import math
+import re
+from decimal import Decimal
+
+from date_webhook.utils.cow import FrozenDict, FrozenList, commit
+from date_webhook.utils.slots import Slot, SlotValue
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKENDS = ("auto", "json", "orjson")
+
+# orjson formats small and large floats differently from repr(); in
+# compact output numbers always follow one of ":,["
+_DIVERGENT_NUMBER = re.compile(rb"[:,\[]-?(?:\d+(?:\.\d+)?e|0\.0000)")
+
+# A \uD800-\uDFFF escape, which may be half of a surrogate pair
+_SURROGATE_ESCAPE = re.compile(r"\\u[dD][89a-fA-F]")
+
+_INT_MIN = -(2**63)
+_INT_MAX = 2**64 - 1
+
+
+class CodecNotAvailableException(Exception):
+    pass
+
+
+class JSONCodec:
+    name = "json"
+
+    def loads(self, data):
+        """Decodes a JSON document
+
+        Arguments:
+            data {bytes} -- The document
+
+        Returns:
+            any -- The decoded value
+        """
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("utf-8")
+        value = json.loads(
+            data,
+            parse_int=_parse_int,
+            parse_float=_parse_float,
+            parse_constant=_reject_constant,
+        )
+        if _SURROGATE_ESCAPE.search(data):
+            _reject_surrogates(value)
+        return value
+
+    def dumps(self, obj):
+        """Encodes a value as a JSON document
+
+        Arguments:
+            obj {any} -- The value, which may contain Payload views
+
+        Returns:
+            bytes -- The document
+        """
+        text = json.dumps(
+            obj,
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            allow_nan=False,
+            default=_default,
+        )
+        return f"{text}\n".encode("utf-8")
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        try:
+            data = orjson.dumps(
+                obj,
+                default=_default,
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE,
+            )
+        except TypeError:
+            return super().dumps(obj)
+        if _DIVERGENT_NUMBER.search(data):
+            return super().dumps(obj)
+        return data
+
+
+def get_codec(backend="auto"):
+    """Gets the codec for a JSON backend
+
+    Arguments:
+        backend {string} -- One of "auto", "json" or "orjson", where
+            "auto" picks orjson when it is installed (default: {"auto"})
+
+    Returns:
+        JSONCodec -- The codec
+    """
+    if backend not in BACKENDS:
+        raise CodecNotAvailableException(
+            f"Unknown JSON backend [{backend}], expected one of {BACKENDS}"
+        )
+    if backend == "auto":
+        backend = "json" if orjson is None else "orjson"
+    if backend == "orjson":
+        if orjson is None:
+            raise CodecNotAvailableException("JSON backend [orjson] is not installed")
+        return OrjsonCodec()
+    return JSONCodec()
+
+
+def echo(data):
+    """Frames an already encoded document, such as the body of a
+    request that fulfillment left unchanged, like the output of dumps()
+    so that it can be sent without decoding and encoding it again
+
+    Arguments:
+        data {bytes} -- The document
+
+    Returns:
+        bytes -- The document with a trailing newline
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return data if data.endswith(b"\n") else data + b"\n"
+
+
+# The stdlib decoder is made as strict as orjson so that both backends
+# decode a document to the same values
+
+
+def _parse_int(text):
+    value = int(text)
+    if _INT_MIN <= value <= _INT_MAX:
+        return value
+    return float(text)
+
+
+def _parse_float(text):
+    value = float(text)
+    if math.isinf(value):
+        raise ValueError(f"Number [{text}] is out of range")
+    return value
+
+
+def _reject_constant(text):
+    raise ValueError(f"Constant [{text}] is not valid JSON")
+
+
+def _reject_surrogates(value):
+    # Strings with a lone surrogate cannot be encoded as UTF-8
+    if isinstance(value, str):
+        try:
+            value.encode("utf-8")
+        except UnicodeEncodeError:
+            raise ValueError("String has a lone surrogate") from None
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _reject_surrogates(key)
+            _reject_surrogates(item)
+    elif isinstance(value, list):
+        for item in value:
+            _reject_surrogates(item)
+
+
+def _default(obj):
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return commit(obj)
+    if isinstance(obj, (Slot, SlotValue)):
+        return obj.to_dict()
+    if isinstance(obj, Decimal):
+        # Amounts are sent as decimal strings, which keep their cents
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,349 @@
+"""Read-only and copy-on-write views over request payload data
+
+The payload tree handed to these views is never modified. Read-only
+views wrap nested containers on access, while drafts are real dicts
+and lists that copy a container only when it is first reached, so the
+subtrees that are never reached or changed stay shared with the
+original tree when a draft is committed.
+"""
+
+from collections.abc import Mapping, Sequence
+
+from date_webhook.utils.slots import Slot, SlotValue
+
+# Typed slot records are read through the same views as the dicts they
+# stand in for
+_RECORDS = (Slot, SlotValue)
+
+_ABSENT = object()
+
+
+class FrozenDict(Mapping):
+    """A read-only view over a dict"""
+
+    __slots__ = ("_base",)
+
+    def __init__(self, base):
+        self._base = base
+
+    def __getitem__(self, key):
+        return freeze(self._base[key])
+
+    def __contains__(self, key):
+        return key in self._base
+
+    def __iter__(self):
+        return iter(self._base)
+
+    def __len__(self):
+        return len(self._base)
+
+    def __repr__(self):
+        return f"FrozenDict({self._base!r})"
+
+    def __copy__(self):
+        return thaw(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+class FrozenList(Sequence):
+    """A read-only view over a list"""
+
+    __slots__ = ("_base",)
+
+    def __init__(self, base):
+        self._base = base
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FrozenList(self._base[index])
+        return freeze(self._base[index])
+
+    def __iter__(self):
+        for value in self._base:
+            yield freeze(value)
+
+    def __len__(self):
+        return len(self._base)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, FrozenList, CowList)):
+            return NotImplemented
+        return thaw(self) == thaw(other)
+
+    def __repr__(self):
+        return f"FrozenList({self._base!r})"
+
+    def __copy__(self):
+        return thaw(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+class CowDict(dict):
+    """A mutable draft of a dict that copies on write
+
+    A draft is a shallow copy of its base, which is a real dict, so it
+    can be serialized and checked like one. Nested containers are
+    wrapped in drafts of their own when they are first reached, so the
+    containers that are never reached are not copied, and stay shared
+    with the base when the draft is committed
+    """
+
+    __slots__ = ("_base",)
+
+    def __init__(self, base):
+        super().__init__(base)
+        self._base = base
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if type(value) is dict or type(value) is list:
+            value = draft(value)
+            super().__setitem__(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, _adopt(value))
+
+    def __iter__(self):
+        # Overridden so that dict(), ** and update() read the values
+        # through __getitem__ rather than straight from the storage
+        return super().__iter__()
+
+    def __or__(self, other):
+        return {**self, **other}
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def copy(self):
+        return {key: self[key] for key in self}
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            super().__delitem__(key)
+            return value
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *others, **fields):
+        for key, value in dict(*others, **fields).items():
+            self[key] = value
+
+    def _commit(self, memo):
+        result = {}
+        changed = len(self) != len(self._base)
+        for key, value in super().items():
+            if isinstance(value, (CowDict, CowList)):
+                value = _commit(value, memo)
+            if not changed and self._base.get(key, _ABSENT) is not value:
+                changed = True
+            result[key] = value
+        return result if changed else self._base
+
+
+class CowList(list):
+    """A mutable draft of a list that copies on write
+
+    Behaves like CowDict, with the items that are containers wrapped
+    in drafts when they are first reached
+    """
+
+    __slots__ = ("_base",)
+
+    def __init__(self, base):
+        super().__init__(base)
+        self._base = base
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        value = super().__getitem__(index)
+        if type(value) is dict or type(value) is list:
+            value = draft(value)
+            super().__setitem__(index, value)
+        return value
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super().__setitem__(index, [_adopt(item) for item in value])
+        else:
+            super().__setitem__(index, _adopt(value))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __reversed__(self):
+        for index in reversed(range(len(self))):
+            yield self[index]
+
+    def __add__(self, other):
+        return [*self, *other]
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def append(self, value):
+        super().append(_adopt(value))
+
+    def extend(self, values):
+        super().extend([_adopt(value) for value in values])
+
+    def insert(self, index, value):
+        super().insert(index, _adopt(value))
+
+    def pop(self, index=-1):
+        value = self[index]
+        super().__delitem__(index)
+        return value
+
+    def copy(self):
+        return list(self)
+
+    def _commit(self, memo):
+        result = []
+        changed = len(self) != len(self._base)
+        for index, value in enumerate(super().__iter__()):
+            if isinstance(value, (CowDict, CowList)):
+                value = _commit(value, memo)
+            if not changed and self._base[index] is not value:
+                changed = True
+            result.append(value)
+        return result if changed else self._base
+
+
+def freeze(value):
+    """Wraps a container in a read-only view
+
+    Arguments:
+        value {any} -- A JSON-like value
+
+    Returns:
+        any -- A read-only view for dicts, slot records and
+            lists, the value itself otherwise
+    """
+    if isinstance(value, (CowDict, CowList)):
+        return freeze(commit(value))
+    if isinstance(value, dict):
+        return FrozenDict(value)
+    if isinstance(value, list):
+        return FrozenList(value)
+    if type(value) in _RECORDS:
+        return FrozenDict(value)
+    return value
+
+
+def draft(value):
+    """Wraps a container in a copy-on-write draft
+
+    Arguments:
+        value {any} -- A JSON-like value
+
+    Returns:
+        any -- A draft for dicts and lists, the value
+            itself otherwise
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        value = value._base
+    if isinstance(value, (CowDict, CowList)):
+        return value
+    if isinstance(value, dict):
+        return CowDict(value)
+    if isinstance(value, list):
+        return CowList(value)
+    return value
+
+
+def commit(value):
+    """Materializes a draft into plain containers
+
+    Only the containers that were changed through the draft are new
+    objects, everything else is shared with the draft's base
+
+    Arguments:
+        value {any} -- A draft, view or plain JSON-like value
+
+    Returns:
+        any -- The plain value
+    """
+    return _materialize(value)
+
+
+def thaw(value):
+    """Deep copies a value into plain, independent containers
+
+    Arguments:
+        value {any} -- A draft, view or plain JSON-like value
+
+    Returns:
+        any -- The plain copy
+    """
+    value = _materialize(value)
+    if isinstance(value, dict) or type(value) in _RECORDS:
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _materialize(value):
+    if isinstance(value, (CowDict, CowList)):
+        return _commit(value, {})
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value._base
+    return value
+
+
+def _commit(value, memo):
+    # A draft reached twice is committed once, so that aliases within
+    # the draft stay aliases
+    result = memo.get(id(value))
+    if result is None:
+        result = memo[id(value)] = value._commit(memo)
+    return result
+
+
+def _adopt(value):
+    # Drafts are kept as-is so that aliasing works as it does for plain
+    # containers, while plain containers are copied so that later
+    # changes by the caller do not leak into the draft
+    if isinstance(value, (CowDict, CowList)):
+        return value
+    return thaw(value)
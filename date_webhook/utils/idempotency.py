@@ -0,0 +1,200 @@
+"""Deduplication of retried webhook requests
+
+The platform retries a slow turn with the same qid. Responses are
+remembered by (qid, session_id) so that a retry is answered from
+memory, and a retry that arrives while the original is still being
+fulfilled waits for it instead of fulfilling the turn a second time,
+for no longer than its own deadline
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from date_webhook.deadline import DeadlineExceededException, remaining
+
+
+class _Flight:
+    __slots__ = ("event", "future", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.future = None
+        self.value = None
+        self.error = None
+
+
+def idempotency_key(payload):
+    """Gets the key that identifies a turn
+
+    Arguments:
+        payload {dict} -- The decoded request payload
+
+    Returns:
+        tuple -- The qid and session ID, or None if the payload
+            does not have both
+    """
+    if not isinstance(payload, dict):
+        return None
+    qid = payload.get("qid")
+    session_id = payload.get("session_id")
+    if not isinstance(qid, (str, int)) or not isinstance(session_id, (str, int)):
+        return None
+    return (qid, session_id)
+
+
+class IdempotencyCache:
+    """Bounded cache of computed responses with single-flight
+    computation
+
+    Entries expire after `ttl` seconds and the least recently used
+    entries are evicted beyond `max_entries`. Failures are shared with
+    the requests waiting on them but are not cached. A request that
+    waits on another gives up when its own deadline passes
+    """
+
+    def __init__(self, max_entries=10000, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Gets the response for a key, computing it if it is
+        neither cached nor already being computed
+
+        Arguments:
+            key {tuple} -- See idempotency_key()
+            compute {callable} -- Computes the response
+
+        Returns:
+            any -- The response
+
+        Raises:
+            DeadlineExceededException -- If the request's deadline
+                passes while it waits for the response to be computed
+        """
+        flight, leader = self._join(key)
+        if flight is None:
+            return leader
+        if not leader:
+            if flight.future is not None:
+                raise RuntimeError("Key is being computed on an event loop")
+            if not flight.event.wait(_wait_timeout()):
+                raise DeadlineExceededException()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(key, flight)
+        return flight.value
+
+    async def get_or_compute_async(self, key, compute):
+        """Coroutine version of get_or_compute() for callers on an
+        event loop, where waiting does not block the loop
+
+        Arguments:
+            key {tuple} -- See idempotency_key()
+            compute {callable} -- Returns an awaitable of the response
+
+        Returns:
+            any -- The response
+
+        Raises:
+            DeadlineExceededException -- See get_or_compute()
+        """
+        flight, leader = self._join(key, asyncio.get_running_loop())
+        if flight is None:
+            return leader
+        if not leader:
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(flight.future), _wait_timeout()
+                )
+            except asyncio.TimeoutError:
+                raise DeadlineExceededException() from None
+        try:
+            flight.value = await compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._land(key, flight)
+        return flight.value
+
+    def discard(self, key):
+        """Forgets the response for a key, so that the next request
+        for it is computed again
+
+        Arguments:
+            key {tuple} -- See idempotency_key()
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        """Gets the cache's counters
+
+        Returns:
+            dict -- The hits, misses, coalesced duplicates and
+                evictions, the hit rate counting coalesced duplicates
+                as hits, and the current number of entries
+        """
+        saved = self.counters["hits"] + self.counters["coalesced"]
+        lookups = saved + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": saved / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
+
+    def _join(self, key, loop=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return None, entry[1]
+                del self._entries[key]
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.counters["coalesced"] += 1
+                return flight, False
+            self.counters["misses"] += 1
+            flight = self._flights[key] = _Flight()
+            if loop is not None:
+                flight.future = loop.create_future()
+            return flight, True
+
+    def _land(self, key, flight):
+        with self._lock:
+            del self._flights[key]
+            if flight.error is None:
+                self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.counters["evictions"] += 1
+        flight.event.set()
+        if flight.future is not None:
+            if flight.error is not None:
+                flight.future.set_exception(flight.error)
+                # Mark the exception as retrieved when nobody waited on it
+                flight.future.exception()
+            else:
+                flight.future.set_result(flight.value)
+
+
+def _wait_timeout():
+    # The seconds a duplicate may wait for the original turn, which is
+    # no longer than the time left until its own deadline
+    seconds = remaining()
+    return None if seconds is None else max(seconds, 0.0)
@@ -0,0 +1,50 @@
+"""JSON Patch (RFC 6902) descriptions of what fulfillment changed
+
+Local consumers that already hold the request can ask for the changes
+alone rather than the whole fulfilled payload
+"""
+
+PATCH_MIMETYPE = "application/json-patch+json"
+
+
+def json_patch(original, current, paths):
+    """Builds the JSON Patch that turns a request payload into the
+    fulfilled payload
+
+    Arguments:
+        original {dict} -- The request payload
+        current {dict} -- The fulfilled payload
+        paths {list of tuple} -- The changed paths, see Payload.changes()
+
+    Returns:
+        list -- The patch operations, in the order they apply
+    """
+    operations = []
+    for path in paths:
+        before = _lookup(original, path)
+        after = _lookup(current, path)
+        pointer = _pointer(path)
+        if after is _ABSENT:
+            if before is not _ABSENT:
+                operations.append({"op": "remove", "path": pointer})
+        elif before is _ABSENT:
+            operations.append({"op": "add", "path": pointer, "value": after})
+        elif before != after:
+            operations.append({"op": "replace", "path": pointer, "value": after})
+    return operations
+
+
+def _lookup(document, path):
+    for key in path:
+        try:
+            document = document[key]
+        except (KeyError, IndexError, TypeError):
+            return _ABSENT
+    return document
+
+
+def _pointer(path):
+    return "".join("/" + str(key).replace("~", "~0").replace("/", "~1") for key in path)
+
+
+_ABSENT = object()
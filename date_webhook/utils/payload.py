@@ -1,7 +1,19 @@
-"""Request payload helper functions
-"""
+"""Request payload helper functions"""
 
+from bisect import insort
+from collections.abc import Mapping
 from copy import deepcopy
+from functools import lru_cache
+
+from date_webhook.utils.cow import CowDict, FrozenDict, commit, freeze
+from date_webhook.utils.session_cache import get_session_cache
+from date_webhook.utils.slots import (
+    TYPED_SLOTS,
+    Slot,
+    SlotValue,
+    plain_slots,
+    typed_slots,
+)
 
 # TODO(sean): add docstrings
 # TODO(sean): resolving standard
@@ -13,31 +25,140 @@ class SlotNotFoundException(Exception):
     pass
 
 
+class _SlotIndex:
+    """Positions of a slot's values by resolved status and by tokens
+
+    Kept in sync by the Payload methods that add values or change
+    their resolved status, and dropped whenever the payload is replaced
+    """
+
+    __slots__ = ("by_status", "by_tokens", "statuses", "tokens")
+
+    def __init__(self, slot_values):
+        self.by_status = {}
+        self.by_tokens = {}
+        self.statuses = []
+        self.tokens = []
+        for slot_value in slot_values:
+            self.append(slot_value)
+
+    def append(self, slot_value):
+        position = len(self.statuses)
+        status = slot_value.get("resolved")
+        tokens = slot_value.get("tokens")
+        self.statuses.append(status)
+        self.tokens.append(tokens)
+        self.by_status.setdefault(status, set()).add(position)
+        self.by_tokens.setdefault(_tokens_key(tokens), []).append(position)
+
+    def positions(self, status):
+        return sorted(self.by_status.get(status, ()))
+
+    def find(self, tokens):
+        positions = self.by_tokens.get(_tokens_key(tokens), ())
+        return [position for position in positions if self.tokens[position] == tokens]
+
+    def set_status(self, position, status):
+        self.by_status[self.statuses[position]].discard(position)
+        self.by_status.setdefault(status, set()).add(position)
+        self.statuses[position] = status
+
+    def set_tokens(self, position, tokens):
+        self.by_tokens[_tokens_key(self.tokens[position])].remove(position)
+        self.tokens[position] = tokens
+        insort(self.by_tokens.setdefault(_tokens_key(tokens), []), position)
+
+
 class Payload:
-    def __init__(self, payload):
-        self.payload = deepcopy(payload)
-        self.slots = self.payload["slots"]
+    """A request payload with copy-on-write semantics
+
+    The payload passed in is shared rather than copied and is never
+    modified; containers are copied only when they are first changed,
+    so the caller must not modify the payload after handing it over.
+    Reads return read-only views and get() returns a draft, either of
+    which stays unaffected by later changes to the Payload. Whether
+    anything was changed at all is kept in modified, and what was
+    changed is given by changes()
+
+    With typed_slots, the slots are kept as compact Slot and SlotValue
+    records, which read like the dicts they replace, until the payload
+    is encoded
+    """
+
+    def __init__(self, payload, session_cache=None, typed_slots=None):
+        self.session_cache = session_cache
+        self.typed_slots = TYPED_SLOTS if typed_slots is None else typed_slots
+        self._set_payload(payload)
 
     def get(self):
-        """Gets the current request payload
+        """Gets a mutable draft of the current request payload
+
+        Changes to the draft are not visible to the Payload until
+        the draft is passed to overwrite()
 
         Returns:
-            dict -- The request payload
+            CowDict -- The request payload, a dict that copies the
+                containers under it only when they are first reached
         """
-        return deepcopy(self.payload)
+        self._share()
+        if self.typed_slots:
+            return CowDict({**self.payload, "slots": plain_slots(self.slots)})
+        return CowDict(self.payload)
 
     def overwrite(self, req):
         """Sets the current request payload
+
+        Arguments:
+            req {dict} -- The new request payload. Drafts from get()
+                are committed, sharing every subtree that was not
+                changed through them; plain dicts are copied
+        """
+        previous, changes = self.payload, self._changes
+        if isinstance(req, (CowDict, FrozenDict)):
+            self._set_payload(commit(req))
+        else:
+            self._set_payload(deepcopy(req))
+        changes.update(_diff_paths(previous, self.payload))
+        self._changes = changes
+        self.modified = True
+
+    def snapshot(self):
+        """Gets the current request payload without copying it,
+        for serialization
+
+        Returns:
+            dict -- The request payload, which must not be modified.
+                Typed slots are left as records for the codec to encode
+        """
+        self._share()
+        return self.payload
+
+    def changes(self):
+        """Gets the parts of the payload that were changed, through
+        its methods or overwrite()
+
+        Returns:
+            list of tuple -- The paths of the changed top-level fields,
+                slots, slot values and response slots, each a tuple of
+                keys and list positions. A path covers everything under
+                it, so the paths under another one are left out
         """
-        self.payload = deepcopy(req)
+        kept = set()
+        for path in sorted(self._changes, key=len):
+            for length in range(1, len(path)):
+                if path[:length] in kept:
+                    break
+            else:
+                kept.add(path)
+        return sorted(kept)
 
     def get_ids(self):
         """Gets the ID fields from the payload
 
         Returns:
-            dict -- The ID fields
+            FrozenDict -- The ID fields
         """
-        return deepcopy(
+        return FrozenDict(
             {
                 "ai_version": self.get_field("ai_version"),
                 "device": self.get_field("device"),
@@ -52,9 +173,9 @@ class Payload:
         """Gets the slots from the payload
 
         Returns:
-            dict -- The slots object
+            FrozenDict -- The slots object
         """
-        return deepcopy(self.get_field("slots"))
+        return self.get_field("slots")
 
     def get_state(self):
         """Gets the state from the payload
@@ -113,15 +234,92 @@ class Payload:
         value from the payload together as location
 
         Returns:
-            dict -- The location
+            FrozenDict -- The location
         """
-        return deepcopy({"lat": self.get_field("lat"), "lon": self.get_field("lon")})
+        return FrozenDict({"lat": self.get_field("lat"), "lon": self.get_field("lon")})
 
     def contains_field(self, field):
         return field in self.payload
 
     def get_field(self, field):
-        return deepcopy(self.payload[field])
+        value = self.payload[field]
+        if isinstance(value, (dict, list)):
+            self._share()
+        return freeze(value)
+
+    def set_field(self, field, value):
+        """Sets a top-level field of the payload
+
+        Arguments:
+            field {string} -- The name of the field
+            value {any} -- The new value, which must not be
+                modified afterwards
+
+        Returns:
+            Request -- A reference to the class instance
+        """
+        if field == "slots" and self.typed_slots:
+            value = typed_slots(value)
+        self._writable_payload()[field] = value
+        self._changes.add((field,))
+        if field == "slots":
+            self.slots = value
+            self._indexes = {}
+        return self
+
+    def update_field(self, field, values):
+        """Merges values into a top-level dict field of the
+        payload, creating the field if it does not exist
+
+        Arguments:
+            field {string} -- The name of the field
+            values {dict} -- The keys and values to set
+
+        Returns:
+            Request -- A reference to the class instance
+        """
+        payload = self._writable_payload()
+        payload[field] = {**payload.get(field, {}), **values}
+        self._changes.add((field,))
+        return self
+
+    def get_session_value(self, key, default=None):
+        """Gets a value cached for the payload's session by an
+        earlier turn
+
+        Arguments:
+            key {string} -- The key of the value
+
+        Keyword Arguments:
+            default {any} -- Returned if nothing is cached (default: {None})
+
+        Returns:
+            any -- A read-only view of the value, or the default
+        """
+        session_id = self.payload.get("session_id")
+        if session_id is None:
+            return default
+        return self._get_session_cache().get(session_id, key, default)
+
+    def set_session_value(self, key, value, ttl=None):
+        """Caches a JSON-serializable value for later turns of the
+        payload's session
+
+        Arguments:
+            key {string} -- The key of the value
+            value {any} -- The value, which must not be modified afterwards
+
+        Keyword Arguments:
+            ttl {float} -- Seconds until the value expires, defaulting
+                to the cache's TTL (default: {None})
+
+        Returns:
+            Request -- A reference to the class instance
+        """
+        session_id = self.payload.get("session_id")
+        if session_id is not None:
+            self._get_session_cache().set(session_id, key, value, ttl=ttl)
+        return self
 
     def resolve_append(self, slot_name, tuples, squash=False):
         """Resolves a set of unresolved slot values without
@@ -177,7 +375,8 @@ class Payload:
         """
         slot_name = self._standardize_slot_name(slot_name)
         if not self.slot_exists(slot_name):
-            self.slots[slot_name] = {"type": slot_type, "values": []}
+            self._writable_slots()[slot_name] = self._new_slot(slot_type, [])
+            self._changes.add(("slots", slot_name))
         if overwrite:
             return self.overwrite_slot_values(slot_name, values, squash=squash)
         return self.insert_slot_values(slot_name, values, squash=squash)
@@ -283,7 +482,8 @@ class Payload:
         Returns:
             Request -- A reference to the class instance
         """
-        self.payload["state"] = new_state
+        self._writable_payload()["state"] = new_state
+        self._changes.add(("state",))
         if self._response_slot_exists():
             self._update_response_type(new_state)
         return self
@@ -315,6 +515,75 @@ class Payload:
     def slot_exists(self, slot_name):
         return self._standardize_slot_name(slot_name) in self.slots
 
+    def get_slot_values(self, slot_name):
+        """Gets every value of a slot as stored in the payload,
+        resolved or not
+
+        Arguments:
+            slot_name {string} -- The name of the slot
+
+        Returns:
+            FrozenList -- The slot values
+        """
+        self._share()
+        return freeze(self._get_slot_values(slot_name, None, get_all=True))
+
+    def set_slot(self, slot_name, slot_type, values):
+        """Creates or replaces a slot with a set of slot values
+        that are stored as given
+
+        Arguments:
+            slot_name {string} -- The name of the slot
+            slot_type {string} -- The type of slot
+            values {list of dict} -- The slot values
+
+        Returns:
+            Request -- A reference to the class instance
+        """
+        slot_name = self._standardize_slot_name(slot_name)
+        self._writable_slots()[slot_name] = self._new_slot(slot_type, values)
+        self._changes.add(("slots", slot_name))
+        self._indexes.pop(slot_name, None)
+        return self
+
+    def update_slot_value(self, slot_name, position, values):
+        """Merges fields into one of the values of a slot
+
+        Arguments:
+            slot_name {string} -- The name of the slot
+            position {int} -- The position of the value in the slot
+            values {dict} -- The fields to set
+
+        Returns:
+            Request -- A reference to the class instance
+        """
+        return self._update_slot_value(
+            self._try_get_slot_name(slot_name), position, values
+        )
+
+    def blind_resolve(self):
+        """Resolves every slot value in a single pass. Values with a
+        platform status are confirmed instead, and values without a
+        value take their tokens as the value
+
+        Returns:
+            Request -- A reference to the class instance
+        """
+        for slot_name, slot in list(self.slots.items()):
+            for position, slot_value in enumerate(slot["values"]):
+                if "status" in slot_value:
+                    if slot_value["status"] != "CONFIRMED":
+                        self._update_slot_value(
+                            slot_name, position, {"status": "CONFIRMED"}
+                        )
+                elif slot_value.get("resolved") != 1:
+                    self._set_resolved_status(slot_name, position, 1)
+                if "value" not in slot_value:
+                    self._update_slot_value(
+                        slot_name, position, {"value": slot_value["tokens"]}
+                    )
+        return self
+
     def _add_response_slot_generic(self, field, key, value=None):
         if value is not False and not value:
             return self._add_response_slot_field(field, deepcopy(key))
@@ -329,23 +598,25 @@ class Payload:
             values = [values]
         if replace:
             self._unresolve_resolved(slot_name)
+        index = self._slot_index(slot_name)
+        slot_values = self._writable_slot(slot_name)["values"]
         for value in values:
             if slot_type in ["date", "dict"]:
                 value["resolved"] = 1
-                self.slots[slot_name]["values"].append(value)
+            elif squash:
+                value = {**{"tokens": None, "resolved": 1}, **value}
             else:
-                if squash:
-                    self.slots[slot_name]["values"].append(
-                        {**{"tokens": None, "resolved": 1}, **value}
-                    )
-                else:
-                    self.slots[slot_name]["values"].append(
-                        {"tokens": None, "resolved": 1, "value": value}
-                    )
+                value = {"tokens": None, "resolved": 1, "value": value}
+            if self.typed_slots and type(value) is dict:
+                value = SlotValue(value)
+            self._changes.add(("slots", slot_name, "values", len(slot_values)))
+            slot_values.append(value)
+            index.append(value)
         return self
 
     def _update_response_type(self, new_state):
-        self.payload["response_slots"]["response_type"] = new_state
+        self._writable_response_slots()["response_type"] = new_state
+        self._changes.add(("response_slots", "response_type"))
         return self
 
     def _response_slot_exists(self):
@@ -353,11 +624,12 @@ class Payload:
 
     def _create_response_slot(self):
         if not self._response_slot_exists():
-            self.payload["response_slots"] = {
+            self._writable_payload()["response_slots"] = {
                 "response_type": self.payload["state"],
                 "visuals": {},
                 "speakables": {},
             }
+            self._changes.add(("response_slots",))
         return self
 
     def _add_response_slot_field(self, field, slot_values):
@@ -365,10 +637,13 @@ class Payload:
         other = "speakables"
         if field == other:
             other = "visuals"
+        response_slots = self._writable_response_slots(field, other)
         for key, value in slot_values.items():
-            self.payload["response_slots"][field][key] = value
-            if key not in self.payload["response_slots"][other]:
-                self.payload["response_slots"][other][key] = value
+            response_slots[field][key] = value
+            self._changes.add(("response_slots", field, key))
+            if key not in response_slots[other]:
+                response_slots[other][key] = value
+                self._changes.add(("response_slots", other, key))
         return self
 
     def _get_slot_type(self, slot_name):
@@ -380,13 +655,16 @@ class Payload:
     ):
         result = []
         for slot_value in slot_values:
-            current = dict()
-            for key, value in slot_value.items():
-                if key not in blacklist:
-                    current[key] = value
+            if type(slot_value) is SlotValue:
+                current = slot_value.to_dict(exclude=blacklist)
+            else:
+                current = dict()
+                for key, value in slot_value.items():
+                    if key not in blacklist:
+                        current[key] = value
             if len(current.keys()) == 1:
                 current = list(current.values()).pop()
-            result.append(deepcopy(current))
+            result.append(freeze(current))
         return result
 
     def _try_get_slot_name(self, slot_name):
@@ -400,9 +678,14 @@ class Payload:
     def _resolve(self, slot_name, tuples, replace=False, squash=False):
         slot_name = self._try_get_slot_name(slot_name)
         slot_type = self._get_slot_type(slot_name)
-        unresolveds = self._get_slot_values(slot_name, -1)
+        index = self._slot_index(slot_name)
+        # Only values that were unresolved when the call started may be
+        # resolved, so remember the ones that change status below
+        replaced = set()
         if replace:
+            replaced = set(index.positions(1))
             self._unresolve_resolved(slot_name)
+        resolved = set()
         if type(tuples) != list:
             tuples = [tuples]
         for tup in tuples:
@@ -410,37 +693,211 @@ class Payload:
                 tokens, value = tup
             else:
                 tokens = tup["tokens"]
-            unresolved = [
-                unresolved
-                for unresolved in unresolveds
-                if tokens == unresolved["tokens"]
-            ].pop()
+            position = self._find_unresolved(index, tokens, replaced, resolved)
+            slot_value = self._writable_slot_value(slot_name, position)
             if slot_type not in ["dict", "date"]:
                 if isinstance(value, dict) and squash:
-                    unresolved = {**unresolved, **value}
+                    slot_value.update(value)
+                    if "tokens" in value:
+                        index.set_tokens(position, value["tokens"])
                 else:
-                    unresolved["value"] = value
-            self._set_resolved_status(unresolved, 1)
+                    slot_value["value"] = value
+            self._set_resolved_status(slot_name, position, 1)
+            resolved.add(position)
         return self
 
+    def _find_unresolved(self, index, tokens, replaced, resolved):
+        for position in reversed(index.find(tokens)):
+            if position in resolved:
+                return position
+            if index.statuses[position] == -1 and position not in replaced:
+                return position
+        raise IndexError(f"No unresolved slot value has tokens [{tokens}]")
+
     def _standardize_slot_name(self, slot_name):
-        if not slot_name.startswith("_"):
-            return f"_{slot_name.upper()}_"
-        return slot_name.upper()
+        return standardize_slot_name(slot_name)
+
+    def _slot_index(self, slot_name):
+        index = self._indexes.get(slot_name)
+        if index is None:
+            index = self._indexes[slot_name] = _SlotIndex(
+                self.slots[slot_name]["values"]
+            )
+        return index
 
     def _get_slot_values(self, slot_name, resolved_status, get_all=False):
         slot_name = self._try_get_slot_name(slot_name)
-        values = []
-        for value in self.slots[slot_name]["values"]:
-            if get_all or value["resolved"] == resolved_status:
-                values.append(value)
-        return values
+        slot_values = self.slots[slot_name]["values"]
+        if get_all:
+            return list(slot_values)
+        positions = self._slot_index(slot_name).positions(resolved_status)
+        return [slot_values[position] for position in positions]
+
+    def _update_slot_value(self, slot_name, position, values):
+        self._writable_slot_value(slot_name, position).update(values)
+        index = self._indexes.get(slot_name)
+        if index is not None:
+            if "resolved" in values:
+                index.set_status(position, values["resolved"])
+            if "tokens" in values:
+                index.set_tokens(position, values["tokens"])
+        return self
 
-    def _set_resolved_status(self, slot_value, resolved_status):
+    def _set_resolved_status(self, slot_name, position, resolved_status):
+        slot_value = self._writable_slot_value(slot_name, position)
         slot_value["resolved"] = resolved_status
+        self._slot_index(slot_name).set_status(position, resolved_status)
+        return slot_value
 
     def _unresolve_resolved(self, slot_name):
-        resolved_slots = self._get_slot_values(slot_name, 1)
-        for resolved_slot in resolved_slots:
-            self._set_resolved_status(resolved_slot, -1)
+        for position in self._slot_index(slot_name).positions(1):
+            self._set_resolved_status(slot_name, position, -1)
         return self
+
+    def _get_session_cache(self):
+        if self.session_cache is None:
+            self.session_cache = get_session_cache()
+        return self.session_cache
+
+    def _new_slot(self, slot_type, values):
+        slot = {"type": slot_type, "values": list(values)}
+        return Slot(slot) if self.typed_slots else slot
+
+    def _set_payload(self, payload):
+        self._owned = {}
+        self._indexes = {}
+        self._changes = set()
+        self.modified = False
+        if self.typed_slots:
+            payload = self._own(payload)
+            slots = payload["slots"] = self._claim(typed_slots(payload["slots"]))
+            # The records are all new, so they are changed in place
+            # rather than copied on their first change
+            for slot in slots.values():
+                if type(slot) is Slot:
+                    self._claim(slot)
+                    if type(slot.values) is list:
+                        self._claim(slot.values)
+                        for slot_value in slot.values:
+                            self._claim(slot_value)
+        self.payload = payload
+        self.slots = payload["slots"]
+
+    def _share(self):
+        # Containers handed out to views and drafts must no longer be
+        # changed in place, so the next change copies them again
+        self._owned = {}
+
+    def _claim(self, container):
+        self._owned[id(container)] = container
+        return container
+
+    def _own(self, container):
+        if id(container) in self._owned:
+            return container
+        container = container.copy()
+        self._owned[id(container)] = container
+        return container
+
+    def _writable_payload(self):
+        self.modified = True
+        self.payload = self._own(self.payload)
+        return self.payload
+
+    def _writable_slots(self):
+        payload = self._writable_payload()
+        self.slots = payload["slots"] = self._own(payload["slots"])
+        return self.slots
+
+    def _writable_slot(self, slot_name):
+        slots = self._writable_slots()
+        slot = slots[slot_name] = self._own(slots[slot_name])
+        slot["values"] = self._own(slot["values"])
+        return slot
+
+    def _writable_slot_value(self, slot_name, position):
+        slot_values = self._writable_slot(slot_name)["values"]
+        slot_value = slot_values[position] = self._own(slot_values[position])
+        self._changes.add(("slots", slot_name, "values", position))
+        return slot_value
+
+    def _writable_response_slots(self, *fields):
+        payload = self._writable_payload()
+        response_slots = payload["response_slots"] = self._own(
+            payload["response_slots"]
+        )
+        for field in fields:
+            response_slots[field] = self._own(response_slots[field])
+        return response_slots
+
+
+@lru_cache(maxsize=4096)
+def standardize_slot_name(slot_name):
+    """Gets the name a slot is stored under in the payload
+
+    Arguments:
+        slot_name {string} -- The name, like "person_name" or "_PERSON_NAME_"
+
+    Returns:
+        string -- The standard name, like "_PERSON_NAME_"
+    """
+    if not slot_name.startswith("_"):
+        return f"_{slot_name.upper()}_"
+    return slot_name.upper()
+
+
+def _tokens_key(tokens):
+    # Tokens are normally strings, but unhashable ones share a bucket
+    # and are told apart by equality
+    try:
+        hash(tokens)
+    except TypeError:
+        return _UNHASHABLE_TOKENS
+    return tokens
+
+
+_UNHASHABLE_TOKENS = object()
+
+
+def _diff_paths(old, new):
+    # Drafts share every subtree they did not change, so most fields
+    # are told apart by identity before falling back to equality
+    for field in old.keys() | new.keys():
+        before = old.get(field, _ABSENT)
+        after = new.get(field, _ABSENT)
+        if before is after:
+            continue
+        if field == "slots" and isinstance(before, dict) and isinstance(after, dict):
+            yield from _diff_slots(before, after)
+        elif before != after:
+            yield (field,)
+
+
+def _diff_slots(old, new):
+    for name in old.keys() | new.keys():
+        before = old.get(name, _ABSENT)
+        after = new.get(name, _ABSENT)
+        if before is after or before == after:
+            continue
+        if not _same_but_values(before, after):
+            yield ("slots", name)
+            continue
+        old_values = before["values"]
+        for position, value in enumerate(after["values"]):
+            if position >= len(old_values) or value != old_values[position]:
+                yield ("slots", name, "values", position)
+
+
+def _same_but_values(before, after):
+    if not isinstance(before, Mapping) or not isinstance(after, Mapping):
+        return False
+    if set(before) != set(after) or "values" not in before:
+        return False
+    if not isinstance(before["values"], list) or not isinstance(after["values"], list):
+        return False
+    if len(after["values"]) < len(before["values"]):
+        return False
+    return all(before[key] == after[key] for key in before if key != "values")
+
+
+_ABSENT = object()
@@ -0,0 +1,284 @@
+"""Cache of per-session values shared across the turns of a conversation
+
+Entries are keyed by session ID and key, expire after a TTL and are
+evicted least recently used first once the cache is full. The memory
+backend is private to a worker, while the file backend keeps entries
+in a local SQLite database shared by every worker on the host
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from date_webhook.utils.cow import freeze, thaw
+
+BACKENDS = ("memory", "file", "none")
+
+
+class SessionCache(ABC):
+    """Base class that keeps the hit and miss counters"""
+
+    def __init__(self, max_entries=10000, ttl=900.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self._counters_lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, session_id, key, default=None):
+        """Gets a cached value
+
+        Arguments:
+            session_id {string} -- The session ID
+            key {string} -- The key of the value
+
+        Keyword Arguments:
+            default {any} -- Returned on a miss (default: {None})
+
+        Returns:
+            any -- A read-only view of the value, or the default
+        """
+
+    @abstractmethod
+    def set(self, session_id, key, value, ttl=None):
+        """Caches a JSON-serializable value
+
+        Arguments:
+            session_id {string} -- The session ID
+            key {string} -- The key of the value
+            value {any} -- The value, which must not be modified afterwards
+
+        Keyword Arguments:
+            ttl {float} -- Seconds until the value expires, defaulting
+                to the cache's TTL (default: {None})
+        """
+
+    @abstractmethod
+    def delete(self, session_id, key):
+        """Forgets a cached value
+
+        Arguments:
+            session_id {string} -- The session ID
+            key {string} -- The key of the value
+        """
+
+    @abstractmethod
+    def __len__(self):
+        """Gets the number of entries, expired or not"""
+
+    def stats(self):
+        """Gets the cache's counters
+
+        Returns:
+            dict -- The hits, misses, evictions, expirations, hit
+                rate and current number of entries
+        """
+        with self._counters_lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "size": len(self),
+        }
+
+    def _count(self, counter, amount=1):
+        # The file backend counts outside of any lock of its own
+        with self._counters_lock:
+            self.counters[counter] += amount
+
+
+class NullSessionCache(SessionCache):
+    """A cache that never holds anything"""
+
+    def get(self, session_id, key, default=None):
+        self._count("misses")
+        return default
+
+    def set(self, session_id, key, value, ttl=None):
+        pass
+
+    def delete(self, session_id, key):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MemorySessionCache(SessionCache):
+    def __init__(self, max_entries=10000, ttl=900.0):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, key, default=None):
+        entry_key = (session_id, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[entry_key]
+                self._count("expirations")
+                entry = None
+            if entry is None:
+                self._count("misses")
+                return default
+            self._entries.move_to_end(entry_key)
+            self._count("hits")
+        return freeze(entry[1])
+
+    def set(self, session_id, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        entry_key = (session_id, key)
+        with self._lock:
+            self._entries[entry_key] = (expires_at, value)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count("evictions")
+
+    def delete(self, session_id, key):
+        with self._lock:
+            self._entries.pop((session_id, key), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileSessionCache(SessionCache):
+    """SQLite-backed cache that can be shared by several processes
+
+    Each thread of each process opens its own connection. Expired
+    entries are dropped when read and, together with the least
+    recently used entries over the size limit, every `sweep_every` writes
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=900.0, sweep_every=64):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.path = path
+        self.sweep_every = sweep_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS session_cache ("
+                "session_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (session_id, key))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS session_cache_accessed_at "
+                "ON session_cache (accessed_at)"
+            )
+
+    def get(self, session_id, key, default=None):
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT value, expires_at FROM session_cache "
+                "WHERE session_id = ? AND key = ?",
+                (session_id, key),
+            ).fetchone()
+            if row is not None and row[1] <= now:
+                connection.execute(
+                    "DELETE FROM session_cache WHERE session_id = ? AND key = ?",
+                    (session_id, key),
+                )
+                self._count("expirations")
+                row = None
+            if row is None:
+                self._count("misses")
+                return default
+            connection.execute(
+                "UPDATE session_cache SET accessed_at = ? "
+                "WHERE session_id = ? AND key = ?",
+                (now, session_id, key),
+            )
+        self._count("hits")
+        return freeze(json.loads(row[0]))
+
+    def set(self, session_id, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO session_cache VALUES (?, ?, ?, ?, ?)",
+                (session_id, key, json.dumps(thaw(value)), expires_at, now),
+            )
+            with self._counters_lock:
+                self._writes += 1
+                sweep = self._writes % self.sweep_every == 0
+            if sweep:
+                self._sweep(connection, now)
+
+    def delete(self, session_id, key):
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM session_cache WHERE session_id = ? AND key = ?",
+                (session_id, key),
+            )
+
+    def __len__(self):
+        with self._connection() as connection:
+            row = connection.execute("SELECT COUNT(*) FROM session_cache").fetchone()
+        return row[0]
+
+    def _sweep(self, connection, now):
+        expired = connection.execute(
+            "DELETE FROM session_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        self._count("expirations", expired)
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM session_cache WHERE rowid IN (SELECT rowid FROM "
+                "session_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self._count("evictions", excess)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+_caches = {}
+
+
+def get_session_cache():
+    """Gets this worker's session cache, configured by the
+    SESSION_CACHE, SESSION_CACHE_PATH, SESSION_CACHE_SIZE and
+    SESSION_CACHE_TTL environment variables
+
+    Returns:
+        SessionCache -- The cache
+    """
+    pid = os.getpid()
+    cache = _caches.get(pid)
+    if cache is None:
+        backend = os.environ.get("SESSION_CACHE", "memory")
+        if backend not in BACKENDS:
+            raise ValueError(f"SESSION_CACHE must be one of {BACKENDS}")
+        max_entries = int(os.environ.get("SESSION_CACHE_SIZE", "10000"))
+        ttl = float(os.environ.get("SESSION_CACHE_TTL", "900"))
+        if backend == "memory":
+            cache = MemorySessionCache(max_entries=max_entries, ttl=ttl)
+        elif backend == "file":
+            cache = FileSessionCache(
+                os.environ.get("SESSION_CACHE_PATH", "session_cache.sqlite3"),
+                max_entries=max_entries,
+                ttl=ttl,
+            )
+        else:
+            cache = NullSessionCache()
+        _caches[pid] = cache
+    return cache
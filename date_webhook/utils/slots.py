@@ -0,0 +1,224 @@
+"""Compact typed model of a payload's slots
+
+When TYPED_SLOTS is set, Payload keeps its slots as Slot and SlotValue
+records rather than dicts. The fields every slot value has live in
+__slots__ instead of a per-value dict, the resolved flag is a single
+slot holding one of the shared small ints, statuses and slot types are
+interned so the few distinct ones are shared by every value, and
+rarer fields go in a dict that is only created when a value has any.
+Both records behave as the dicts they were made from, and are turned
+back into dicts by the codec when the response is encoded
+"""
+
+import os
+import sys
+from collections.abc import MutableMapping
+
+TYPED_SLOTS = os.environ.get("TYPED_SLOTS", "").lower() in ("1", "true", "yes")
+
+_MISSING = object()
+
+
+class _Record(MutableMapping):
+    """A dict-like record whose common keys are stored in __slots__
+
+    Subclasses name those keys in _fields, in the order they are
+    iterated, list them in __slots__ alongside "extra" and set every
+    one of them in __init__, to _MISSING when the key is absent
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _interned = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            if key in self._interned and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            if getattr(self, key) is _MISSING:
+                raise KeyError(key)
+            setattr(self, key, _MISSING)
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+            if not self.extra:
+                self.extra = None
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._fields:
+            return getattr(self, key) is not _MISSING
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self):
+        for field in self._fields:
+            if getattr(self, field) is not _MISSING:
+                yield field
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        count = sum(1 for field in self._fields if getattr(self, field) is not _MISSING)
+        return count + (0 if self.extra is None else len(self.extra))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (type(self), (self.to_dict(),))
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def items(self):
+        return self.to_dict().items()
+
+    def copy(self):
+        """Copies the record, sharing its values
+
+        Returns:
+            _Record -- The copy
+        """
+        record = type(self).__new__(type(self))
+        for field in self._fields:
+            setattr(record, field, getattr(self, field))
+        record.extra = None if self.extra is None else dict(self.extra)
+        return record
+
+    def to_dict(self, exclude=()):
+        """Gets the record as a dict, sharing its values
+
+        Keyword Arguments:
+            exclude {list} -- Keys to leave out (default: {()})
+
+        Returns:
+            dict -- The keys and values
+        """
+        result = {}
+        for field in self._fields:
+            value = getattr(self, field)
+            if value is not _MISSING and field not in exclude:
+                result[field] = value
+        if self.extra is not None:
+            for key, value in self.extra.items():
+                if key not in exclude:
+                    result[key] = value
+        return result
+
+
+class SlotValue(_Record):
+    """One value of a slot"""
+
+    __slots__ = ("tokens", "value", "resolved", "status", "extra")
+    _fields = ("tokens", "value", "resolved", "status")
+    _interned = ("status",)
+
+    def __init__(self, fields=None):
+        # Unrolled, as every value of every request is converted
+        if not fields:
+            fields = {}
+        get = fields.get
+        self.tokens = get("tokens", _MISSING)
+        self.value = get("value", _MISSING)
+        self.resolved = get("resolved", _MISSING)
+        status = get("status", _MISSING)
+        self.status = sys.intern(status) if type(status) is str else status
+        self.extra = None
+        if len(fields) > 4 - (
+            (self.tokens is _MISSING)
+            + (self.value is _MISSING)
+            + (self.resolved is _MISSING)
+            + (status is _MISSING)
+        ):
+            self.extra = _extra(fields, self._fields)
+
+
+class Slot(_Record):
+    """A slot, whose values are SlotValue records"""
+
+    __slots__ = ("type", "values", "extra")
+    _fields = ("type", "values")
+    _interned = ("type",)
+
+    def __init__(self, fields=None):
+        if not fields:
+            fields = {}
+        slot_type = fields.get("type", _MISSING)
+        self.type = sys.intern(slot_type) if type(slot_type) is str else slot_type
+        values = fields.get("values", _MISSING)
+        if type(values) is list:
+            values = [
+                SlotValue(value) if type(value) in _CONVERTED else value
+                for value in values
+            ]
+        self.values = values
+        self.extra = None
+        if len(fields) > 2 - (slot_type is _MISSING) - (values is _MISSING):
+            self.extra = _extra(fields, self._fields)
+
+
+def typed_slots(slots):
+    """Converts a payload's slots object to the typed model
+
+    Arguments:
+        slots {dict} -- The slots object, which is not modified
+
+    Returns:
+        dict -- A new slots object with a new Slot for every slot
+            and a new SlotValue for every value
+    """
+    return {
+        name: Slot(slot) if type(slot) in _CONVERTED else slot
+        for name, slot in slots.items()
+    }
+
+
+def plain_slots(slots):
+    """Converts a slots object back from the typed model
+
+    Arguments:
+        slots {dict} -- The slots object, which is not modified
+
+    Returns:
+        dict -- A new slots object made of plain dicts and lists
+    """
+    result = {}
+    for name, slot in slots.items():
+        if isinstance(slot, Slot):
+            slot = slot.to_dict()
+            if type(slot.get("values")) is list:
+                slot["values"] = [
+                    value.to_dict() if isinstance(value, SlotValue) else value
+                    for value in slot["values"]
+                ]
+        result[name] = slot
+    return result
+
+
+_CONVERTED = (dict, Slot, SlotValue)
+
+
+def _extra(fields, names):
+    return {key: value for key, value in fields.items() if key not in names} or None
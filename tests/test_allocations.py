@@ -0,0 +1,85 @@
+import json
+import tracemalloc
+
+import pytest
+
+from date_webhook import allocations
+from date_webhook import app as webhook
+from date_webhook.allocations import NOT_PROFILED, AllocationProfiler
+
+TURN = {"qid": "q1", "state": "root", "intent": "hello", "slots": {}}
+ROUTED = {**TURN, "state": "get_balance", "intent": "cs_yes"}
+
+
+def profile_turn(profiler, payload=ROUTED):
+    with profiler.profile(payload) as turn:
+        grown = [bytearray(4096) for _ in range(10)]
+        turn.lap("fulfill")
+        turn.lap("serialize")
+    return grown
+
+
+def test_phases_are_added_up_by_route():
+    profiler = AllocationProfiler(sample_rate=1.0)
+
+    profile_turn(profiler)
+    profile_turn(profiler)
+
+    report = profiler.report()
+    assert report["samples"] == 2
+    fulfill, serialize = report["phases"]
+    assert fulfill["state"] == "get_balance"
+    assert fulfill["intent"] == "cs_yes"
+    assert fulfill["handler"].startswith("balance_fulfillment.")
+    assert fulfill["phase"] == "fulfill"
+    assert fulfill["samples"] == 2
+    assert fulfill["net_bytes_mean"] >= 40960
+    assert fulfill["peak_bytes_max"] >= fulfill["net_bytes_mean"]
+    assert serialize["phase"] == "serialize"
+    assert report["sites"][0]["site"].startswith(__file__)
+    assert not tracemalloc.is_tracing()
+
+
+def test_unsampled_and_concurrent_turns_are_not_profiled():
+    assert AllocationProfiler(sample_rate=0.0).profile(TURN) is NOT_PROFILED
+    profiler = AllocationProfiler(sample_rate=1.0)
+
+    with profiler.profile(TURN):
+        assert profiler.profile(TURN) is NOT_PROFILED
+    with profiler.profile(TURN) as turn:
+        assert turn is not NOT_PROFILED
+
+
+def test_failed_turns_are_left_out():
+    profiler = AllocationProfiler(sample_rate=1.0)
+
+    with pytest.raises(KeyError):
+        with profiler.profile(TURN) as turn:
+            turn.lap("fulfill")
+            raise KeyError()
+
+    assert profiler.report()["samples"] == 0
+    assert not tracemalloc.is_tracing()
+    with profiler.profile(TURN) as turn:
+        assert turn is not NOT_PROFILED
+
+
+def test_report_is_served_and_dumped(monkeypatch, tmp_path):
+    client = webhook.app.test_client()
+    assert client.get("/debug/allocations").status_code == 404
+    profiler = AllocationProfiler(sample_rate=1.0)
+    monkeypatch.setattr(allocations, "PROFILER", profiler)
+    monkeypatch.setattr(webhook, "PROFILER", profiler)
+
+    assert client.post("/", json=TURN).status_code == 200
+    report = client.get("/debug/allocations").get_json()
+    profiler.dump(str(tmp_path / "allocations-{pid}.json"))
+
+    assert report["samples"] == 1
+    assert {row["phase"] for row in report["phases"]} == {
+        "payload",
+        "fulfill",
+        "serialize",
+    }
+    (dumped,) = tmp_path.iterdir()
+    assert json.loads(dumped.read_text())["samples"] == 1
@@ -0,0 +1,75 @@
+import pytest
+
+from date_webhook.app import app
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def turn(qid, intent, slots):
+    return {
+        "qid": qid,
+        "session_id": "test-session",
+        "ai_version": "v",
+        "device": "d",
+        "dialog": "x",
+        "external_user_id": "u",
+        "time_offset": 0,
+        "query": "q",
+        "state": "increase_cc_limit",
+        "intent": intent,
+        "slots": slots,
+    }
+
+
+def amount(tokens):
+    return {"type": "string", "values": [{"tokens": tokens, "resolved": -1}]}
+
+
+def test_ambiguous_amount_becomes_annual_income(client):
+    response = client.post(
+        "/",
+        json=turn(
+            "test-1", "ambiguous_amount_start", {"_AMBIGUOUS_AMOUNT_": amount("50k")}
+        ),
+    )
+
+    assert response.status_code == 200
+    slots = response.get_json()["slots"]
+    assert slots["_ANNUAL_INCOME_"]["values"] == [
+        {
+            "status": "CONFIRMED",
+            "tokens": "50k",
+            "value": "50000.00",
+            "currency": "dollars",
+        }
+    ]
+    assert slots["_AMBIGUOUS_AMOUNT_"]["values"][0]["status"] == "DELETE"
+
+
+@pytest.mark.parametrize("tokens", ["9" * 30, "9" * 27 + " billion", "one two"])
+def test_amounts_that_cannot_be_normalized_are_left_as_tokens(client, tokens):
+    response = client.post(
+        "/",
+        json=turn(
+            f"test-{tokens}",
+            "increase_cc_limit_start",
+            {"_AMBIGUOUS_AMOUNT_": amount(tokens)},
+        ),
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()["slots"]["_AMBIGUOUS_AMOUNT_"]["values"] == [
+        {"tokens": tokens, "value": tokens, "resolved": 1}
+    ]
+
+
+@pytest.mark.parametrize(
+    "body", [b'{"qid":', b'{"qid":"\\ud800"}', b'{"qid":"x"}', b"[]"]
+)
+def test_invalid_requests_are_rejected(client, body):
+    response = client.post("/", data=body, content_type="application/json")
+
+    assert response.status_code == 400
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+from date_webhook.app import app as wsgi_app
+from date_webhook.asgi import app
+from date_webhook.utils.patch import PATCH_MIMETYPE
+
+
+def turn(qid):
+    return {
+        "qid": qid,
+        "session_id": "test-session",
+        "ai_version": "v",
+        "device": "d",
+        "dialog": "x",
+        "external_user_id": "u",
+        "time_offset": 0,
+        "query": "q",
+        "state": "increase_cc_limit",
+        "intent": "ambiguous_amount_start",
+        "slots": {
+            "_AMBIGUOUS_AMOUNT_": {
+                "type": "string",
+                "values": [{"tokens": "50k", "resolved": -1}],
+            }
+        },
+    }
+
+
+def call(method, path, body=b"", headers=()):
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    # The body arrives in two chunks
+    messages = [
+        {"type": "http.request", "body": body[:10], "more_body": True},
+        {"type": "http.request", "body": body[10:]},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, content = sent
+    return start["status"], dict(start["headers"]), content["body"]
+
+
+def test_turns_are_answered_as_by_the_wsgi_app():
+    body = json.dumps(turn("q1")).encode()
+
+    status, headers, content = call(
+        "POST", "/", body, [("content-type", "application/json")]
+    )
+    expected = wsgi_app.test_client().post(
+        "/", data=body, content_type="application/json"
+    )
+
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert content == expected.data
+
+
+def test_turns_can_be_answered_with_a_patch():
+    status, headers, content = call(
+        "POST",
+        "/",
+        json.dumps(turn("q2")).encode(),
+        [("content-type", "application/json"), ("accept", PATCH_MIMETYPE)],
+    )
+
+    assert status == 200
+    assert headers[b"content-type"] == PATCH_MIMETYPE.encode()
+    operations = json.loads(content)
+    assert operations
+    assert all("op" in operation for operation in operations)
+
+
+def test_errors_are_answered_with_their_status():
+    status, _, _ = call("POST", "/", b"{}", [("content-type", "text/plain")])
+    assert status == 415
+
+    status, _, _ = call(
+        "POST", "/", b"{not json", [("content-type", "application/json")]
+    )
+    assert status == 400
+
+    status, _, content = call(
+        "POST", "/", b'{"qid": "q3"}', [("content-type", "application/json")]
+    )
+    assert status == 400
+    assert json.loads(content)["error"]["errors"]
+
+
+def test_other_routes_are_passed_to_the_wsgi_app():
+    status, headers, content = call("GET", "/metrics")
+
+    assert status == 200
+    assert headers[b"content-type"].startswith(b"text/plain")
+    assert b"webhook_request_duration_seconds" in content
+
+
+def test_lifespan_is_acknowledged():
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(app({"type": "lifespan"}, receive, send))
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
@@ -0,0 +1,111 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from date_webhook.app import app
+from date_webhook.batch import (
+    fulfill_many,
+    make_executor,
+    map_ordered,
+    stream_json_array,
+)
+from date_webhook.utils.codec import get_codec
+
+
+def turn(qid, tokens="50k"):
+    return {
+        "qid": qid,
+        "session_id": "test-session",
+        "ai_version": "v",
+        "device": "d",
+        "dialog": "x",
+        "external_user_id": "u",
+        "time_offset": 0,
+        "query": "q",
+        "state": "increase_cc_limit",
+        "intent": "ambiguous_amount_start",
+        "slots": {
+            "_AMBIGUOUS_AMOUNT_": {
+                "type": "string",
+                "values": [{"tokens": tokens, "resolved": -1}],
+            }
+        },
+    }
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread"])
+def test_results_keep_the_order_of_the_payloads(kind):
+    items = [turn(f"q{i}") for i in range(20)]
+    executor = make_executor(kind, 4)
+
+    results = list(fulfill_many(items, get_codec(), executor, window=3))
+    if executor is not None:
+        executor.shutdown()
+
+    assert [json.loads(result)["qid"] for result in results] == [
+        f"q{i}" for i in range(20)
+    ]
+
+
+def test_failed_payloads_get_an_error_result_in_their_place():
+    invalid = turn("q1")
+    del invalid["slots"]
+    items = [turn("q0"), invalid, b"{not json", json.dumps(turn("q3")).encode()]
+
+    results = [json.loads(r) for r in fulfill_many(items, get_codec())]
+
+    assert results[0]["qid"] == "q0"
+    assert results[1]["error"]["code"] == 400
+    assert results[1]["error"]["errors"]
+    assert results[2]["error"]["code"] == 400
+    assert "errors" not in results[2]["error"]
+    assert results[3]["qid"] == "q3"
+
+
+def test_map_ordered_holds_at_most_a_window_of_items():
+    read = []
+
+    def items():
+        for i in range(10):
+            read.append(i)
+            yield i
+
+    with ThreadPoolExecutor(2) as executor:
+        results = map_ordered(lambda i: i * 2, items(), executor, window=3)
+        assert next(results) == 0
+        assert len(read) == 3
+        assert list(results) == [2 * i for i in range(1, 10)]
+
+
+def test_results_are_streamed_as_a_json_array():
+    chunks = stream_json_array([b"1\n", b'{"a":2}\n'])
+
+    assert b"".join(chunks) == b'[1,{"a":2}]\n'
+    assert b"".join(stream_json_array([])) == b"[]\n"
+
+
+def test_unknown_executors_are_refused():
+    assert make_executor("inline") is None
+    with pytest.raises(ValueError):
+        make_executor("fibers")
+
+
+def test_batch_endpoint_answers_arrays_and_ndjson():
+    client = app.test_client()
+
+    array = client.post("/batch", json=[turn("q0"), {"qid": "q1"}]).get_json()
+    ndjson = client.post(
+        "/batch",
+        data=b"\n".join(json.dumps(turn(f"q{i}")).encode() for i in range(3)),
+        content_type="application/x-ndjson",
+    ).data
+
+    assert [item.get("qid") for item in array] == ["q0", None]
+    assert array[1]["error"]["code"] == 400
+    assert [json.loads(line)["qid"] for line in ndjson.splitlines()] == [
+        "q0",
+        "q1",
+        "q2",
+    ]
+    assert client.post("/batch", json={"qid": "q0"}).status_code == 400
@@ -0,0 +1,91 @@
+import json
+import os
+from collections import Counter
+
+from date_webhook import bulk
+from date_webhook.log import LOGGER
+
+
+def turn(qid, tokens):
+    return {
+        "qid": qid,
+        "session_id": "test-session",
+        "ai_version": "v",
+        "device": "d",
+        "dialog": "x",
+        "external_user_id": "u",
+        "time_offset": 0,
+        "query": "q",
+        "state": "increase_cc_limit",
+        "intent": "ambiguous_amount_start",
+        "slots": {
+            "_AMBIGUOUS_AMOUNT_": {
+                "type": "string",
+                "values": [{"tokens": tokens, "resolved": -1}],
+            }
+        },
+    }
+
+
+def write_input(path, count):
+    lines = [json.dumps(turn(f"q{i}", f"{i}k")) for i in range(count)]
+    lines[1] = "{not json"
+    lines.insert(2, "  ")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_results_are_written_in_input_order(tmp_path):
+    source = tmp_path / "turns.ndjson"
+    write_input(source, 10)
+    output = tmp_path / "results.ndjson"
+
+    with open(source, "rb") as lines, open(output, "wb") as f:
+        outcomes = bulk.fulfill_stream(lines, f, bulk.get_codec(), chunk_size=3)
+
+    results = [json.loads(line) for line in output.read_bytes().splitlines()]
+    assert len(results) == 10
+    assert results[1]["error"]["code"] == 400
+    for i, result in enumerate(results):
+        if i != 1:
+            assert result["qid"] == f"q{i}"
+    assert outcomes[("increase_cc_limit", "ambiguous_amount_start", "fulfilled")] == 9
+    assert outcomes[("None", "None", "BadRequest")] == 1
+
+
+def test_summary_lists_failures_most_frequent_first():
+    outcomes = {
+        ("a", "x", bulk.FULFILLED): 5,
+        ("a", "x", "KeyError"): 1,
+        ("b", "y", "BadRequest"): 3,
+    }
+
+    summary = bulk.summarize(Counter(outcomes))
+
+    assert summary["total"] == 9
+    assert summary["fulfilled"] == 5
+    assert summary["failed"] == 4
+    assert [failure["count"] for failure in summary["failures"]] == [3, 1]
+
+
+def test_main_keeps_logs_out_of_the_results(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("LOG_FILE", raising=False)
+    monkeypatch.setattr(LOGGER, "path", None)
+    source = tmp_path / "turns.ndjson"
+    write_input(source, 4)
+    summary = tmp_path / "summary.json"
+
+    status = bulk.main([str(source), "--executor", "inline", "--summary", str(summary)])
+    LOGGER.flush()
+
+    assert status == 0
+    assert os.environ["LOG_FILE"] == os.devnull
+    assert LOGGER.path == os.devnull
+    out, err = capsys.readouterr()
+    assert [json.loads(line).get("qid") for line in out.splitlines()] == [
+        "q0",
+        None,
+        "q2",
+        "q3",
+    ]
+    assert "4 payloads: 3 fulfilled, 1 failed" in err
+    assert json.loads(summary.read_text())["failed"] == 1
@@ -0,0 +1,139 @@
+import pytest
+import requests
+
+from date_webhook.backends.client import (
+    BackendClient,
+    BackendUnavailableException,
+    CircuitBreaker,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("not JSON")
+        return self.body
+
+
+def client_with(outcomes, **kwargs):
+    # Each call to the backend returns or raises the next outcome
+    client = BackendClient("http://backend", backoff=0, **kwargs)
+    outcomes = iter(outcomes)
+    calls = []
+
+    def request(method, url, json=None, timeout=None):
+        calls.append((method, url))
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client.session.request = request
+    client.calls = calls
+    return client
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_breaker_reopens_when_the_trial_fails():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+
+    # The trial is over, so the next half-open call is let through
+    assert breaker.allow()
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        requests.exceptions.ChunkedEncodingError("broken body"),
+        requests.exceptions.ContentDecodingError("bad gzip"),
+        requests.exceptions.InvalidURL("bad url"),
+    ],
+)
+def test_failed_half_open_trial_does_not_wedge_the_breaker(error):
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = client_with([error, FakeResponse(200, {"ok": True})], breaker=breaker)
+
+    with pytest.raises(BackendUnavailableException):
+        client.get("/accounts/1")
+    assert client.get("/accounts/1") == {"ok": True}
+    assert breaker.state == "closed"
+    assert len(client.calls) == 2
+
+
+def test_gateway_errors_are_retried_for_idempotent_calls():
+    client = client_with([FakeResponse(503), FakeResponse(200, {"ok": True})])
+
+    assert client.get("/accounts/1") == {"ok": True}
+    assert client.stats == {"calls": 1, "attempts": 2, "retries": 1, "failures": 1}
+
+
+def test_posts_are_not_retried_after_a_gateway_error():
+    client = client_with([FakeResponse(503), FakeResponse(200, {"ok": True})])
+
+    with pytest.raises(BackendUnavailableException):
+        client.post("/verify", {"name": "a"})
+    assert len(client.calls) == 1
+
+
+def test_connection_errors_are_retried_until_the_retries_run_out():
+    error = requests.ConnectionError("refused")
+    client = client_with([error] * 3, retries=2)
+
+    with pytest.raises(BackendUnavailableException):
+        client.post("/verify", {"name": "a"})
+    assert len(client.calls) == 3
+    assert client.stats["failures"] == 3
+
+
+def test_client_errors_do_not_count_against_the_breaker():
+    client = client_with([FakeResponse(404)] * 3, breaker=CircuitBreaker(threshold=2))
+
+    for _ in range(3):
+        with pytest.raises(BackendUnavailableException):
+            client.get("/accounts/1")
+    assert client.breaker.state == "closed"
+    assert len(client.calls) == 3
+
+
+def test_server_errors_and_bad_bodies_open_the_breaker():
+    client = client_with(
+        [FakeResponse(500), FakeResponse(200)],
+        retries=0,
+        breaker=CircuitBreaker(threshold=2, reset_timeout=60),
+    )
+
+    for _ in range(2):
+        with pytest.raises(BackendUnavailableException):
+            client.get("/accounts/1")
+    with pytest.raises(BackendUnavailableException, match="circuit"):
+        client.get("/accounts/1")
+    assert len(client.calls) == 2
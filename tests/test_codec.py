@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+import pytest
+
+from date_webhook.utils.codec import echo, get_codec
+from date_webhook.utils.cow import draft, freeze
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKENDS = ["json"] + (["orjson"] if orjson is not None else [])
+
+DOCUMENTS = [
+    b'{"qid":"q1","slots":{"_X_":{"type":"string","values":[]}}}\n',
+    b'{"a":[1,-2,3.5,true,false,null],"b":{"c":"\xc3\xa9\xf0\x9f\x98\x80"}}\n',
+    b'{"big":18446744073709551615,"small":-9223372036854775808}\n',
+    b'{"floats":[1e-07,0.0001,1e+20,1.5]}\n',
+]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_round_trip(backend, document):
+    codec = get_codec(backend)
+    assert codec.dumps(codec.loads(document)) == document
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_backends_agree(document):
+    values = [get_codec(backend).loads(document) for backend in BACKENDS]
+    encoded = {get_codec(backend).dumps(values[0]) for backend in BACKENDS}
+    assert all(value == values[0] for value in values)
+    assert encoded == {document}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_dumps_encodes_decimals_and_views(backend):
+    codec = get_codec(backend)
+    body = {"amount": Decimal("50000.00")}
+    view = draft(freeze({"values": [body]}))
+    view["values"].append({"amount": Decimal("1.50")})
+
+    assert codec.dumps(body) == b'{"amount":"50000.00"}\n'
+    assert codec.dumps(view) == (
+        b'{"values":[{"amount":"50000.00"},{"amount":"1.50"}]}\n'
+    )
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'{"a":"\\ud800"}',
+        b'{"a":"\\udc00x"}',
+        b'{"\\ud83d":1}',
+        b'["\\ud83d\\u0041"]',
+    ],
+)
+def test_loads_rejects_lone_surrogates(backend, document):
+    with pytest.raises(ValueError):
+        get_codec(backend).loads(document)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_loads_accepts_surrogate_pairs(backend):
+    assert get_codec(backend).loads(b'{"a":"\\ud83d\\ude00"}') == {"a": "\U0001f600"}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize(
+    "document", [b'{"a":NaN}', b'{"a":Infinity}', b'{"a":1e999}', b'{"a":"\xff"}']
+)
+def test_loads_rejects_what_orjson_rejects(backend, document):
+    with pytest.raises(ValueError):
+        get_codec(backend).loads(document)
+
+
+def test_echo_frames_documents():
+    assert echo(b'{"a":1}') == b'{"a":1}\n'
+    assert echo('{"a":1}\n') == b'{"a":1}\n'
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from date_webhook.dates import resolve_date, resolve_dates
+from date_webhook.utils.payload import Payload
+
+# A Sunday
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "tokens, expected",
+    [
+        ("today", "2026-10-18"),
+        ("Tomorrow", "2026-10-19"),
+        ("yesterday", "2026-10-17"),
+        ("in 3 days", "2026-10-21"),
+        ("two weeks ago", "2026-10-04"),
+        ("next friday", "2026-10-23"),
+        ("2026-12-01", "2026-12-01"),
+        ("12/25/2026", "2026-12-25"),
+        ("march 5th", "2027-03-05"),
+        ("the 5th of november", "2026-11-05"),
+        ("the 5th", "2026-11-05"),
+        ("may", "2027-05-01"),
+        ("feb 29", "2028-02-29"),
+    ],
+)
+def test_resolve_date(tokens, expected):
+    assert resolve_date(tokens, now=NOW) == expected
+
+
+@pytest.mark.parametrize(
+    "tokens", ["5", "1200", "hello", "the 32nd", "2026-02-30", "", None]
+)
+def test_resolve_date_leaves_non_dates(tokens):
+    assert resolve_date(tokens, now=NOW) is None
+
+
+def test_resolve_date_uses_the_users_day():
+    assert resolve_date("today", time_offset=-13 * 60, now=NOW) == "2026-10-17"
+    assert resolve_date("today", time_offset=13 * 60, now=NOW) == "2026-10-19"
+
+
+def test_resolve_dates():
+    request = Payload(
+        {
+            "time_offset": 13 * 60,
+            "slots": {
+                "_DATE_": {
+                    "type": "date",
+                    "values": [
+                        {"tokens": "tomorrow", "resolved": -1},
+                        {"tokens": "5", "resolved": -1},
+                        {"tokens": "today", "status": "UNCONFIRMED"},
+                    ],
+                },
+                "_NAME_": {
+                    "type": "string",
+                    "values": [{"tokens": "today", "resolved": -1}],
+                },
+            },
+        }
+    )
+
+    assert resolve_dates(request, now=NOW) == 1
+    slots = request.get()["slots"]
+    assert slots["_DATE_"]["values"] == [
+        {"tokens": "tomorrow", "resolved": 1, "value": "2026-10-20"},
+        {"tokens": "5", "resolved": -1},
+        {"tokens": "today", "status": "UNCONFIRMED"},
+    ]
+    assert slots["_NAME_"]["values"] == [{"tokens": "today", "resolved": -1}]
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from date_webhook import deadline as deadlines
+from date_webhook.app import app
+from date_webhook.deadline import (
+    DEADLINE_HEADER,
+    AdmissionController,
+    DeadlineExceededException,
+    OverloadedException,
+    check_deadline,
+    current_deadline,
+    deadline,
+    remaining,
+    request_budget,
+)
+
+
+@pytest.mark.parametrize(
+    "budget, header, seconds",
+    [
+        (0, None, None),
+        (0, "250", 0.25),
+        (0, "-5", 0.0),
+        (0, "soon", None),
+        (0, "nan", None),
+        (2, None, 2),
+        (2, "250", 0.25),
+        (2, "5000", 2),
+    ],
+)
+def test_request_budget(monkeypatch, budget, header, seconds):
+    monkeypatch.setattr(deadlines, "REQUEST_BUDGET", budget)
+
+    assert request_budget(header) == seconds
+
+
+def test_deadlines_are_set_within_and_reach_tasks():
+    async def task_remaining():
+        return remaining()
+
+    assert remaining() is None
+    with deadline(10) as current:
+        assert current_deadline() is current
+        assert 9 < asyncio.run(task_remaining()) <= 10
+        check_deadline()
+    assert current_deadline() is None
+
+
+def test_passed_deadlines_stop_work():
+    with deadline(0):
+        assert remaining() <= 0
+        with pytest.raises(DeadlineExceededException):
+            check_deadline()
+
+
+def test_admission_sheds_requests_over_the_limit():
+    admission = AdmissionController(limit=1)
+
+    with admission.admit():
+        with pytest.raises(OverloadedException):
+            with admission.admit():
+                pass
+        assert admission.in_flight == 1
+    assert admission.in_flight == 0
+    with admission.admit():
+        pass
+
+
+def test_no_limit_admits_everything():
+    admission = AdmissionController(limit=0)
+
+    with admission.admit(), admission.admit():
+        assert admission.in_flight == 0
+
+
+def test_turns_past_their_deadline_get_a_504():
+    turn = {"qid": "q1", "state": "root", "intent": "hello", "slots": {}}
+
+    response = app.test_client().post("/", json=turn, headers={DEADLINE_HEADER: "0"})
+
+    assert response.status_code == 504
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from date_webhook.deadline import DeadlineExceededException, deadline
+from date_webhook.utils.idempotency import IdempotencyCache, idempotency_key
+
+
+@pytest.mark.parametrize(
+    "payload, key",
+    [
+        ({"qid": "q1", "session_id": "s1"}, ("q1", "s1")),
+        ({"qid": 7, "session_id": "s1"}, (7, "s1")),
+        ({"qid": "q1"}, None),
+        ({"qid": ["q1"], "session_id": "s1"}, None),
+        ([], None),
+    ],
+)
+def test_idempotency_key(payload, key):
+    assert idempotency_key(payload) == key
+
+
+def test_responses_are_remembered_until_they_expire():
+    cache = IdempotencyCache(ttl=0.05)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute(("q1", "s1"), compute) == 1
+    assert cache.get_or_compute(("q1", "s1"), compute) == 1
+    time.sleep(0.06)
+    assert cache.get_or_compute(("q1", "s1"), compute) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_least_recently_used_responses_are_evicted():
+    cache = IdempotencyCache(max_entries=2)
+    for qid in ("q1", "q2", "q1", "q3"):
+        cache.get_or_compute((qid, "s1"), lambda: qid)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_or_compute(("q1", "s1"), lambda: "again") == "q1"
+    assert cache.get_or_compute(("q2", "s1"), lambda: "again") == "again"
+
+
+def test_concurrent_duplicates_are_computed_once():
+    cache = IdempotencyCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "response"
+
+    def request():
+        results.append(cache.get_or_compute(("q1", "s1"), compute))
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=request) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while cache.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["response"] * 4
+    assert cache.stats()["coalesced"] == 3
+
+
+def test_failures_are_shared_but_not_remembered():
+    cache = IdempotencyCache()
+
+    def fail():
+        raise ValueError("backend down")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute(("q1", "s1"), fail)
+    assert cache.get_or_compute(("q1", "s1"), lambda: "ok") == "ok"
+
+
+def test_discarded_responses_are_computed_again():
+    cache = IdempotencyCache()
+    cache.get_or_compute(("q1", "s1"), lambda: "degraded")
+    cache.discard(("q1", "s1"))
+
+    assert cache.get_or_compute(("q1", "s1"), lambda: "full") == "full"
+
+
+def test_duplicates_wait_no_longer_than_their_deadline():
+    cache = IdempotencyCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return "response"
+
+    leader = threading.Thread(target=cache.get_or_compute, args=(("q1", "s1"), compute))
+    leader.start()
+    started.wait(5)
+    try:
+        begin = time.monotonic()
+        with deadline(0.05), pytest.raises(DeadlineExceededException):
+            cache.get_or_compute(("q1", "s1"), compute)
+        assert time.monotonic() - begin < 1
+    finally:
+        release.set()
+        leader.join(5)
+    assert cache.get_or_compute(("q1", "s1"), compute) == "response"
+
+
+def test_concurrent_duplicates_are_computed_once_on_an_event_loop():
+    cache = IdempotencyCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "response"
+
+    async def main():
+        return await asyncio.gather(
+            *(cache.get_or_compute_async(("q1", "s1"), compute) for _ in range(4))
+        )
+
+    assert asyncio.run(main()) == ["response"] * 4
+    assert calls == [1]
+
+
+def test_duplicates_on_an_event_loop_wait_no_longer_than_their_deadline():
+    cache = IdempotencyCache()
+
+    async def compute():
+        await asyncio.sleep(0.5)
+        return "response"
+
+    async def follower():
+        with deadline(0.05):
+            return await cache.get_or_compute_async(("q1", "s1"), compute)
+
+    async def main():
+        leader = asyncio.ensure_future(
+            cache.get_or_compute_async(("q1", "s1"), compute)
+        )
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceededException):
+            await follower()
+        return await leader
+
+    assert asyncio.run(main()) == "response"
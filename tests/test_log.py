@@ -0,0 +1,83 @@
+import json
+
+from date_webhook import log
+from date_webhook.log import AsyncJsonLogger, log_fulfillment
+from date_webhook.metrics import LOG_RECORDS_DROPPED
+from date_webhook.router import WILDCARD, Route
+from date_webhook.utils.payload import Payload
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def dropped(name, reason):
+    return LOG_RECORDS_DROPPED.collect().get((name, reason), [0])[0]
+
+
+def test_records_are_written_as_json_lines(tmp_path):
+    path = tmp_path / "log.jsonl"
+    logger = AsyncJsonLogger(path=str(path), transform=lambda r: {**r, "seen": 1})
+
+    logger.log({"event": "a"})
+    logger.log({"event": "b", "time": 1})
+    logger.flush()
+
+    lines = read_lines(path)
+    assert [line["event"] for line in lines] == ["a", "b"]
+    assert lines[1]["time"] == 1
+    assert all(line["seen"] == 1 for line in lines)
+
+
+def test_records_are_dropped_rather_than_waited_on(tmp_path):
+    path = tmp_path / "log.jsonl"
+    logger = AsyncJsonLogger(name="test-overflow", path=str(path), max_queue=0)
+
+    logger.log({"event": "a"})
+
+    assert dropped("test-overflow", "overflow") == 1
+    assert not path.exists()
+
+
+def test_errors_are_never_sampled_out(tmp_path):
+    path = tmp_path / "log.jsonl"
+    logger = AsyncJsonLogger(name="test-sampled", path=str(path), sample_rate=0.0)
+
+    logger.log({"event": "sampled"})
+    logger.log({"event": "error"}, sample=False)
+    logger.flush()
+
+    assert [line["event"] for line in read_lines(path)] == ["error"]
+    assert dropped("test-sampled", "sampled") == 1
+
+
+def test_fulfillments_are_logged_under_their_route(tmp_path, monkeypatch):
+    path = tmp_path / "log.jsonl"
+    monkeypatch.setattr(log, "LOGGER", AsyncJsonLogger(path=str(path)))
+    request = Payload(
+        {
+            "state": "get_balance",
+            "intent": "cs_yes",
+            "qid": "q1",
+            "session_id": "s1",
+            "slots": {},
+        }
+    )
+    request.set_field("state", "root")
+    request.set_field("intent", "hello")
+
+    log_fulfillment(request, Route("get_balance", "cs_yes", print), 0.0015, None)
+    log_fulfillment(request, Route(WILDCARD, WILDCARD, print), 0.0, KeyError())
+    log.LOGGER.flush()
+
+    routed, failed = read_lines(path)
+    assert routed["state"] == "get_balance"
+    assert routed["intent"] == "cs_yes"
+    assert routed["next_state"] == "root"
+    assert routed["next_intent"] == "hello"
+    assert routed["route"] == "[get_balance][cs_yes]"
+    assert routed["duration_ms"] == 1.5
+    assert "error" not in routed
+    assert failed["state"] == WILDCARD
+    assert failed["error"] == "KeyError"
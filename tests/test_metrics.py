@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from date_webhook.metrics import Counter, Histogram, Metric, Registry
+
+
+def registry_with(directory=None, interval=5.0):
+    registry = Registry(directory, interval)
+    counter = registry.register(Counter("turns_total", "Turns", ("endpoint",)))
+    histogram = registry.register(
+        Histogram("turn_seconds", "Turn time", buckets=(0.1, 1.0))
+    )
+    return registry, counter, histogram
+
+
+def write_worker(directory, pid, rows):
+    path = os.path.join(directory, f"metrics-{pid}.json")
+    with open(path, "w") as f:
+        json.dump({"turns_total": [[["/"], [count]] for count in rows]}, f)
+    return path
+
+
+def test_metric_must_render_its_samples():
+    with pytest.raises(TypeError):
+        Metric("m", "A metric")
+
+
+def test_counter_and_histogram_render():
+    registry, counter, histogram = registry_with()
+    counter.inc("/")
+    counter.inc("/", amount=2)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+
+    lines = registry.render().splitlines()
+
+    assert 'turns_total{endpoint="/"} 3' in lines
+    assert 'turn_seconds_bucket{le="0.1"} 1' in lines
+    assert 'turn_seconds_bucket{le="1.0"} 2' in lines
+    assert 'turn_seconds_bucket{le="+Inf"} 3' in lines
+    assert "turn_seconds_sum 3.55" in lines
+    assert "turn_seconds_count 3" in lines
+
+
+def test_shards_of_every_thread_are_summed():
+    registry, counter, _ = registry_with()
+
+    def record():
+        for _ in range(1000):
+            counter.inc("/")
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    counter.inc("/")
+    for thread in threads:
+        thread.join()
+
+    assert registry.collect()["turns_total"] == {("/",): [4001]}
+
+
+def test_workers_are_summed_through_the_directory(tmp_path):
+    registry, counter, _ = registry_with(str(tmp_path))
+    counter.inc("/", amount=2)
+    write_worker(str(tmp_path), "other", [5])
+
+    assert registry.collect()["turns_total"] == {("/",): [7]}
+    assert os.path.exists(tmp_path / f"metrics-{os.getpid()}.json")
+
+
+def test_stale_worker_files_are_left_out(tmp_path):
+    registry, counter, _ = registry_with(str(tmp_path), interval=1.0)
+    counter.inc("/")
+    stale = write_worker(str(tmp_path), "dead", [5])
+    an_hour_ago = time.time() - 3600
+    os.utime(stale, (an_hour_ago, an_hour_ago))
+    write_worker(str(tmp_path), "live", [2])
+
+    assert registry.collect()["turns_total"] == {("/",): [3]}
+
+
+def test_exiting_worker_removes_its_file(tmp_path):
+    registry, counter, _ = registry_with(str(tmp_path))
+    counter.inc("/")
+    registry.dump()
+
+    registry._remove()
+
+    assert not os.listdir(tmp_path)
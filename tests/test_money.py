@@ -0,0 +1,91 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from date_webhook.money import normalize_amount, normalize_money
+from date_webhook.utils.payload import Payload
+
+
+@pytest.mark.parametrize(
+    "tokens, amount, currency",
+    [
+        ("50k", "50000.00", "dollars"),
+        ("$1,200.50", "1200.50", "dollars"),
+        ("1200", "1200.00", "dollars"),
+        (1200, "1200.00", "dollars"),
+        ("2.5 million euros", "2500000.00", "euros"),
+        ("£30", "30.00", "pounds"),
+        ("a grand", "1000.00", "dollars"),
+        ("twenty five", "25.00", "dollars"),
+        ("two hundred five", "205.00", "dollars"),
+        ("twenty five hundred", "2500.00", "dollars"),
+        ("two thousand five hundred and fifty", "2550.00", "dollars"),
+        ("ninety nine thousand nine hundred ninety nine", "99999.00", "dollars"),
+    ],
+)
+def test_normalize_amount(tokens, amount, currency):
+    assert normalize_amount(tokens) == (Decimal(amount), currency)
+
+
+@pytest.mark.parametrize(
+    "tokens",
+    [
+        "",
+        "a",
+        "hello",
+        "one two",
+        "five six",
+        "eleven five",
+        "twenty thirty",
+        "twenty one two",
+        "one hundred hundred",
+        "9" * 30,
+        "9" * 27 + " billion",
+        None,
+        True,
+    ],
+)
+def test_normalize_amount_leaves_non_amounts(tokens):
+    assert normalize_amount(tokens) is None
+
+
+def test_normalize_money():
+    request = Payload(
+        {
+            "slots": {
+                "_AMBIGUOUS_AMOUNT_": {
+                    "type": "string",
+                    "values": [
+                        {"tokens": "50k", "resolved": -1},
+                        {"tokens": "9" * 30, "resolved": -1},
+                        {"tokens": "one two", "resolved": -1},
+                    ],
+                },
+                "_LIMIT_": {
+                    "type": "money",
+                    "values": [{"tokens": "$20", "status": "UNCONFIRMED"}],
+                },
+                "_NAME_": {
+                    "type": "string",
+                    "values": [{"tokens": "10", "resolved": -1}],
+                },
+            }
+        }
+    )
+
+    assert normalize_money(request) == 1
+    slots = request.get()["slots"]
+    assert slots["_AMBIGUOUS_AMOUNT_"]["values"] == [
+        {
+            "tokens": "50k",
+            "resolved": 1,
+            "value": "50000.00",
+            "currency": "dollars",
+        },
+        {"tokens": "9" * 30, "resolved": -1},
+        {"tokens": "one two", "resolved": -1},
+    ]
+    assert slots["_LIMIT_"]["values"] == [{"tokens": "$20", "status": "UNCONFIRMED"}]
+    assert slots["_NAME_"]["values"] == [{"tokens": "10", "resolved": -1}]
+    assert json.loads(json.dumps(slots)) == slots
@@ -0,0 +1,163 @@
+import copy
+import json
+
+import pytest
+
+from date_webhook.utils.cow import commit, draft, freeze, thaw
+from date_webhook.utils.payload import Payload
+
+
+def payload():
+    return {
+        "state": "get_balance",
+        "intent": "get_balance_start",
+        "slots": {
+            "_NAME_": {
+                "type": "string",
+                "values": [{"tokens": "ann", "resolved": -1}],
+            },
+            "_DATE_": {"type": "date", "values": []},
+        },
+        "session_info": {"user": {"id": 1}},
+    }
+
+
+@pytest.mark.parametrize("typed_slots", [False, True])
+def test_get_returns_an_independent_dict(typed_slots):
+    request = Payload(payload(), typed_slots=typed_slots)
+    rb = request.get()
+
+    assert isinstance(rb, dict)
+    assert isinstance(rb["slots"]["_NAME_"]["values"][0], dict)
+    assert json.loads(json.dumps(rb)) == payload()
+    assert json.loads(json.dumps(dict(rb))) == payload()
+
+    rb["slots"]["_NAME_"]["values"][0]["resolved"] = 1
+    rb["session_info"]["user"]["id"] = 2
+    assert request.get() == payload()
+    assert copy.deepcopy(rb) == rb
+
+
+@pytest.mark.parametrize("typed_slots", [False, True])
+def test_payload_never_modifies_its_input(typed_slots):
+    original = payload()
+    request = Payload(original, typed_slots=typed_slots)
+    request.blind_resolve()
+    request.set_field("session_info", {"user": {"id": 3}})
+    request.transition("done")
+
+    assert original == payload()
+    assert request.get_slot_values("name")[0]["resolved"] == 1
+    assert request.get()["session_info"] == {"user": {"id": 3}}
+
+
+@pytest.mark.parametrize("typed_slots", [False, True])
+def test_overwrite_copies_plain_dicts(typed_slots):
+    request = Payload(payload(), typed_slots=typed_slots)
+    rb = request.get()
+    rb["slots"]["_NAME_"]["values"][0]["resolved"] = 1
+    request.overwrite(rb)
+    rb["slots"]["_NAME_"]["values"][0]["resolved"] = -1
+    rb["session_info"]["user"]["id"] = 2
+
+    assert request.get_slot_values("name")[0]["resolved"] == 1
+    assert request.get()["session_info"] == {"user": {"id": 1}}
+
+
+def test_get_and_overwrite_share_unchanged_subtrees():
+    original = payload()
+    request = Payload(original, typed_slots=False)
+    rb = request.get()
+    rb["slots"]["_NAME_"]["values"][0]["resolved"] = 1
+    request.overwrite(rb)
+
+    current = request.snapshot()
+    assert current["slots"]["_DATE_"] is original["slots"]["_DATE_"]
+    assert current["session_info"] is original["session_info"]
+    assert current["slots"]["_NAME_"]["values"][0]["resolved"] == 1
+    assert original == payload()
+    assert request.changes() == [("slots", "_NAME_", "values", 0)]
+
+    rb["slots"]["_NAME_"]["values"][0]["resolved"] = 0
+    assert request.get_slot_values("name")[0]["resolved"] == 1
+
+
+def test_overwrite_without_changes_keeps_the_payload():
+    original = payload()
+    request = Payload(original, typed_slots=False)
+    rb = request.get()
+    for slot in rb["slots"].values():
+        for slot_value in slot["values"]:
+            slot_value.get("tokens")
+    request.overwrite(rb)
+
+    assert request.snapshot() is original
+    assert request.changes() == []
+
+
+def test_draft_reads_never_expose_the_base():
+    base = payload()
+    rb = draft(base)
+    for values in (
+        list(rb["slots"].values()),
+        [value for _, value in rb["slots"].items()],
+        [rb["slots"].get("_NAME_")],
+        [dict(rb)["slots"]],
+        [{**rb}["session_info"]],
+        [rb.copy()["session_info"]],
+        [copy.copy(rb)["session_info"]],
+        list(rb["slots"]["_NAME_"]["values"]),
+        rb["slots"]["_NAME_"]["values"][:1],
+        [rb["slots"]["_NAME_"]["values"].pop()],
+    ):
+        for value in values:
+            value["changed"] = True
+
+    assert base == payload()
+
+
+def test_draft_shares_unchanged_subtrees():
+    base = payload()
+    rb = draft(base)
+    rb["slots"]["_NAME_"]["values"][0]["resolved"] = 1
+    committed = commit(rb)
+
+    assert base == payload()
+    assert committed["slots"]["_NAME_"]["values"][0]["resolved"] == 1
+    assert committed["slots"]["_DATE_"] is base["slots"]["_DATE_"]
+    assert committed["session_info"] is base["session_info"]
+
+
+def test_draft_copies_plain_values_set_on_it():
+    value = {"user": {"id": 2}}
+    rb = draft(payload())
+    rb["session_info"] = value
+    value["user"]["id"] = 3
+    rb["extra"] = [value]
+    value["user"]["id"] = 4
+
+    committed = commit(rb)
+    assert committed["session_info"] == {"user": {"id": 2}}
+    assert committed["extra"] == [{"user": {"id": 3}}]
+
+
+def test_draft_keeps_drafts_set_on_it_aliased():
+    rb = draft(payload())
+    rb["slots"]["_ALIAS_"] = rb["slots"]["_NAME_"]
+    rb["slots"]["_NAME_"]["values"].append({"tokens": "bob", "resolved": -1})
+
+    committed = commit(rb)
+    assert committed["slots"]["_ALIAS_"]["values"] == [
+        {"tokens": "ann", "resolved": -1},
+        {"tokens": "bob", "resolved": -1},
+    ]
+
+
+def test_frozen_views_are_read_only():
+    view = freeze(payload())
+
+    with pytest.raises(TypeError):
+        view["state"] = "done"
+    with pytest.raises(TypeError):
+        view["slots"]["_NAME_"]["values"][0]["resolved"] = 1
+    assert thaw(view) == payload()
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from date_webhook.deadline import DeadlineExceededException, deadline
+from date_webhook.pipeline import (
+    Pipeline,
+    blind_resolve,
+    coroutine_variant,
+    resolve_slots,
+)
+from date_webhook.router import WILDCARD, Router
+from date_webhook.utils.payload import Payload
+
+
+def request(state="root", intent="hello"):
+    return Payload({"state": state, "intent": intent, "slots": {}})
+
+
+def pipeline(handler, **kwargs):
+    return Pipeline(Router({"root": {"hello": handler}}), **kwargs)
+
+
+def test_stages_run_around_the_fulfiller_in_order():
+    calls = []
+    stages = pipeline(
+        lambda r: calls.append("fulfill") or "result",
+        preprocessors=[lambda r, route: calls.append("pre")],
+        postprocessors=[lambda r, route: calls.append("post")],
+        observers=[lambda r, route, elapsed, e: calls.append(("observe", e))],
+    )
+    stages.preprocessor(lambda r, route: calls.append("pre2"))
+
+    assert stages.run(request()) == "result"
+    assert calls == ["pre", "pre2", "fulfill", "post", ("observe", None)]
+
+
+def test_observers_see_the_error_that_failed_a_fulfillment():
+    observed = []
+    error = KeyError("x")
+
+    def fail(r):
+        raise error
+
+    stages = pipeline(fail)
+    stages.observer(lambda r, route, elapsed, e: observed.append((route.name, e)))
+
+    with pytest.raises(KeyError):
+        stages.run(request())
+    assert observed == [("[root][hello]", error)]
+
+
+def test_unrouted_requests_go_to_the_fallback():
+    fulfilled = []
+    stages = pipeline(print, fallback=lambda r: fulfilled.append(r.get_state()))
+
+    stages.run(request("nowhere"))
+
+    assert fulfilled == ["nowhere"]
+    assert stages.route(request("nowhere")).state == WILDCARD
+
+
+def test_coroutine_fulfillers_are_run_and_awaited():
+    async def fulfiller(r):
+        await asyncio.sleep(0)
+        return "async"
+
+    assert pipeline(fulfiller).run(request()) == "async"
+    assert asyncio.run(pipeline(fulfiller).run_async(request())) == "async"
+
+
+def test_coroutine_variants_are_only_awaited_by_run_async():
+    async def variant(r):
+        return "variant"
+
+    @coroutine_variant(variant)
+    def fulfiller(r):
+        return "sync"
+
+    assert pipeline(fulfiller).run(request()) == "sync"
+    assert asyncio.run(pipeline(fulfiller).run_async(request())) == "variant"
+
+
+def test_blind_resolve_is_opt_in():
+    def slotted():
+        r = request()
+        r.set_slot("_NAME_", "string", [{"tokens": "ann", "resolved": -1}])
+        return r
+
+    opted_in, opted_out = slotted(), slotted()
+    pipeline(blind_resolve(lambda r: None), preprocessors=[resolve_slots]).run(opted_in)
+    pipeline(lambda r: None, preprocessors=[resolve_slots]).run(opted_out)
+
+    assert opted_in.get_slots()["_NAME_"]["values"] == [
+        {"tokens": "ann", "resolved": 1, "value": "ann"}
+    ]
+    assert opted_out.get_slots()["_NAME_"]["values"] == [
+        {"tokens": "ann", "resolved": -1}
+    ]
+
+
+def test_passed_deadlines_are_not_fulfilled():
+    fulfilled = []
+    stages = pipeline(fulfilled.append)
+
+    with deadline(-1):
+        with pytest.raises(DeadlineExceededException):
+            stages.run(request())
+    assert fulfilled == []
+
+
+def test_turns_short_of_time_are_degraded_under_their_route():
+    observed = []
+    stages = pipeline(
+        lambda r: "full",
+        degraded=lambda r: "degraded",
+        degrade_margin=60,
+        observers=[lambda r, route, elapsed, e: observed.append(route.name)],
+    )
+
+    with deadline(1) as current:
+        assert stages.run(request()) == "degraded"
+    assert current.degraded
+    assert observed == ["[root][hello]"]
+    with deadline(120):
+        assert stages.run(request()) == "full"
@@ -0,0 +1,77 @@
+import copy
+import json
+
+from date_webhook import recording
+from date_webhook.log import AsyncJsonLogger
+from date_webhook.recording import pseudonym, scrub
+
+
+def payload():
+    return {
+        "qid": "q1",
+        "session_id": "s1",
+        "external_user_id": "u1",
+        "query": "my name is ann",
+        "state": "get_balance",
+        "slots": {
+            "_PERSON_NAME_": {
+                "type": "string",
+                "values": [{"tokens": "ann", "resolved": 1, "value": "Ann"}],
+            },
+            "_DATE_": {"type": "date", "values": [{"tokens": "today"}]},
+        },
+        "session_info": {"mufg_user_id": 7, "locale": "en"},
+    }
+
+
+def test_personal_data_is_replaced_by_pseudonyms():
+    original = payload()
+    scrubbed = scrub(original)
+
+    assert original == payload()
+    for field in ("session_id", "external_user_id", "query"):
+        assert scrubbed[field] == pseudonym(original[field])
+    assert scrubbed["qid"] == "q1"
+    assert scrubbed["state"] == "get_balance"
+    assert scrubbed["slots"]["_PERSON_NAME_"]["values"] == [
+        {"tokens": pseudonym("ann"), "resolved": 1, "value": pseudonym("Ann")}
+    ]
+    assert scrubbed["slots"]["_DATE_"] == original["slots"]["_DATE_"]
+    assert scrubbed["session_info"] == {"mufg_user_id": pseudonym(7), "locale": "en"}
+    assert "ann" not in json.dumps(scrubbed).lower()
+
+
+def test_pseudonyms_are_stable_under_a_key():
+    assert pseudonym("s1", key=b"a") == pseudonym("s1", key=b"a")
+    assert pseudonym("s1", key=b"a") != pseudonym("s1", key=b"b")
+    assert pseudonym("s1", key=b"a") != pseudonym("s2", key=b"a")
+    assert pseudonym({"a": 1, "b": 2}) == pseudonym({"b": 2, "a": 1})
+    assert pseudonym(None) is None
+
+
+def test_payloads_without_personal_data_are_kept():
+    assert scrub({"qid": "q1", "slots": {}}) == {"qid": "q1", "slots": {}}
+    assert scrub([1, 2]) == [1, 2]
+
+
+def test_turns_are_recorded_scrubbed(tmp_path, monkeypatch):
+    path = tmp_path / "traffic.ndjson"
+    recorder = AsyncJsonLogger(
+        name="recording", path=str(path), transform=recording._scrub_record
+    )
+    monkeypatch.setattr(recording, "RECORDER", recorder)
+    request = payload()
+    response = copy.deepcopy(request)
+    response["state"] = "root"
+
+    recording.record_turn(request, json.dumps(response).encode(), 0.002)
+    recorder.flush()
+
+    with open(path) as f:
+        (record,) = [json.loads(line) for line in f]
+    assert record["request"] == scrub(request)
+    assert record["response"]["session_id"] == record["request"]["session_id"]
+    assert record["response"]["state"] == "root"
+    assert record["status"] == 200
+    assert record["duration_ms"] == 2.0
+    assert request == payload()
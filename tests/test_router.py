@@ -0,0 +1,91 @@
+import pytest
+
+from date_webhook.router import WILDCARD, InvalidRouteException, Route, Router
+
+
+def exact(request):
+    pass
+
+
+def any_intent(request):
+    pass
+
+
+def fallback(request):
+    pass
+
+
+def router():
+    return Router(
+        {
+            "get_balance": {"get_balance_start": exact, WILDCARD: any_intent},
+            WILDCARD: fallback,
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "state, intent, handler",
+    [
+        ("get_balance", "get_balance_start", exact),
+        ("get_balance", "cs_yes", any_intent),
+        ("root", "get_balance_start", fallback),
+    ],
+)
+def test_exact_routes_win_over_wildcards(state, intent, handler):
+    assert router().resolve(state, intent).handler is handler
+
+
+def test_nothing_resolves_without_a_catch_all():
+    assert Router({"root": {"hello": exact}}).resolve("root", "bye") is None
+
+
+def test_routes_are_named_after_their_handler():
+    route = router().resolve("get_balance", "get_balance_start")
+
+    assert route == Route("get_balance", "get_balance_start", exact)
+    assert route.name == "[get_balance][get_balance_start]"
+    assert route.handler_name == "test_router.exact"
+    assert router().resolve("root", "x").name == "[*]"
+
+
+def test_routes_are_not_replaced_unless_asked():
+    routes = router()
+
+    with pytest.raises(InvalidRouteException):
+        routes.add("get_balance", "get_balance_start", fallback)
+    routes.add("get_balance", "get_balance_start", fallback, replace=True)
+
+    assert routes.resolve("get_balance", "get_balance_start").handler is fallback
+    assert len(routes) == 3
+
+
+def test_register_adds_the_decorated_fulfiller():
+    routes = Router()
+
+    @routes.register("root", "hello")
+    def hello(request):
+        pass
+
+    assert ("root", "hello") in routes
+    assert [route.handler for route in routes] == [hello]
+
+
+@pytest.mark.parametrize(
+    "table",
+    [
+        [],
+        {"root": exact},
+        {"root": {"hello": "not callable"}},
+        {"root": {"hello": lambda: None}},
+        {"root": {"": exact}},
+    ],
+)
+def test_invalid_tables_are_refused_when_loaded(table):
+    with pytest.raises(InvalidRouteException):
+        Router(table)
+
+
+def test_the_catch_all_state_takes_any_intent_only():
+    with pytest.raises(InvalidRouteException):
+        Router().add(WILDCARD, "hello", exact)
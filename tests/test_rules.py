@@ -0,0 +1,138 @@
+import itertools
+
+import pytest
+
+from date_webhook.fulfillments.increase_cc_limit_fulfillment import (
+    AMBIGUOUS_AMOUNT_RULES,
+    handle_ambiguous,
+)
+from date_webhook.rules import InvalidRuleException, RuleTable
+from date_webhook.utils.payload import Payload
+
+MONEY_SLOTS = ["_ANNUAL_INCOME_", "_ESTIMATE_AMOUNT_", "_DESIRED_LIMIT_"]
+
+
+def legacy_handle_ambiguous(request):
+    # handle_ambiguous before AMBIGUOUS_AMOUNT_RULES, with its three
+    # branches folded into a loop over the money slots in order
+    rb = request.get()
+
+    for slot in rb["slots"]:
+        for slot_value in rb["slots"][slot]["values"]:
+            if "status" in slot_value:
+                slot_value["status"] = "CONFIRMED"
+            else:
+                slot_value["resolved"] = 1
+            if "value" not in slot_value:
+                slot_value["value"] = slot_value["tokens"]
+
+    if rb["intent"] == "ambiguous_amount_start":
+        if request.slot_exists("ambiguous_amount"):
+            for slot_name in MONEY_SLOTS:
+                if not request.slot_exists(slot_name):
+                    ambiguous = rb["slots"]["_AMBIGUOUS_AMOUNT_"]["values"][0]
+                    rb["slots"][slot_name] = {
+                        "type": "string",
+                        "values": [
+                            {
+                                "status": "CONFIRMED",
+                                "tokens": ambiguous["tokens"],
+                                "value": ambiguous["value"],
+                                "currency": "dollars",
+                            }
+                        ],
+                    }
+                    ambiguous["status"] = "DELETE"
+                    break
+
+    request.overwrite(rb)
+
+
+def slot(tokens, **fields):
+    return {"type": "string", "values": [{"tokens": tokens, **fields}]}
+
+
+def payloads():
+    for intent, ambiguous, present in itertools.product(
+        ["ambiguous_amount_start", "ambiguous_amount_update", "cs_yes"],
+        [None, {"resolved": -1}, {"resolved": 1, "value": "5000"}, {"status": "X"}],
+        itertools.product([False, True], repeat=len(MONEY_SLOTS)),
+    ):
+        slots = {
+            slot_name: slot(f"{position}0k", resolved=-1)
+            for position, (slot_name, exists) in enumerate(zip(MONEY_SLOTS, present))
+            if exists
+        }
+        if ambiguous is not None:
+            slots["_AMBIGUOUS_AMOUNT_"] = slot("50k", **ambiguous)
+        yield {"state": "increase_cc_limit", "intent": intent, "slots": slots}
+
+
+@pytest.mark.parametrize("payload", list(payloads()))
+def test_handle_ambiguous_matches_legacy(payload):
+    expected = Payload(payload)
+    legacy_handle_ambiguous(expected)
+    request = Payload(payload)
+    request.blind_resolve()
+    handle_ambiguous(request)
+
+    assert request.get() == expected.get()
+
+
+def test_rules_apply_the_first_match():
+    request = Payload(
+        {
+            "intent": "ambiguous_amount_start",
+            "slots": {
+                "_AMBIGUOUS_AMOUNT_": slot("50k", resolved=1, value="50k"),
+                "_ANNUAL_INCOME_": slot("90k", resolved=1, value="90k"),
+            },
+        }
+    )
+
+    assert AMBIGUOUS_AMOUNT_RULES.apply(request) == "estimate_amount"
+    assert request.get_slot_values("estimate_amount") == [
+        {"status": "CONFIRMED", "currency": "dollars", "tokens": "50k", "value": "50k"}
+    ]
+    assert request.get_slot_values("ambiguous_amount")[0]["status"] == "DELETE"
+
+
+def test_rules_check_state_and_resolved_slots():
+    table = RuleTable(
+        [
+            {
+                "state": "s1",
+                "resolved": ["name"],
+                "actions": [{"transition": "s2"}],
+            },
+            {"name": "fallback", "actions": [{"delete": "name"}]},
+        ]
+    )
+    request = Payload(
+        {"state": "s1", "intent": "i", "slots": {"_NAME_": slot("a", resolved=-1)}}
+    )
+
+    assert table.apply(request) == "fallback"
+    assert request.get_slot_values("name")[0]["status"] == "DELETE"
+
+    request = Payload(
+        {"state": "s1", "intent": "i", "slots": {"_NAME_": slot("a", resolved=1)}}
+    )
+    assert table.apply(request) == "0"
+    assert request.get_state() == "s2"
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        "not a rule",
+        {"actions": []},
+        {"when": "always", "actions": [{"delete": "name"}]},
+        {"actions": [{"copy": "name"}]},
+        {"actions": [{"copy": "name", "delete": "name"}]},
+        {"intent": 1, "actions": [{"delete": "name"}]},
+    ],
+)
+def test_invalid_rules_are_rejected(rule):
+    with pytest.raises(InvalidRuleException):
+        RuleTable([rule])
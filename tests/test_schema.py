@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from date_webhook.router import Route
+from date_webhook.schema import (
+    MAX_ERRORS,
+    PAYLOAD_SCHEMA,
+    PAYLOAD_VALIDATOR,
+    InvalidPayloadException,
+    compile_schema,
+    require,
+    route_validator,
+    validate,
+)
+
+
+def payload():
+    return {
+        "state": "root",
+        "intent": "hello",
+        "slots": {"_NAME_": {"type": "string", "values": [{"tokens": "ann"}]}},
+    }
+
+
+def test_valid_payloads_have_no_errors():
+    assert PAYLOAD_VALIDATOR(payload()) == []
+
+
+def test_every_error_is_reported_with_its_path():
+    invalid = payload()
+    del invalid["intent"]
+    invalid["state"] = 1
+    invalid["slots"]["_NAME_"]["values"].append({"resolved": True})
+    invalid["slots"]["a/b~"] = []
+
+    assert PAYLOAD_VALIDATOR(invalid) == [
+        {"path": "", "message": "[intent] is required"},
+        {"path": "/state", "message": "must be string"},
+        {"path": "/slots/_NAME_/values/1", "message": "[tokens] is required"},
+        {
+            "path": "/slots/_NAME_/values/1/resolved",
+            "message": "must be integer or null",
+        },
+        {"path": "/slots/a~1b~0", "message": "must be object"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "schema, value, valid",
+    [
+        ({"type": "integer"}, 1, True),
+        ({"type": "integer"}, True, False),
+        ({"type": "number"}, 1.5, True),
+        ({"type": ["string", "null"]}, None, True),
+        ({"type": "array", "items": {"type": "string"}}, ["a", 1], False),
+        ({"properties": {"a": {"type": "string"}}}, {"b": 1}, True),
+        ({}, object(), True),
+    ],
+)
+def test_types(schema, value, valid):
+    assert (compile_schema(schema)(value) == []) == valid
+
+
+def test_require_extends_a_schema_without_changing_it():
+    schema = require(PAYLOAD_SCHEMA, session_info={"type": "object"})
+
+    assert PAYLOAD_SCHEMA["required"] == ["state", "intent", "slots"]
+    assert compile_schema(schema)(payload()) == [
+        {"path": "", "message": "[session_info] is required"}
+    ]
+
+
+def test_fulfillers_may_set_their_own_schema():
+    @validate({"type": "object", "required": ["qid"]})
+    def strict(request):
+        pass
+
+    @validate(None)
+    def lax(request):
+        pass
+
+    assert route_validator(None) is PAYLOAD_VALIDATOR
+    assert route_validator(Route("root", "hello", print)) is PAYLOAD_VALIDATOR
+    assert route_validator(Route("root", "hello", strict))(payload()) == [
+        {"path": "", "message": "[qid] is required"}
+    ]
+    assert route_validator(Route("root", "hello", lax)) is None
+
+
+def test_invalid_payloads_are_answered_with_their_errors():
+    errors = [{"path": f"/{i}", "message": "must be string"} for i in range(30)]
+    e = InvalidPayloadException(errors)
+
+    body = json.loads(e.get_body())
+
+    assert e.code == 400
+    assert body["error"]["errors"] == errors[:MAX_ERRORS]
+    assert e.get_headers() == [("Content-Type", "application/json")]
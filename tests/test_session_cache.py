@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from date_webhook.utils.payload import Payload
+from date_webhook.utils.session_cache import (
+    FileSessionCache,
+    MemorySessionCache,
+    NullSessionCache,
+    SessionCache,
+)
+
+
+@pytest.fixture(params=["memory", "file"])
+def make_cache(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemorySessionCache(**kwargs)
+        return FileSessionCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+    return make
+
+
+def test_the_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        SessionCache()
+
+
+def test_values_are_kept_per_session(make_cache):
+    cache = make_cache()
+    cache.set("s1", "balance", {"amount": 100, "accounts": [1, 2]})
+
+    assert cache.get("s1", "balance") == {"amount": 100, "accounts": [1, 2]}
+    assert cache.get("s2", "balance", "none") == "none"
+    cache.delete("s1", "balance")
+    assert cache.get("s1", "balance") is None
+
+
+def test_values_are_read_only(make_cache):
+    cache = make_cache()
+    cache.set("s1", "user", {"ids": [1]})
+
+    with pytest.raises(TypeError):
+        cache.get("s1", "user")["ids"] = [2]
+
+
+def test_values_expire(make_cache):
+    cache = make_cache(ttl=60)
+    cache.set("s1", "kept", 1)
+    cache.set("s1", "expired", 2, ttl=-1)
+
+    assert cache.get("s1", "kept") == 1
+    assert cache.get("s1", "expired") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_values_are_evicted(make_cache):
+    cache = make_cache(max_entries=2)
+    if isinstance(cache, FileSessionCache):
+        cache.sweep_every = 1
+    cache.set("s1", "a", 1)
+    cache.set("s1", "b", 2)
+    cache.get("s1", "a")
+    cache.set("s1", "c", 3)
+
+    assert cache.get("s1", "a") == 1
+    assert cache.get("s1", "c") == 3
+    assert cache.get("s1", "b") is None
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_stats_count_hits_and_misses(make_cache):
+    cache = make_cache()
+    cache.set("s1", "a", 1)
+    cache.get("s1", "a")
+    cache.get("s1", "b")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["size"] == 1
+
+
+def test_counters_are_exact_under_concurrent_lookups(make_cache):
+    cache = make_cache()
+    cache.set("s1", "a", 1)
+
+    def lookup():
+        for _ in range(200):
+            cache.get("s1", "a")
+            cache.get("s1", "b")
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 800
+
+
+def test_file_cache_is_shared_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    FileSessionCache(path).set("s1", "a", {"b": [1]})
+
+    assert FileSessionCache(path).get("s1", "a") == {"b": [1]}
+
+
+def test_null_cache_holds_nothing():
+    cache = NullSessionCache()
+    cache.set("s1", "a", 1)
+
+    assert cache.get("s1", "a", 0) == 0
+    assert len(cache) == 0
+
+
+def test_payload_session_values(make_cache):
+    cache = make_cache()
+    payload = {"session_id": "s1", "slots": {}}
+    Payload(payload, session_cache=cache).set_session_value("user", {"id": 1})
+
+    request = Payload(payload, session_cache=cache)
+    assert request.get_session_value("user") == {"id": 1}
+    assert request.get_session_value("other", "none") == "none"
+    assert not request.modified
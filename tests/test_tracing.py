@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from date_webhook import tracing
+from date_webhook.app import app
+from date_webhook.log import AsyncJsonLogger
+from date_webhook.tracing import (
+    CLIENT,
+    NOT_TRACED,
+    SERVER,
+    current_span,
+    span,
+    to_otlp,
+    trace,
+)
+
+
+@pytest.fixture
+def traces(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    tracer = AsyncJsonLogger(
+        name="tracing",
+        path=str(path),
+        transform=lambda record: to_otlp(record["spans"]),
+    )
+    monkeypatch.setattr(tracing, "TRACER", tracer)
+
+    def read():
+        tracer.flush()
+        with open(path) as f:
+            return [
+                json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+                for line in f
+            ]
+
+    return read
+
+
+def test_turns_are_not_traced_without_a_tracer():
+    with trace("POST /") as root:
+        assert root is NOT_TRACED
+        assert span("parse") is NOT_TRACED
+        assert current_span() is None
+
+
+def test_spans_nest_under_the_root_span(traces):
+    with trace("POST /") as root:
+        root.set_turn({"qid": "q1", "session_id": 7, "state": True, "slots": {}})
+        with span("fulfill"):
+            with span("backend", {"retries": 1}, kind=CLIENT) as call:
+                assert current_span() is call
+        with pytest.raises(KeyError):
+            with span("serialize"):
+                raise KeyError()
+    assert current_span() is None
+
+    (spans,) = traces()
+    by_name = {s["name"]: s for s in spans}
+    assert [s["name"] for s in spans] == ["backend", "fulfill", "serialize", "POST /"]
+    assert len({s["traceId"] for s in spans}) == 1
+    assert by_name["POST /"]["parentSpanId"] == ""
+    assert by_name["POST /"]["kind"] == SERVER
+    assert by_name["fulfill"]["parentSpanId"] == by_name["POST /"]["spanId"]
+    assert by_name["backend"]["parentSpanId"] == by_name["fulfill"]["spanId"]
+    assert by_name["backend"]["attributes"] == [
+        {"key": "retries", "value": {"intValue": "1"}}
+    ]
+    assert by_name["serialize"]["status"] == {"code": 2, "message": "KeyError"}
+    assert by_name["POST /"]["attributes"] == [
+        {"key": "qid", "value": {"stringValue": "q1"}},
+        {"key": "session_id", "value": {"intValue": "7"}},
+    ]
+
+
+def test_served_turns_are_traced(traces):
+    turn = {"qid": "q1", "state": "root", "intent": "hello", "slots": {}}
+
+    assert app.test_client().post("/", json=turn).status_code == 200
+
+    (spans,) = traces()
+    names = [s["name"] for s in spans]
+    for name in ("parse", "validate", "payload", "route", "fulfill", "serialize"):
+        assert name in names
+    assert names[-1] == "POST /"